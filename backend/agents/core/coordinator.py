@@ -1,12 +1,116 @@
 import autogen
 import os
+import time
+import logging
+from concurrent.futures import Future
 from dotenv import load_dotenv
-from typing import Dict, List, Any
-from .specialized_agents import AgentService
+from typing import Callable, Dict, Iterable, List, Any, Optional, Set, Tuple
+from .specialized_agents import AgentService, config_list_for, DEFAULT_INSIGHTS_MARKER, FALLBACK_IMAGE_URLS
+from .day_planner import PLANNER_DAY_MAX_TOKENS, map_reduce_itinerary, use_map_reduce
+from .degradation import StageTimings, build_recent_results
+from ..support.geo import format_day_groups, group_by_day
+from ..support.cancellation import RequestCancelled, check_cancelled, wait_result
+from ..support.deadline import Deadline, DeadlineExceeded, current_deadline, enforce_deadline
+from ..support.generation import stage_settings
+from ..support.rate_limiter import RateLimitExceeded, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW
 
 # Load environment variables
 load_dotenv()
 
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Result field produced by each stage, and the preferences its prompt depends on.
+# The planner also depends on every other stage's output.
+STAGE_OUTPUTS = {
+    "attractions": "attractions",
+    "food": "food",
+    "accommodation": "accommodation",
+    "reviews": "insights",
+    "images": "images",
+    "planner": "itinerary",
+}
+
+# Stages whose prompts only depend on the destination, in the order they run
+DESTINATION_STAGES = ("attractions", "food", "accommodation", "reviews", "images")
+
+# Stages a plan can do without when its deadline is close (their fallback text is used)
+OPTIONAL_STAGES = ("reviews", "images")
+
+# Smallest share of its output budget the planner is cut to when the deadline is close
+PLANNER_MIN_BUDGET_SHARE = float(os.getenv("PLANNER_MIN_BUDGET_SHARE", 0.35))
+
+# Prompt, fallback text and error log message of the single-query stages
+SIMPLE_STAGES = {
+    "attractions": (
+        "Please recommend notable attractions and sights to visit in {destination}.",
+        "No attractions information available for {destination}.",
+        "Error retrieving attractions: %s",
+    ),
+    "food": (
+        "Please recommend food, restaurants, and culinary experiences in {destination}.",
+        "No food information available for {destination}.",
+        "Error retrieving food recommendations: %s",
+    ),
+    "accommodation": (
+        "Please recommend accommodation options in {destination} across different price points.",
+        "No accommodation information available for {destination}.",
+        "Error retrieving accommodation options: %s",
+    ),
+}
+
+STAGE_INPUTS = {
+    "attractions": ("destination",),
+    "food": ("destination",),
+    "accommodation": ("destination",),
+    "reviews": ("destination",),
+    "images": ("destination", "get_images"),
+    "planner": ("destination", "trip_length", "budget", "interests"),
+}
+
+def invalidated_stages(previous: Dict[str, Any], current: Dict[str, Any]) -> Set[str]:
+    """
+    Work out which stages must run again when preferences change.
+    
+    Args:
+        previous: Preferences the stored plan was generated from
+        current: The new preferences
+        
+    Returns:
+        Set of stage names whose stored output can no longer be reused
+    """
+    changed = {key for key in set(previous) | set(current) if previous.get(key) != current.get(key)}
+    stages = {stage for stage, inputs in STAGE_INPUTS.items() if changed.intersection(inputs)}
+    if stages:
+        # Any change upstream of the planner changes its prompt
+        stages.add("planner")
+    return stages
+
+def plan_reuse(previous_preferences: Dict[str, Any], stage_outputs: Dict[str, str],
+               user_preferences: Dict[str, Any], failed: Iterable[str] = ()) -> Tuple[Dict[str, str], Set[str]]:
+    """
+    Split a stored plan's stage outputs into those that can be reused and stages to re-run.
+    
+    Args:
+        previous_preferences: Preferences the stored plan was generated from
+        stage_outputs: Stored stage outputs keyed by result field
+        user_preferences: The new preferences
+        failed: Result fields that hold fallback text or deadline stand-ins (the plan's
+                "failed_sections"); they are always re-run
+    
+    Returns:
+        Tuple of reusable outputs keyed by result field, and the set of stages to re-run
+    """
+    stale = invalidated_stages(previous_preferences, user_preferences)
+    failed = set(failed)
+    reuse = {
+        field: stage_outputs[field]
+        for stage, field in STAGE_OUTPUTS.items()
+        if stage not in stale and field not in failed and stage_outputs.get(field) is not None
+    }
+    rerun = {stage for stage, field in STAGE_OUTPUTS.items() if field not in reuse}
+    return reuse, rerun
+
 class CoordinatorAgent:
     """
     Coordinates communication between all specialized agents in the system.
@@ -16,13 +120,8 @@ class CoordinatorAgent:
     def __init__(self):
         """Initialize the coordinator agent with configuration and specialized agents."""
         try:
-            # Configure OpenAI
-            self.config_list = [
-                {
-                    "model": "gpt-3.5-turbo",
-                    "api_key": os.getenv("OPENAI_API_KEY")
-                }
-            ]
+            # Configure OpenAI (models come from the model router)
+            self.config_list = config_list_for("coordinator")
             
             # LLM configuration
             self.llm_config = {
@@ -40,22 +139,83 @@ class CoordinatorAgent:
             
             # Initialize the agent service
             self.agent_service = AgentService()
+            
+            # Stage durations and last good outputs, to keep plans within their deadline
+            self.stage_timings = StageTimings()
+            self.recent_results = build_recent_results()
         except Exception as e:
             # Log the error
-            print(f"Critical error initializing CoordinatorAgent: {str(e)}")
+            logger.error("Critical error initializing CoordinatorAgent: %s", e)
             # Re-raise to prevent normal operation with broken initialization
             raise
         
-    def process_request(self, user_preferences: Dict[str, Any]) -> Dict[str, Any]:
+    def process_request(self, user_preferences: Dict[str, Any],
+                        reuse: Optional[Dict[str, str]] = None,
+                        on_section: Optional[Callable[[str, str], None]] = None,
+                        on_checkpoint: Optional[Callable[[str, str], None]] = None) -> Dict[str, Any]:
         """
         Process a travel planning request by coordinating between specialized agents.
         
         Args:
             user_preferences: Dictionary containing user preferences from questionnaire
+            reuse: Stored stage outputs keyed by result field (e.g. "attractions");
+                   stages with an entry here are not run again. A value may also be a
+                   Future of a prefetched output, which is waited for and adopted (the
+                   stage runs normally if the prefetch failed or was cancelled)
+            on_section: Called with (field, content) as soon as each result section is ready,
+                        so partial results can be published before the itinerary is done
+            on_checkpoint: Called with (field, content) for each stage that ran and succeeded
+                           (fallback text is not passed), so the output can be persisted and
+                           reused when an interrupted request is resumed. When set, a failed
+                           planner raises instead of returning an error itinerary.
+            
+        When the request runs against a deadline (see `deadline_scope`), the plan
+        is kept within it rather than made complete: optional stages are skipped
+        and slow stages are replaced by their last good output for the destination
+        when the stages still to run would not fit, and the planner's output budget
+        is cut. Work still running at the deadline is stopped, and the finished
+        sections are returned with stand-ins for the rest. Each such step is
+        listed in the result's "degraded" entry.
             
         Returns:
             Dict containing the complete travel itinerary
         """
+        reuse = dict(reuse or {})
+        # Stages that fell back to placeholder text; their output is not worth keeping
+        failed = set()
+        deadline = current_deadline.get()
+        # What was given up to meet the deadline
+        degraded: List[Dict[str, str]] = []
+        
+        def reused(field: str) -> Optional[str]:
+            content = reuse.get(field)
+            if isinstance(content, Future):
+                try:
+                    # A prefetch still running past the deadline counts as unavailable
+                    content = wait_result(content, timeout=None if deadline is None else max(0.0, deadline.remaining()))
+                    logger.info("Adopted prefetched %s section", field)
+                except RequestCancelled:
+                    raise
+                except BaseException as e:
+                    logger.info("Prefetched %s section unavailable (%s), running the stage", field, type(e).__name__)
+                    content = None
+                if content is None:
+                    # Not reused after all, so the stage's own output gets checkpointed
+                    del reuse[field]
+            return content
+        
+        def section_ready(field: str, content: str):
+            if on_checkpoint is not None and field not in reuse and field not in failed:
+                try:
+                    on_checkpoint(field, content)
+                except Exception as e:
+                    logger.warning("Error checkpointing %s stage: %s", field, e)
+            if on_section is None:
+                return
+            try:
+                on_section(field, content)
+            except Exception as e:
+                logger.warning("Error publishing %s section: %s", field, e)
         destination = user_preferences.get("destination", "Unknown")
         trip_length = user_preferences.get("trip_length", 3)
         budget = user_preferences.get("budget", "moderate")
@@ -65,71 +225,49 @@ class CoordinatorAgent:
         if interests is None:
             interests = []
         
-        print(f"Processing request for destination: {destination}")
-        
-        # Get attraction recommendations
-        attractions_prompt = f"Please recommend notable attractions and sights to visit in {destination}."
-        try:
-            attractions_response = self.agent_service.get_agent_response("attractions", attractions_prompt)
-            if attractions_response is None:
-                attractions_response = f"No attractions information available for {destination}."
-        except Exception as e:
-            print(f"Error retrieving attractions: {str(e)}")
-            attractions_response = f"No attractions information available for {destination}."
+        logger.info("Processing request for destination: %s", destination)
         
-        # Get food recommendations
-        food_prompt = f"Please recommend food, restaurants, and culinary experiences in {destination}."
-        try:
-            food_response = self.agent_service.get_agent_response("food", food_prompt)
-            if food_response is None:
-                food_response = f"No food information available for {destination}."
-        except Exception as e:
-            print(f"Error retrieving food recommendations: {str(e)}")
-            food_response = f"No food information available for {destination}."
-        
-        # Get accommodation recommendations
-        accommodation_prompt = f"Please recommend accommodation options in {destination} across different price points."
-        try:
-            accommodation_response = self.agent_service.get_agent_response("accommodation", accommodation_prompt)
-            if accommodation_response is None:
-                accommodation_response = f"No accommodation information available for {destination}."
-        except Exception as e:
-            print(f"Error retrieving accommodation options: {str(e)}")
-            accommodation_response = f"No accommodation information available for {destination}."
-        
-        # Get additional insights - ALWAYS get insights, regardless of user preference
-        # This ensures the ReviewsAgent always runs
-        insights_response = ""
-        insights_prompt = f"What do people say about visiting {destination}? Find reviews and traveler opinions."
-        try:
-            # This will now use direct_reviews_search instead of LLM processing
-            print(f"Querying ReviewsAgent for insights about {destination}")
-            insights_response = self.agent_service.get_agent_response("reviews", insights_prompt)
-            print(f"Retrieved reviews data directly from Google Search API - {len(insights_response)} characters")
-            if not insights_response or len(insights_response) < 50:
-                print("Retrieved insufficient insights response, using fallback")
-                insights_response = self._get_fallback_insights(destination)
-        except Exception as e:
-            print(f"Error retrieving insights: {str(e)}")
-            insights_response = self._get_fallback_insights(destination)
+        # Run (or adopt) the stages that only depend on the destination
+        outputs = {}
+        for index, stage in enumerate(DESTINATION_STAGES):
+            # Nobody is waiting for a cancelled request; don't start its next stage
+            check_cancelled()
+            field = STAGE_OUTPUTS[stage]
+            content = reused(field)
+            if content is None and deadline is not None:
+                content = self._stand_in(stage, DESTINATION_STAGES[index + 1:], user_preferences, deadline, degraded)
+                if content is not None:
+                    # Keep stand-ins out of checkpoints, so a retry runs the stage
+                    failed.add(field)
+            if content is None:
+                try:
+                    with enforce_deadline(deadline):
+                        content, ok = self.run_stage(stage, user_preferences)
+                except DeadlineExceeded:
+                    content, ok = self._stand_in(stage, (), user_preferences, deadline, degraded), False
+                if not ok:
+                    failed.add(field)
+            outputs[field] = content
+            section_ready(field, content)
+        attractions_response = outputs["attractions"]
+        food_response = outputs["food"]
+        accommodation_response = outputs["accommodation"]
+        insights_response = outputs["insights"]
+        images_response = outputs["images"]
         
         # Debug - print the insights response
-        print(f"ReviewsAgent response preview: {insights_response[:300]}...")
+        logger.debug("ReviewsAgent response preview: %.300s...", insights_response)
         
-        # Get images if requested - directly using Google Image Search API
-        images_response = ""
-        if user_preferences.get("get_images", False):
-            images_prompt = f"Find high-quality images of {destination}. Include diverse scenes of landmarks, cityscapes, nature, and cultural elements."
+        # Locate the named attractions and pre-group them into days, so the planner only details them
+        day_groups = None
+        if "itinerary" not in reuse:
             try:
-                # This will now use direct_image_search instead of LLM processing
-                images_response = self.agent_service.get_agent_response("images", images_prompt)
-                print(f"Retrieved image URLs directly from Google Image Search API - {images_response.count('http')} URLs")
-                if not images_response or images_response.count('http') < 1:
-                    print("Retrieved insufficient image URLs, using fallback")
-                    images_response = self._get_fallback_images()
+                day_groups = group_by_day(destination, trip_length, attractions_response, food_response)
+                if day_groups:
+                    logger.info("Grouped %s located attractions into %s days",
+                                sum(len(day.places) for day in day_groups), trip_length)
             except Exception as e:
-                print(f"Error retrieving images: {str(e)}")
-                images_response = self._get_fallback_images()
+                logger.warning("Could not group attractions by location: %s", e)
         
         # Create a comprehensive plan with the trip planner agent
         plan_prompt = self._create_plan_prompt(
@@ -139,7 +277,8 @@ class CoordinatorAgent:
             interests=interests,
             attractions=attractions_response,
             food=food_response,
-            accommodation=accommodation_response
+            accommodation=accommodation_response,
+            day_groups=format_day_groups(day_groups) if day_groups else None
         )
         
         # Include insights and images in the planner prompt if available
@@ -174,41 +313,94 @@ IMAGE REFERENCES (URLs): (ALL URLS MUST BE INCLUDED IN YOUR ITINERARY)
 IMPORTANT INSTRUCTION: You MUST include ALL of these image URLs in your response. Reference them at relevant points in your itinerary where they would be most helpful (e.g., "See image of [attraction]: [URL]").
 """
         
-        try:
-            print("Generating final itinerary using TripPlannerAgent")
-            itinerary = self.agent_service.get_agent_response("planner", plan_prompt)
+        if "itinerary" in reuse:
+            itinerary = reuse["itinerary"]
+        elif deadline is not None and deadline.expired:
+            # Return the sections there are rather than keep the user waiting for the planner
+            failed.add("itinerary")
+            itinerary = self._itinerary_past_deadline(destination, degraded)
+        else:
+            check_cancelled()
+            budget_share = self._planner_budget_share(deadline)
+            planner_settings = day_max_tokens = None
+            if budget_share < 1.0:
+                planner_settings = stage_settings["planner"].with_overrides(
+                    max_tokens=max(1, int(stage_settings["planner"].max_tokens * budget_share)))
+                day_max_tokens = max(1, int(PLANNER_DAY_MAX_TOKENS * budget_share))
+                degraded.append(self._degrade(
+                    "itinerary", "shortened", f"planner output budget cut to {budget_share:.0%}"))
+            planner_started = time.monotonic()
+            try:
+                with enforce_deadline(deadline):
+                    itinerary = None
+                    if use_map_reduce(trip_length):
+                        try:
+                            logger.info("Generating a %s-day itinerary day by day", trip_length)
+                            itinerary = map_reduce_itinerary(
+                                self.agent_service, destination, trip_length, budget, interests,
+                                attractions_response, food_response, accommodation_response,
+                                insights_response, images_response, day_groups=day_groups,
+                                day_max_tokens=day_max_tokens,
+                            )
+                        except RuntimeError as e:
+                            logger.warning("Day-by-day planning failed (%s), using a single planner call", e)
+                    if itinerary is None:
+                        logger.info("Generating final itinerary using TripPlannerAgent")
+                        # The planner finishes work already paid for, so it is admitted first
+                        itinerary = self.agent_service.get_agent_response(
+                            "planner", plan_prompt, priority=PRIORITY_HIGH, generation=planner_settings)
             
-            # Verify that the itinerary contains essential sections
-            if itinerary is not None and len(itinerary.strip()) > 100:
-                print(f"Generated itinerary of length {len(itinerary)} characters")
+                # Verify that the itinerary contains essential sections
+                if itinerary is not None and len(itinerary.strip()) > 100:
+                    logger.info("Generated itinerary of length %s characters", len(itinerary))
+                    if budget_share == 1.0:
+                        # Shortened runs would make the planner look faster than it is
+                        self.stage_timings.record("planner", time.monotonic() - planner_started)
                 
-                # Check if insights are properly included
-                if insights_response and "TRAVELER INSIGHTS" not in itinerary:
-                    print("WARNING: Itinerary may be missing TRAVELER INSIGHTS section. Trying to fix...")
-                    # Include the full insights section at the end if missing
-                    itinerary += f"""
+                    # Check if insights are properly included
+                    if insights_response and "TRAVELER INSIGHTS" not in itinerary:
+                        logger.warning("Itinerary may be missing TRAVELER INSIGHTS section. Trying to fix...")
+                        # Include the full insights section at the end if missing
+                        itinerary += f"""
 
 ## TRAVELER INSIGHTS
 {insights_response}
 """
-                # Check if resource links are properly included
-                if "Useful Resource Links" not in itinerary and "USEFUL RESOURCE LINKS" not in itinerary:
-                    # Extract resource links from insights if available
-                    resource_links_section = ""
-                    if "## Useful Resource Links" in insights_response:
-                        resource_links_section = insights_response.split("## Useful Resource Links")[1].strip()
-                        print("Extracted resource links section from insights")
-                        itinerary += f"""
+                    # Check if resource links are properly included
+                    if "Useful Resource Links" not in itinerary and "USEFUL RESOURCE LINKS" not in itinerary:
+                        # Extract resource links from insights if available
+                        resource_links_section = ""
+                        if "## Useful Resource Links" in insights_response:
+                            resource_links_section = insights_response.split("## Useful Resource Links")[1].strip()
+                            logger.debug("Extracted resource links section from insights")
+                            itinerary += f"""
 
 ## USEFUL RESOURCE LINKS
 {resource_links_section}
 """
             
-            if itinerary is None or not itinerary.strip():
-                itinerary = f"No detailed itinerary could be generated for {destination}. Please try again."
-        except Exception as e:
-            print(f"Error creating itinerary: {str(e)}")
-            itinerary = f"Error creating itinerary: {str(e)}"
+                if itinerary is None or not itinerary.strip():
+                    failed.add("itinerary")
+                    itinerary = f"No detailed itinerary could be generated for {destination}. Please try again."
+            except DeadlineExceeded:
+                # The planner was stopped at the deadline; the other sections are still worth returning
+                failed.add("itinerary")
+                itinerary = self._itinerary_past_deadline(destination, degraded)
+            except RateLimitExceeded:
+                # Surface back-pressure to the HTTP layer instead of returning a broken plan
+                raise
+            except Exception as e:
+                logger.error("Error creating itinerary: %s", e)
+                if on_checkpoint is not None:
+                    # Retry from the checkpointed stages rather than storing a broken plan
+                    raise
+                failed.add("itinerary")
+                itinerary = f"Error creating itinerary: {str(e)}"
+        section_ready("itinerary", itinerary)
+        
+        if degraded:
+            logger.warning("Degraded plan for %s to meet its deadline: %s", destination,
+                           ", ".join(f"{entry['stage']} {entry['action']}" for entry in degraded))
         
         # Compile results into a single response
         return {
@@ -222,8 +414,174 @@ IMPORTANT INSTRUCTION: You MUST include ALL of these image URLs in your response
             "accommodation": accommodation_response,
             "insights": insights_response,
             "images": images_response,
+            "degraded": degraded,
+            # Sections holding fallback text or stand-ins, which must not be reused later
+            "failed_sections": sorted(failed),
         }
     
+    def run_stage(self, stage: str, user_preferences: Dict[str, Any],
+                  priority: int = PRIORITY_NORMAL) -> Tuple[str, bool]:
+        """
+        Run one of the destination stages (see DESTINATION_STAGES).
+        
+        Successful runs are timed and their output kept, so later requests can
+        tell whether the stage fits in their deadline, or reuse the output if not.
+        Failed runs are neither: their fallback text must not stand in for a later
+        plan, and fast failures would make the stage look quicker than it is.
+        
+        Args:
+            stage: Stage name
+            user_preferences: Preferences; only the destination and get_images are used
+            priority: Admission priority of the stage's upstream calls
+            
+        Returns:
+            Tuple of the stage output and whether it succeeded (False means the output is
+            or includes fallback text)
+        """
+        started = time.monotonic()
+        content, ok = self._run_stage(stage, user_preferences, priority)
+        if ok and content:
+            self.stage_timings.record(stage, time.monotonic() - started)
+            self.recent_results.put(self._result_key(stage, user_preferences), content)
+        return content, ok
+    
+    @staticmethod
+    def _result_key(stage: str, user_preferences: Dict[str, Any]) -> Tuple[str, ...]:
+        destination = " ".join(str(user_preferences.get("destination", "Unknown")).split()).casefold()
+        return (stage, destination) + tuple(str(user_preferences.get(name)) for name in STAGE_INPUTS[stage][1:])
+    
+    @staticmethod
+    def _degrade(field: str, action: str, detail: str) -> Dict[str, str]:
+        return {"stage": field, "action": action, "detail": detail}
+    
+    def _stand_in(self, stage: str, later_stages: Tuple[str, ...], user_preferences: Dict[str, Any],
+                  deadline: Deadline, degraded: List[Dict[str, str]]) -> Optional[str]:
+        """
+        Output to use instead of running a stage that no longer fits in the deadline.
+        
+        A stage fits if the time left covers its expected duration, the required
+        stages after it, and the planner (its full budget after an optional stage,
+        PLANNER_MIN_BUDGET_SHARE of it after a required one). A stage that does not
+        fit is replaced by its last good output for the destination; without one,
+        an optional stage is skipped and a required one runs anyway until the
+        deadline has passed, after which every stage is skipped.
+        
+        Returns:
+            The stand-in output (recorded in `degraded`), or None to run the stage
+        """
+        if stage == "images" and not user_preferences.get("get_images", False):
+            return None
+        optional = stage in OPTIONAL_STAGES
+        expired = deadline.expired
+        if not expired:
+            estimate = self.stage_timings.estimate
+            needed = estimate(stage) + sum(estimate(later) for later in later_stages if later not in OPTIONAL_STAGES)
+            needed += estimate("planner") * (1.0 if optional else PLANNER_MIN_BUDGET_SHARE)
+            if deadline.remaining() >= needed:
+                return None
+        
+        field = STAGE_OUTPUTS[stage]
+        recent = self.recent_results.get(self._result_key(stage, user_preferences))
+        if recent is not None:
+            content, age = recent
+            degraded.append(self._degrade(field, "stale", f"reused a result from {age / 60:.0f} minutes ago"))
+            return content
+        if not optional and not expired:
+            return None
+        detail = "deadline passed" if expired else f"{deadline.remaining():.0f}s left, {needed:.0f}s needed"
+        degraded.append(self._degrade(field, "skipped", detail))
+        destination = user_preferences.get("destination", "Unknown")
+        if stage in SIMPLE_STAGES:
+            return SIMPLE_STAGES[stage][1].format(destination=destination)
+        if stage == "reviews":
+            return self._get_fallback_insights(destination)
+        return self._get_fallback_images()
+    
+    def _itinerary_past_deadline(self, destination: str, degraded: List[Dict[str, str]]) -> str:
+        degraded.append(self._degrade("itinerary", "skipped", "deadline passed before the planner finished"))
+        return (f"A detailed itinerary for {destination} could not be written in time. "
+                "The attractions, food and accommodation sections are ready to plan with; please try again later "
+                "for a day-by-day itinerary.")
+    
+    def _planner_budget_share(self, deadline: Optional[Deadline]) -> float:
+        """Share of its output budget the planner gets, so it finishes within the deadline."""
+        if deadline is None:
+            return 1.0
+        estimate = self.stage_timings.estimate("planner")
+        remaining = deadline.remaining()
+        if remaining >= estimate:
+            return 1.0
+        # Generation time grows with output length, so cut the output in proportion
+        return max(PLANNER_MIN_BUDGET_SHARE, remaining / estimate)
+    
+    def _run_stage(self, stage: str, user_preferences: Dict[str, Any], priority: int) -> Tuple[str, bool]:
+        destination = user_preferences.get("destination", "Unknown")
+        if stage in SIMPLE_STAGES:
+            prompt, fallback, error_message = SIMPLE_STAGES[stage]
+            try:
+                response = self.agent_service.get_agent_response(stage, prompt.format(destination=destination), priority=priority)
+                if response and response.strip():
+                    return response, True
+            except Exception as e:
+                logger.error(error_message, e)
+            return fallback.format(destination=destination), False
+        
+        if stage == "reviews":
+            # Always get insights, regardless of user preference, so the ReviewsAgent always runs
+            insights_prompt = f"What do people say about visiting {destination}? Find reviews and traveler opinions."
+            try:
+                # This will now use direct_reviews_search instead of LLM processing
+                logger.debug("Querying ReviewsAgent for insights about %s", destination)
+                insights_response = self.agent_service.get_agent_response("reviews", insights_prompt, priority=priority)
+                logger.debug("Retrieved reviews data directly from Google Search API - %s characters", len(insights_response))
+                if insights_response and len(insights_response) >= 50:
+                    # Canned insights are shown, but the stage counts as failed so it is run again later
+                    return insights_response, DEFAULT_INSIGHTS_MARKER not in insights_response
+                logger.warning("Retrieved insufficient insights response, using fallback")
+            except Exception as e:
+                logger.error("Error retrieving insights: %s", e)
+            return self._get_fallback_insights(destination), False
+        
+        if stage == "images":
+            # Images only if requested - directly using Google Image Search API
+            if not user_preferences.get("get_images", False):
+                return "", True
+            images_prompt = f"Find high-quality images of {destination}. Include diverse scenes of landmarks, cityscapes, nature, and cultural elements."
+            try:
+                # This will now use direct_image_search instead of LLM processing
+                images_response = self.agent_service.get_agent_response("images", images_prompt, priority=priority)
+                logger.debug("Retrieved image URLs directly from Google Image Search API - %s URLs", images_response.count('http'))
+                if images_response and images_response.count('http') >= 1:
+                    # Results padded with fallback images are kept, but count as failed like the fallback itself
+                    return images_response, not any(url in images_response for url in FALLBACK_IMAGE_URLS)
+                logger.warning("Retrieved insufficient image URLs, using fallback")
+            except Exception as e:
+                logger.error("Error retrieving images: %s", e)
+            return self._get_fallback_images(), False
+        
+        raise ValueError(f"Not a destination stage: {stage}")
+    
+    def regenerate(self, previous_preferences: Dict[str, Any], stage_outputs: Dict[str, str],
+                   user_preferences: Dict[str, Any],
+                   on_section: Optional[Callable[[str, str], None]] = None,
+                   failed: Iterable[str] = ()) -> Tuple[Dict[str, Any], Set[str]]:
+        """
+        Regenerate a stored plan for changed preferences, re-running only invalidated stages.
+        
+        Args:
+            previous_preferences: Preferences the stored plan was generated from
+            stage_outputs: Stored stage outputs keyed by result field
+            user_preferences: The new preferences
+            on_section: Passed through to process_request
+            failed: Stored fields that must be re-run (see `plan_reuse`)
+            
+        Returns:
+            Tuple of the new travel plan and the set of stages that were re-run
+        """
+        reuse, rerun = plan_reuse(previous_preferences, stage_outputs, user_preferences, failed)
+        logger.info("Regenerating plan for %s: re-running %s", user_preferences.get('destination'), sorted(rerun) or 'nothing')
+        return self.process_request(user_preferences, reuse=reuse, on_section=on_section), rerun
+    
     def _get_fallback_insights(self, destination: str) -> str:
         """Get fallback insights when API results are insufficient."""
         return f"""# Traveler Insights for {destination}
@@ -247,15 +605,11 @@ These insights are compiled from various travel blogs and visitor reviews to giv
     
     def _get_fallback_images(self) -> str:
         """Get fallback image URLs when API results are insufficient."""
-        return """https://images.unsplash.com/photo-1523906834658-6e24ef2386f9
-https://images.unsplash.com/photo-1515542622106-78bda8ba0e5b
-https://images.unsplash.com/photo-1511739001486-6bfe10ce785f
-https://images.unsplash.com/photo-1520939817895-060bdaf4bc05
-https://images.unsplash.com/photo-1532498551838-b7a1cfac622e"""
+        return "\n".join(FALLBACK_IMAGE_URLS)
     
     def _create_plan_prompt(self, destination: str, trip_length: int, budget: str, 
                            interests: List[str], attractions: str, food: str, 
-                           accommodation: str) -> str:
+                           accommodation: str, day_groups: Optional[str] = None) -> str:
         """
         Create a detailed prompt for the trip planner agent.
         
@@ -267,6 +621,7 @@ https://images.unsplash.com/photo-1532498551838-b7a1cfac622e"""
             attractions: Attraction recommendations from attractions agent
             food: Food recommendations from food agent
             accommodation: Accommodation recommendations from accommodation agent
+            day_groups: Attractions already grouped into days by location (see geo.format_day_groups)
             
         Returns:
             Formatted prompt string
@@ -277,6 +632,15 @@ https://images.unsplash.com/photo-1532498551838-b7a1cfac622e"""
             
         interests_str = ', '.join(interests) if interests else 'Various activities'
         
+        if day_groups:
+            routing = f"""The attractions below were located on a map and grouped into days by proximity, with walking or
+        transit times between stops. Follow this grouping and order, fitting other recommendations in where they suit:
+        
+        PRE-GROUPED DAYS:
+        {day_groups}"""
+        else:
+            routing = "Create a logical flow for the itinerary that minimizes travel time and groups activities by geographic proximity."
+        
         prompt = f"""
         Create a detailed day-by-day travel plan for a {trip_length}-day trip to {destination}.
         
@@ -301,7 +665,7 @@ https://images.unsplash.com/photo-1532498551838-b7a1cfac622e"""
         3. Transportation suggestions between locations
         4. Estimated costs where applicable
         
-        Create a logical flow for the itinerary that minimizes travel time and groups activities by geographic proximity.
+        {routing}
         
         CRITICAL INSTRUCTIONS:
         - You MUST preserve ALL input data in your response
@@ -330,9 +694,11 @@ https://images.unsplash.com/photo-1532498551838-b7a1cfac622e"""
             if agent_type not in ["attractions", "food", "accommodation", "reviews", "images", "planner"]:
                 return f"Unknown agent type: {agent_type}. Please use a valid agent type."
                 
-            response = self.agent_service.get_agent_response(agent_type, query)
+            response = self.agent_service.get_agent_response(agent_type, query, priority=PRIORITY_LOW)
             if response is None or not response.strip():
                 return f"No information available for this query. Please try with a different query or agent type."
             return response
+        except RateLimitExceeded:
+            raise
         except Exception as e:
             return f"Error retrieving recommendations: {str(e)}" 
\ No newline at end of file
@@ -0,0 +1,220 @@
+import os
+import re
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import List, Optional
+from ..support.generation import stage_settings
+from ..support.rate_limiter import PRIORITY_HIGH, RateLimitExceeded
+from ..support.geo import DayGroup
+from ..support.cancellation import wait_result
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# "single" writes the itinerary in one planner call, "map_reduce" outlines the trip and writes
+# the days concurrently, "auto" uses map-reduce from PLANNER_MAP_REDUCE_MIN_DAYS days on
+PLANNER_MODE = os.getenv("PLANNER_MODE", "auto").lower()
+PLANNER_MAP_REDUCE_MIN_DAYS = int(os.getenv("PLANNER_MAP_REDUCE_MIN_DAYS", 5))
+PLANNER_DAY_MAX_TOKENS = int(os.getenv("PLANNER_DAY_MAX_TOKENS", 900))
+PLANNER_OUTLINE_TOKENS_PER_DAY = int(os.getenv("PLANNER_OUTLINE_TOKENS_PER_DAY", 60))
+# Day calls running at once across all requests; upstream admission still applies per call
+PLANNER_DAY_WORKERS = int(os.getenv("PLANNER_DAY_WORKERS", 8))
+
+# Theme of days the outline did not cover
+FREE_DAY = "Free day to explore at your own pace"
+
+OUTLINE_LINE = re.compile(r"^[\s*#>-]*day\s+(\d+)\s*\**\s*[:.\-–—]\s*(.+)$", re.IGNORECASE)
+
+
+def use_map_reduce(trip_length: int, mode: str = PLANNER_MODE,
+                   min_days: int = PLANNER_MAP_REDUCE_MIN_DAYS) -> bool:
+    """Whether a trip of `trip_length` days is planned day by day."""
+    if mode == "map_reduce":
+        return trip_length > 1
+    if mode == "auto":
+        return trip_length >= min_days
+    return False
+
+
+@dataclass
+class DayOutline:
+    """What one day of the trip covers, as assigned by the outline step."""
+
+    day: int
+    theme: str
+    places: List[str] = field(default_factory=list)
+    # Route and travel times worked out from coordinates, when the places were located
+    route: str = ""
+
+    def describe(self) -> str:
+        places = "; ".join(self.places) if self.places else "the planner's choice"
+        return f"Day {self.day}: {self.theme} | {places}"
+
+
+def parse_outline(text: str, trip_length: int) -> List[DayOutline]:
+    """
+    Parse "Day N: theme | place; place" lines into one outline per day.
+
+    Days the outline skipped (or numbered past the trip) are filled with a free
+    day, so the result always has exactly `trip_length` entries.
+    """
+    days = {}
+    for line in (text or "").splitlines():
+        match = OUTLINE_LINE.match(line.strip())
+        if not match:
+            continue
+        day = int(match.group(1))
+        if not 1 <= day <= trip_length or day in days:
+            continue
+        theme, _, places = match.group(2).strip(" *").partition("|")
+        days[day] = DayOutline(day, theme.strip() or f"Day {day}",
+                               [place.strip(" *") for place in places.split(";") if place.strip(" *")])
+    return [days.get(day) or DayOutline(day, FREE_DAY) for day in range(1, trip_length + 1)]
+
+
+def outline_from_groups(groups: List[DayGroup]) -> List[DayOutline]:
+    """Outline taken from the geographic day groups instead of an outline call."""
+    return [
+        DayOutline(group.day, group.theme if group.places else FREE_DAY, [place.name for place in group.places],
+                   group.route() if group.places else "")
+        for group in groups
+    ]
+
+
+def outline_prompt(destination: str, trip_length: int, budget: str, interests: List[str], attractions: str) -> str:
+    interests_str = ', '.join(interests) if interests else 'Various activities'
+    return f"""
+        Assign the attractions below to the days of a {trip_length}-day trip to {destination}.
+
+        Travel preferences:
+        - Budget: {budget}
+        - Interests: {interests_str}
+
+        ATTRACTIONS AND SIGHTSEEING INFORMATION:
+        {attractions}
+
+        Group attractions that are geographically close on the same day and do not repeat an attraction.
+        Reply with EXACTLY {trip_length} lines and nothing else, one per day, in this format:
+        Day 1: <short theme or neighbourhood> | <attraction>; <attraction>; <attraction>
+        """
+
+
+def day_prompt(destination: str, trip_length: int, budget: str, interests: List[str], outline: List[DayOutline],
+               day: DayOutline, food: str, accommodation: str) -> str:
+    interests_str = ', '.join(interests) if interests else 'Various activities'
+    plan = "\n        ".join(entry.describe() for entry in outline)
+    return f"""
+        Write ONLY Day {day.day} of a {trip_length}-day trip to {destination}. The other days are written separately.
+
+        Travel preferences:
+        - Budget: {budget}
+        - Interests: {interests_str}
+
+        The whole trip is planned as follows (do not cover other days' attractions):
+        {plan}
+
+        FOOD AND DINING INFORMATION:
+        {food}
+
+        ACCOMMODATION INFORMATION:
+        {accommodation}
+
+        {f"Follow this route; stops, distances and travel times were computed from a map: {day.route}" if day.route else ""}
+
+        Start with the heading "## Day {day.day}: {day.theme}" and provide:
+        1. Morning, afternoon, and evening activities covering: {"; ".join(day.places) or "your choice"}
+        2. Recommended places to eat for each meal
+        3. Transportation suggestions between locations
+        4. Estimated costs where applicable
+
+        Do not add an introduction, traveler insights, resource links or image lists; they are added separately.
+        """
+
+
+def merge_itinerary(destination: str, trip_length: int, outline: List[DayOutline], days: List[Optional[str]],
+                    insights: str, images: str) -> str:
+    """Assemble the final itinerary from the outline and day texts, in day order."""
+    sections = [f"# {trip_length}-Day Itinerary for {destination}", "## Overview",
+                "\n".join(f"- {entry.describe()}" for entry in outline)]
+    for entry, text in zip(outline, days):
+        text = (text or "").strip()
+        if not text:
+            text = f"## Day {entry.day}: {entry.theme}\n\nDetails for this day could not be generated. Planned: " \
+                   f"{'; '.join(entry.places) or 'free exploration'}."
+        elif not text.lstrip("# ").lower().startswith(f"day {entry.day}"):
+            text = f"## Day {entry.day}: {entry.theme}\n\n{text}"
+        sections.append(text)
+    if insights:
+        sections.append(f"## TRAVELER INSIGHTS\n{insights}")
+        if "## Useful Resource Links" in insights:
+            sections.append(f"## USEFUL RESOURCE LINKS\n{insights.split('## Useful Resource Links')[1].strip()}")
+    if images:
+        sections.append(f"## IMAGE REFERENCES\n{images}")
+    return "\n\n".join(sections) + "\n"
+
+
+# Shared by all requests; threads are only started when days are planned
+_day_executor = ThreadPoolExecutor(max_workers=PLANNER_DAY_WORKERS, thread_name_prefix="day-planner")
+
+
+def map_reduce_itinerary(agent_service, destination: str, trip_length: int, budget: str, interests: List[str],
+                         attractions: str, food: str, accommodation: str, insights: str = "", images: str = "",
+                         priority: int = PRIORITY_HIGH, day_groups: Optional[List[DayGroup]] = None,
+                         day_max_tokens: Optional[int] = None) -> str:
+    """
+    Write an itinerary as an outline plus one planner call per day.
+
+    A short outline call assigns attractions to days, the days are then written
+    concurrently with a per-day output budget, and the document is merged
+    deterministically (the insights and image sections are copied verbatim
+    instead of being regenerated). Planner wall time therefore follows the
+    longest day rather than the trip length, and long trips are no longer cut
+    off by the single call's token limit. With `day_groups` (see
+    `geo.group_by_day`) the outline call is skipped. `day_max_tokens`
+    overrides PLANNER_DAY_MAX_TOKENS, e.g. to finish within a deadline.
+
+    Raises:
+        RateLimitExceeded: If the outline call could not be admitted
+        RuntimeError: If the outline or every day failed, so the caller can fall back
+    """
+    planner = stage_settings["planner"]
+    if day_groups:
+        outline = outline_from_groups(day_groups)
+    else:
+        try:
+            outline_text = agent_service.get_planner_part(
+                outline_prompt(destination, trip_length, budget, interests, attractions), priority=priority,
+                generation=planner.with_overrides(max_tokens=PLANNER_OUTLINE_TOKENS_PER_DAY * trip_length + 100,
+                                                  temperature=0.3),
+            )
+        except RateLimitExceeded:
+            raise
+        except Exception as e:
+            raise RuntimeError(f"planner outline failed: {e}") from e
+        outline = parse_outline(outline_text, trip_length)
+        if all(entry.theme == FREE_DAY for entry in outline):
+            raise RuntimeError("planner outline could not be parsed")
+    logger.info("Outlined %s days for %s; writing them concurrently", trip_length, destination)
+
+    day_settings = planner.with_overrides(max_tokens=day_max_tokens or PLANNER_DAY_MAX_TOKENS)
+    # Day calls run with the caller's context, so a cancelled request also stops its days
+    futures = [
+        _day_executor.submit(
+            contextvars.copy_context().run, agent_service.get_planner_part,
+            day_prompt(destination, trip_length, budget, interests, outline, entry, food, accommodation),
+            priority, day_settings,
+        )
+        for entry in outline
+    ]
+    days = []
+    for entry, future in zip(outline, futures):
+        try:
+            days.append(wait_result(future))
+        except Exception as e:
+            logger.warning("Error writing day %s for %s: %s", entry.day, destination, e)
+            days.append(None)
+    if not any(days):
+        raise RuntimeError("no day of the itinerary could be generated")
+    return merge_itinerary(destination, trip_length, outline, days, insights, images)
@@ -0,0 +1,102 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+from ..support.resilience import LatencyTracker
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Expected stage durations until enough of them have been measured
+DEFAULT_STAGE_SECONDS = {
+    "attractions": 15.0,
+    "food": 15.0,
+    "accommodation": 15.0,
+    "reviews": 5.0,
+    "images": 5.0,
+    "planner": 45.0,
+}
+
+
+class StageTimings:
+    """
+    Recent durations of each stage, to predict whether a stage still fits in a deadline.
+
+    Args:
+        defaults: Expected seconds per stage before `min_samples` were measured
+        percentile: Percentile of recent durations used as the estimate
+        min_samples: Measurements needed before they replace the default
+    """
+
+    def __init__(self, defaults: Optional[Dict[str, float]] = None, percentile: float = 90.0,
+                 min_samples: int = 5):
+        self.defaults = dict(DEFAULT_STAGE_SECONDS if defaults is None else defaults)
+        self.percentile = percentile
+        self.min_samples = min_samples
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            tracker = self._latency.setdefault(stage, LatencyTracker())
+        tracker.record(seconds)
+
+    def estimate(self, stage: str) -> float:
+        tracker = self._latency.get(stage)
+        if tracker is not None and len(tracker) >= self.min_samples:
+            return tracker.percentile(self.percentile)
+        return self.defaults.get(stage, 10.0)
+
+    def snapshot(self) -> Dict[str, float]:
+        return {stage: round(self.estimate(stage), 2) for stage in sorted(set(self.defaults) | set(self._latency))}
+
+
+class RecentResults:
+    """
+    Last good output per key, kept to stand in for a stage there is no time to run.
+
+    Args:
+        max_entries: Entries kept (least recently stored are dropped first)
+        max_age: Seconds an entry may be served for
+        clock: Wall-clock time source
+    """
+
+    def __init__(self, max_entries: int = 500, max_age: float = 7 * 86400.0,
+                 clock: Callable[[], float] = time.time):
+        self.max_entries = max_entries
+        self.max_age = max_age
+        self._clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (self._clock(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: Hashable) -> Optional[Tuple[Any, float]]:
+        """The stored value and its age in seconds, or None if missing or too old."""
+        with self._lock:
+            entry = self._entries.get(key)
+        if entry is None:
+            return None
+        age = self._clock() - entry[0]
+        if age > self.max_age:
+            return None
+        return entry[1], age
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+def build_recent_results() -> RecentResults:
+    """Create the stale-result store, configured with STALE_RESULTS_MAX_ENTRIES and STALE_RESULTS_MAX_AGE_SECONDS."""
+    return RecentResults(
+        max_entries=int(os.getenv("STALE_RESULTS_MAX_ENTRIES", 500)),
+        max_age=float(os.getenv("STALE_RESULTS_MAX_AGE_SECONDS", 7 * 86400)),
+    )
@@ -0,0 +1,205 @@
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple
+from .coordinator import DESTINATION_STAGES, STAGE_OUTPUTS
+from ..support.cancellation import CancelToken, RequestCancelled, cancel_scope
+from ..support.rate_limiter import PRIORITY_LOW
+from ..support.scheduler import lend_slot
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class PrefetchCancelled(Exception):
+    """Set on prefetched sections that were cancelled before they ran."""
+
+
+class PrefetchSession:
+    """Speculative destination stages started for one questionnaire session."""
+
+    def __init__(self, destination: str, get_images: bool, clock: Callable[[], float], client: str = "anonymous"):
+        self.destination = destination
+        self.get_images = get_images
+        # Who asked for the prefetch; its stages are scheduled as that client's work
+        self.client = client
+        self.created = clock()
+        self.cancelled = threading.Event()
+        # Stops the stage that is running when the session is cancelled
+        self.cancel_token = CancelToken()
+        # Set once a plan waits for the sections, so stages still queued for a slot run in its stead
+        self.adopted = threading.Event()
+        # Sections are resolved by the prefetch thread and cancelled from request threads
+        self._lock = threading.Lock()
+        # One future per result field, resolved as each stage finishes
+        self.sections: Dict[str, Future] = {STAGE_OUTPUTS[stage]: Future() for stage in DESTINATION_STAGES}
+
+    def matches(self, destination: str) -> bool:
+        return self.destination.strip().lower() == destination.strip().lower()
+
+    def cancel(self):
+        self.cancelled.set()
+        self.cancel_token.cancel("prefetch cancelled")
+        for field in self.sections:
+            self.resolve(field, error=PrefetchCancelled())
+
+    def resolve(self, field: str, content: Optional[str] = None, error: Optional[Exception] = None) -> bool:
+        """Resolve a section unless it already was (e.g. cancelled); returns whether this call did."""
+        with self._lock:
+            future = self.sections[field]
+            if future.done():
+                return False
+            if error is None:
+                future.set_result(content)
+            else:
+                future.set_exception(error)
+            return True
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            "destination": self.destination,
+            "cancelled": self.cancelled.is_set(),
+            "sections_ready": {
+                field: future.done() and future.exception() is None for field, future in self.sections.items()
+            },
+        }
+
+
+class Prefetcher:
+    """
+    Runs the destination-only stages while the user is still answering the questionnaire.
+
+    Sessions are keyed by a client-generated token. When the full preferences
+    arrive, `adopt` hands the session's per-section futures to `process_request`
+    as `reuse`, so finished sections are used directly and in-flight ones are
+    waited for instead of started again. Changing the destination cancels the
+    session, including the stage that is running. Prefetched calls use low
+    admission priority, so they never delay submitted plans.
+
+    Args:
+        run_stage: Runs one stage; `CoordinatorAgent.run_stage` plus a `client` keyword
+        workers: Sessions prefetched at the same time
+        ttl: Seconds an unadopted session is kept
+        max_sessions: Sessions kept before the oldest are dropped
+    """
+
+    def __init__(self, run_stage: Callable[..., Tuple[str, bool]], workers: int = 4, ttl: float = 900.0,
+                 max_sessions: int = 1000, clock: Callable[[], float] = time.monotonic):
+        self.run_stage = run_stage
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self._clock = clock
+        self._sessions: "OrderedDict[str, PrefetchSession]" = OrderedDict()
+        self._lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="prefetch")
+        self.stats = {"started": 0, "adopted": 0, "cancelled": 0, "expired": 0}
+
+    def start(self, token: str, destination: str, get_images: bool = True,
+              client: str = "anonymous") -> Dict[str, Any]:
+        """Start (or keep) prefetching for a session; a different destination replaces the old one."""
+        with self._lock:
+            self._expire()
+            session = self._sessions.get(token)
+            if session is not None and session.matches(destination):
+                return session.snapshot()
+            if session is not None:
+                session.cancel()
+                self.stats["cancelled"] += 1
+            session = PrefetchSession(destination, get_images, self._clock, client)
+            self._sessions[token] = session
+            self._sessions.move_to_end(token)
+            while len(self._sessions) > self.max_sessions:
+                _, dropped = self._sessions.popitem(last=False)
+                dropped.cancel()
+                self.stats["expired"] += 1
+            self.stats["started"] += 1
+        self._executor.submit(self._run, session)
+        logger.info("Prefetching destination stages for %s", destination)
+        return session.snapshot()
+
+    def _run(self, session: PrefetchSession):
+        preferences = {"destination": session.destination, "get_images": session.get_images}
+        for stage in DESTINATION_STAGES:
+            field = STAGE_OUTPUTS[stage]
+            if session.cancelled.is_set() or session.sections[field].done():
+                continue
+            try:
+                with cancel_scope(session.cancel_token), lend_slot(session.adopted):
+                    content, ok = self.run_stage(stage, preferences, priority=PRIORITY_LOW, client=session.client)
+            except RequestCancelled:
+                # `cancel` already resolved the remaining sections
+                return
+            except Exception as e:
+                content, ok = None, False
+                logger.warning("Prefetching %s for %s failed: %s", stage, session.destination, e)
+            if ok:
+                session.resolve(field, content)
+            else:
+                # The submitted plan runs the stage itself instead of adopting fallback text
+                session.resolve(field, error=RuntimeError(f"prefetched {stage} stage failed"))
+
+    def adopt(self, token: Optional[str], destination: str, get_images: bool) -> Dict[str, Future]:
+        """
+        Take over a session's sections for the submitted preferences.
+
+        Returns:
+            Futures keyed by result field, for `process_request(reuse=...)`; empty if
+            there is no session or it was for another destination (which is cancelled)
+        """
+        if not token:
+            return {}
+        with self._lock:
+            session = self._sessions.pop(token, None)
+        if session is None:
+            return {}
+        if not session.matches(destination):
+            session.cancel()
+            with self._lock:
+                self.stats["cancelled"] += 1
+            return {}
+        with self._lock:
+            self.stats["adopted"] += 1
+        session.adopted.set()
+        sections = dict(session.sections)
+        if session.get_images != get_images:
+            # The images stage depends on get_images, so it runs again with the submitted value
+            del sections[STAGE_OUTPUTS["images"]]
+        return sections
+
+    def cancel(self, token: str) -> bool:
+        """Cancel a session's remaining stages; returns False if there was none."""
+        with self._lock:
+            session = self._sessions.pop(token, None)
+            if session is not None:
+                self.stats["cancelled"] += 1
+        if session is None:
+            return False
+        session.cancel()
+        return True
+
+    def status(self, token: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            session = self._sessions.get(token)
+        return session.snapshot() if session is not None else None
+
+    def _expire(self):
+        now = self._clock()
+        for token in [token for token, session in self._sessions.items() if now - session.created > self.ttl]:
+            self._sessions.pop(token).cancel()
+            self.stats["expired"] += 1
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sessions": len(self._sessions), **self.stats}
+
+
+def build_prefetcher(run_stage: Callable[..., Tuple[str, bool]]) -> Prefetcher:
+    """Create the prefetcher from PREFETCH_WORKERS and PREFETCH_TTL_SECONDS."""
+    return Prefetcher(
+        run_stage,
+        workers=int(os.getenv("PREFETCH_WORKERS", 4)),
+        ttl=float(os.getenv("PREFETCH_TTL_SECONDS", 900)),
+    )
@@ -1,14 +1,32 @@
 import os
+import time
 import logging
+import threading
 import autogen
+from contextlib import ExitStack
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, List, Any, Union
 from dotenv import load_dotenv
 from googleapiclient.discovery import build
 import re
+from ..support.rate_limiter import (
+    openai_limiter, google_limiter, RateLimitExceeded, request_priority, estimate_tokens
+)
+from ..support.resilience import openai_upstream, google_upstream, CircuitOpenError
+from ..support.model_router import model_router
+from ..support.image_pipeline import build_image_pipeline
+from ..support.cassettes import cassette
+from ..support.cancellation import check_cancelled
+from ..support.conversations import (
+    ProxyPool, cap_history, last_reply, release_conversation, retained_memory, process_rss_bytes
+)
+from ..support.generation import (
+    GenerationSettings, settings_for, generation_scope, completion_scope, record_finish_reason,
+    current_completion, TERMINATION_MARKER
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
-logging.basicConfig(level=logging.INFO)
 
 # Load environment variables
 load_dotenv()
@@ -18,26 +36,62 @@ search_engine_id = os.getenv("GOOGLE_SEARCH_ENGINE_ID")
 
 # Log API key information (without revealing full keys)
 if api_key:
-    logger.info(f"OpenAI API key loaded: {api_key[:5]}...{api_key[-5:]}")
+    logger.info("OpenAI API key loaded: %s...%s", api_key[:5], api_key[-5:])
 else:
     logger.error("OpenAI API key not found!")
 
 if google_api_key:
-    logger.info(f"Google API key loaded: {google_api_key[:5]}...{google_api_key[-5:]}")
+    logger.info("Google API key loaded: %s...%s", google_api_key[:5], google_api_key[-5:])
 else:
     logger.error("Google API key not found!")
 
 if search_engine_id:
-    logger.info(f"Google Search Engine ID loaded: {search_engine_id}")
+    logger.info("Google Search Engine ID loaded: %s", search_engine_id)
 else:
     logger.error("Google Search Engine ID not found!")
 
-config_list = [
-    {
-        "model": "gpt-3.5-turbo",
-        "api_key": api_key
+def model_config(model: str) -> Dict[str, Any]:
+    """OpenAI client configuration for a single model."""
+    return {
+        "model": model,
+        "api_key": api_key,
+        # Retries are handled by the resilience layer, not the OpenAI client
+        "max_retries": 0
     }
-]
+
+def config_list_for(agent_type: str) -> List[Dict[str, Any]]:
+    """autogen config_list holding the model fallback chain routed to an agent type."""
+    return [model_config(model) for model in model_router.chain(agent_type)]
+
+# OpenAI clients per (agent, model), built on first use by the model router
+_routed_clients = {}
+_routed_clients_lock = threading.Lock()
+
+def routed_client(agent, model: str) -> autogen.OpenAIWrapper:
+    """Get the OpenAI client that sends the agent's requests to a specific model."""
+    key = (agent.name, model)
+    with _routed_clients_lock:
+        client = _routed_clients.get(key)
+        if client is None:
+            base_config = {k: v for k, v in agent.llm_config.items() if k != "config_list"}
+            client = autogen.OpenAIWrapper(config_list=[model_config(model)], **base_config)
+            _routed_clients[key] = client
+        return client
+
+# Completion size assumed for admission control when a call sets no max_tokens
+DEFAULT_COMPLETION_TOKEN_ESTIMATE = 1000
+
+# Custom Search clients per thread: building one loads and parses the discovery
+# document, and googleapiclient services must not be shared between threads
+_customsearch = threading.local()
+
+def customsearch_service():
+    """Get this thread's Google Custom Search client, building it on first use."""
+    service = getattr(_customsearch, "service", None)
+    if service is None:
+        service = build("customsearch", "v1", developerKey=google_api_key)
+        _customsearch.service = service
+    return service
 
 # Function: Google Search
 def google_search(query: str, num_results: int = 3) -> List[Dict[str, str]]:
@@ -52,7 +106,7 @@ def google_search(query: str, num_results: int = 3) -> List[Dict[str, str]]:
         List of dictionaries containing search results
     """
     try:
-        logger.info(f"Starting Google search for query: '{query}', num_results={num_results}")
+        logger.debug("Starting Google search for query: '%s', num_results=%s", query, num_results)
         
         if not google_api_key:
             logger.error("Google API key is missing! Cannot perform search.")
@@ -62,16 +116,19 @@ def google_search(query: str, num_results: int = 3) -> List[Dict[str, str]]:
             logger.error("Google Search Engine ID is missing! Cannot perform search.")
             return []
         
-        logger.info(f"Google API configuration - API key: {google_api_key[:4]}...{google_api_key[-4:]}, Engine ID: {search_engine_id}")
-        service = build("customsearch", "v1", developerKey=google_api_key)
+        service = customsearch_service()
         
-        logger.info("Sending request to Google Custom Search API")
-        result = service.cse().list(q=query, cx=search_engine_id, num=num_results).execute()
-        logger.info(f"Google search API request complete. Total results: {result.get('searchInformation', {}).get('totalResults', 'unknown')}")
+        def attempt():
+            google_limiter.acquire({"queries": 1})
+            return service.cse().list(q=query, cx=search_engine_id, num=num_results).execute()
         
+        # Recorded or replayed when CASSETTE_MODE is set
+        result = cassette.call("google_search", {"q": query, "num": num_results},
+                               lambda: google_upstream.call(attempt))
         search_results = []
         items = result.get("items", [])
-        logger.info(f"Processing {len(items)} search results")
+        logger.debug("Google search returned %s of %s results", len(items),
+                     result.get('searchInformation', {}).get('totalResults', 'unknown'))
         
         for item in items:
             search_results.append({
@@ -80,35 +137,43 @@ def google_search(query: str, num_results: int = 3) -> List[Dict[str, str]]:
                 "snippet": item.get("snippet", "")
             })
             
-        logger.info(f"Processed {len(search_results)} search results successfully")
         return search_results
+    except (RateLimitExceeded, CircuitOpenError) as e:
+        logger.warning("Google search skipped: %s", e)
+        return []
     except Exception as e:
-        logger.error(f"Google search error: {str(e)}")
-        # Include more detailed error information
-        import traceback
-        logger.error(f"Google search traceback: {traceback.format_exc()}")
+        # The traceback is only rendered when debug logging is enabled
+        logger.error("Google search error: %s", e, exc_info=logger.isEnabledFor(logging.DEBUG))
         return []
 
 # Function: Google Image Search
-def google_image_search(query: str, num_results: int = 5) -> List[Dict[str, str]]:
+def google_image_search(query: str, num_results: int = 5, start: int = 1) -> List[Dict[str, str]]:
     """
     Search for images with simpler, more reliable approach.
     
     Args:
         query: The search query
-        num_results: Number of results to return
+        num_results: Number of results to return (at most 10 per page)
+        start: 1-based index of the first result, used for paging
         
     Returns:
         List of dictionaries containing image results
     """
     try:
-        service = build("customsearch", "v1", developerKey=google_api_key)
-        result = service.cse().list(
-            q=query,
-            cx=search_engine_id,
-            searchType="image",
-            num=num_results
-        ).execute()
+        service = customsearch_service()
+        
+        def attempt():
+            google_limiter.acquire({"queries": 1})
+            return service.cse().list(
+                q=query,
+                cx=search_engine_id,
+                searchType="image",
+                num=min(num_results, 10),
+                start=start
+            ).execute()
+        
+        result = cassette.call("google_image_search", {"q": query, "num": min(num_results, 10), "start": start},
+                               lambda: google_upstream.call(attempt))
 
         images = []
         if "items" in result:
@@ -118,13 +183,38 @@ def google_image_search(query: str, num_results: int = 5) -> List[Dict[str, str]
                     "link": item.get("link", ""),
                     "thumbnail": item.get("image", {}).get("thumbnailLink", item.get("link", "")),
                     "context": item.get("image", {}).get("contextLink", ""),
+                    "width": item.get("image", {}).get("width", 0),
+                    "height": item.get("image", {}).get("height", 0),
                 })
                 
         return images
+    except (RateLimitExceeded, CircuitOpenError) as e:
+        logger.warning("Image search skipped: %s", e)
+        return []
     except Exception as e:
-        logger.error(f"Image search error: {str(e)}")
+        logger.error("Image search error: %s", e)
         return []
 
+# Image candidates are probed and ranked before they reach users
+image_pipeline = build_image_pipeline(google_image_search)
+
+# Used when image search cannot produce enough working images
+FALLBACK_IMAGE_URLS = [
+    "https://images.unsplash.com/photo-1523906834658-6e24ef2386f9",
+    "https://images.unsplash.com/photo-1515542622106-78bda8ba0e5b",
+    "https://images.unsplash.com/photo-1511739001486-6bfe10ce785f",
+    "https://images.unsplash.com/photo-1520939817895-060bdaf4bc05",
+    "https://images.unsplash.com/photo-1532498551838-b7a1cfac622e"
+]
+
+# Heading of the canned insights used when review search finds nothing or fails
+DEFAULT_INSIGHTS_MARKER = "Using Default Information"
+
+
+class AgentCallError(RuntimeError):
+    """Raised when an agent call fails or yields no reply, so callers can fall back or retry."""
+
+
 # Function schemas for agent tools
 google_search_schema = {
     "name": "google_search",
@@ -157,34 +247,134 @@ def is_termination_msg(message: dict) -> bool:
     """
     Check if a message is a termination message.
     
+    A reply ends the conversation once its completion finished with a terminal
+    finish reason (the model stopped on its own, hit a stop sequence, or used up
+    its output budget). Messages carrying the legacy TASK_COMPLETE marker are
+    still recognised for conversations run outside the guarded LLM reply.
+    
     Args:
         message: The message to check
         
     Returns:
         Boolean indicating if the message is a termination message
     """
-    if isinstance(message, dict):
-        return message.get("content") and "TASK_COMPLETE" in message["content"]
-    return False
+    if not isinstance(message, dict):
+        return False
+    state = current_completion.get()
+    if state is not None and state.finished:
+        return True
+    return bool(message.get("content")) and TERMINATION_MARKER in message["content"]
 
-# Helper function to print the agent's chat history
+# Guarded LLM call that replaces autogen's default OpenAI reply
+def guarded_oai_reply(recipient, messages=None, sender=None, config=None):
+    """
+    Generate the agent's LLM reply through model routing, admission control and the resilience layer.
+    
+    Registered as an autogen reply function just ahead of `generate_oai_reply`.
+    Completion parameters come from the stage's immutable `GenerationSettings`
+    (or a per-call override). Models are tried in the order chosen by the model
+    router; every attempt (including retries and hedged requests) reserves OpenAI
+    request and token budget before calling the model.
+    
+    Args:
+        recipient: The agent generating the reply
+        messages: Conversation so far
+        sender: The agent that sent the last message
+        config: Registration config holding the agent type
+        
+    Raises:
+        RateLimitExceeded: If the call cannot be admitted within the wait budget
+        CircuitOpenError: If the circuit of every routed model is open
+        RequestCancelled: If the request this reply belongs to was cancelled
+    """
+    if recipient.client is None:
+        return False, None
+    # Runs once per LLM turn, so a cancelled request stops between turns
+    check_cancelled()
+    if messages is None:
+        messages = recipient.chat_messages[sender]
+    # generate_reply passes the stored conversation itself, so trimming it in place bounds what is kept
+    dropped = cap_history(messages)
+    if dropped:
+        logger.warning("Dropped %d old messages from %s's conversation", dropped, recipient.name)
+    agent_type = (config or {}).get("agent_type", recipient.name)
+    settings = settings_for(agent_type)
+    create_kwargs = settings.as_create_kwargs()
+    system_messages = [{"content": recipient.system_message, "role": "system"}]
+    context = messages[-1].pop("context", None) if messages else None
+    prompt_tokens = estimate_tokens(recipient.system_message)
+    for msg in messages:
+        prompt_tokens += estimate_tokens(str(msg.get("content") or ""))
+    completion_tokens = settings.max_tokens or DEFAULT_COMPLETION_TOKEN_ESTIMATE
+    
+    last_error = None
+    for model in model_router.route(agent_type):
+        client = routed_client(recipient, model)
+        
+        def attempt():
+            openai_limiter.acquire({"requests": 1, "tokens": prompt_tokens + completion_tokens})
+            # Generation settings are passed per call; shared llm_config is never modified
+            response = client.create(context=context, messages=system_messages + messages, **create_kwargs)
+            extracted = client.extract_text_or_completion_object(response)[0]
+            if not isinstance(extracted, str):
+                extracted = extracted.model_dump()
+            return extracted, response.choices[0].finish_reason
+        
+        start = time.monotonic()
+        try:
+            # Recorded or replayed when CASSETTE_MODE is set; replay skips admission and the network
+            reply, finish_reason = cassette.call(
+                "openai", {"model": model, "messages": system_messages + messages, **create_kwargs},
+                lambda: openai_upstream.call(attempt, key=model)
+            )
+        except RateLimitExceeded:
+            raise
+        except CircuitOpenError as e:
+            # Each model has its own circuit; route around one that is open
+            logger.warning("Circuit for %s is open, trying next model for %s", model, agent_type)
+            last_error = e
+            continue
+        except Exception as e:
+            model_router.record_failure(model)
+            logger.warning("Model %s failed for %s (%s), trying next model", model, agent_type, type(e).__name__)
+            last_error = e
+            continue
+        model_router.record_success(model, time.monotonic() - start)
+        # Lets is_termination_msg end the chat as soon as the answer is complete
+        record_finish_reason(finish_reason)
+        return True, reply
+    
+    raise last_error
+
+def register_llm_hooks(agent, agent_type: str):
+    """Insert the LLM call hooks directly before the agent's OpenAI reply function."""
+    position = next(
+        i for i, entry in enumerate(agent._reply_func_list)
+        if entry["reply_func"] is autogen.ConversableAgent.generate_oai_reply
+    )
+    agent.register_reply([autogen.Agent, None], guarded_oai_reply, position=position,
+                         config={"agent_type": agent_type})
+    return agent
+
+# Helper function to log the agent's chat history
 def print_agent_chat_history(agent):
     """
-    Print the agent's chat history for debugging purposes.
+    Log the agent's chat history at DEBUG level for debugging purposes.
+    
+    The history is not iterated at all unless debug logging is enabled.
     
     Args:
         agent: The agent instance
     """
+    if not logger.isEnabledFor(logging.DEBUG):
+        return
     try:
         if hasattr(agent, "chat_history"):
-            print(f"\n--- {agent.name} Chat History ---")
             for msg in agent.chat_history:
-                sender = msg.get("sender", "Unknown")
-                content = msg.get("content", "No content")
-                print(f"{sender}: {content[:100]}...")
-            print("----------------------------\n")
+                logger.debug("%s chat history - %s: %.100s...", agent.name,
+                             msg.get("sender", "Unknown"), msg.get("content", "No content"))
     except Exception as e:
-        print(f"Error printing chat history: {str(e)}")
+        logger.debug("Error logging chat history: %s", e)
 
 # Helper function to extract the last message from an agent
 def extract_last_message_content(agent):
@@ -220,7 +410,7 @@ def extract_last_message_content(agent):
         
         return None
     except Exception as e:
-        logger.error(f"Error extracting last message: {str(e)}")
+        logger.error("Error extracting last message: %s", e)
         return None
 
 class AgentFactory:
@@ -231,7 +421,7 @@ class AgentFactory:
         """Create an attractions & sightseeing agent."""
         return autogen.AssistantAgent(
             name="SightseeingAgent",
-            llm_config={"config_list": config_list},
+            llm_config={"config_list": config_list_for("attractions")},
             system_message="""You are an expert travel guide specializing in attractions, sightseeing, and entertainment recommendations.
 
 Your expertise includes:
@@ -249,7 +439,6 @@ For each destination, provide comprehensive recommendations with:
 - Logical organization of attractions by neighborhood or proximity
 
 Format your responses using markdown with clear headings and bullet points.
-After providing your complete response, add "TASK_COMPLETE" on a new line.
 """
         )
     
@@ -258,7 +447,7 @@ After providing your complete response, add "TASK_COMPLETE" on a new line.
         """Create a food & cuisine agent."""
         return autogen.AssistantAgent(
             name="FoodAgent",
-            llm_config={"config_list": config_list},
+            llm_config={"config_list": config_list_for("food")},
             system_message="""You are a culinary expert with deep knowledge of global cuisines and restaurant scenes.
 
 Your expertise includes:
@@ -276,7 +465,6 @@ For each destination, provide comprehensive food recommendations with:
 - Local etiquette for dining and tipping
 
 Format your responses using markdown with clear headings and bullet points.
-After providing your complete response, add "TASK_COMPLETE" on a new line.
 """
         )
     
@@ -285,7 +473,7 @@ After providing your complete response, add "TASK_COMPLETE" on a new line.
         """Create an accommodation agent."""
         return autogen.AssistantAgent(
             name="AccommodationAgent",
-            llm_config={"config_list": config_list},
+            llm_config={"config_list": config_list_for("accommodation")},
             system_message="""You are an accommodation specialist with expert knowledge of hotels, rentals, and lodging options worldwide.
 
 Your expertise includes:
@@ -303,7 +491,6 @@ For each destination, provide comprehensive accommodation recommendations with:
 - Insider tips for booking and potential upgrades
 
 Format your responses using markdown with clear headings and bullet points.
-After providing your complete response, add "TASK_COMPLETE" on a new line.
 """
         )
     
@@ -313,7 +500,7 @@ After providing your complete response, add "TASK_COMPLETE" on a new line.
         agent = autogen.AssistantAgent(
             name="ReviewsAgent",
             llm_config={
-                "config_list": config_list,
+                "config_list": config_list_for("reviews"),
                 "functions": [google_search_schema]
             },
             system_message="""You are a travel insights specialist who curates and synthesizes traveler reviews, blog posts, and current information about destinations.
@@ -334,7 +521,6 @@ For each search query:
 6. Provide source attribution for significant information
 
 Format your responses using markdown with clear headings and bullet points.
-After providing your complete response, add "TASK_COMPLETE" on a new line.
 """
         )
         agent.register_function({"google_search": google_search})
@@ -346,7 +532,7 @@ After providing your complete response, add "TASK_COMPLETE" on a new line.
         agent = autogen.AssistantAgent(
             name="ImageSearchAgent",
             llm_config={
-                "config_list": config_list,
+                "config_list": config_list_for("images"),
                 "functions": [image_search_schema]
             },
             system_message="""You are a visual exploration specialist who finds compelling and representative images of travel destinations.
@@ -367,7 +553,6 @@ https://example.com/image2.jpg
 https://example.com/image3.jpg
 
 No additional text, formatting, or explanations should be included.
-After providing your complete response, add "TASK_COMPLETE" on a new line.
 """
         )
         agent.register_function({"google_image_search": google_image_search})
@@ -378,7 +563,7 @@ After providing your complete response, add "TASK_COMPLETE" on a new line.
         """Create a trip planner agent that coordinates information from other agents."""
         return autogen.AssistantAgent(
             name="TripPlannerAgent",
-            llm_config={"config_list": config_list},
+            llm_config={"config_list": config_list_for("planner")},
             system_message="""You are a comprehensive travel planner who creates cohesive itineraries by coordinating specialized information from other agents.
 
 Your expertise includes:
@@ -411,8 +596,6 @@ Your complete response format MUST include:
 5. ALL image URLs provided, placed at relevant points in your itinerary
 
 NO INFORMATION SHOULD BE LOST OR MODIFIED IN YOUR RESPONSE. Your task is to organize and present the information, not to filter or summarize it.
-
-After providing your complete response, add "TASK_COMPLETE" on a new line.
 """
         )
 
@@ -423,8 +606,33 @@ class AgentService:
         """Initialize the agent service."""
         self.factory = AgentFactory()
         self.agents = {}
+        self.proxies = ProxyPool(self._create_proxy)
         self.initialize_agents()
     
+    @staticmethod
+    def _create_proxy():
+        """Build the proxy agent that sends a query to a specialized agent and ends the chat."""
+        return autogen.UserProxyAgent(
+            name="TempProxy",
+            human_input_mode="NEVER",
+            max_consecutive_auto_reply=10,
+            is_termination_msg=is_termination_msg,
+            code_execution_config=False,
+        )
+    
+    def memory_snapshot(self) -> Dict[str, Any]:
+        """
+        Report the conversation state each agent retains, plus process RSS.
+        
+        Conversations are released after every call, so `retained_bytes` should be
+        zero for idle agents and RSS should stay flat across plans.
+        """
+        return {
+            "rss_bytes": process_rss_bytes(),
+            "agents": {agent_type: retained_memory(agent) for agent_type, agent in self.agents.items()},
+            "proxy_pool": self.proxies.snapshot(),
+        }
+    
     def initialize_agents(self):
         """Initialize all specialized agents."""
         try:
@@ -448,23 +656,127 @@ class AgentService:
                 "images": self.factory.create_image_search_agent(),
                 "planner": self.factory.create_trip_planner_agent()
             }
+            for agent_type, agent in self.agents.items():
+                register_llm_hooks(agent, agent_type)
             logger.info("All agents initialized successfully")
         except Exception as e:
-            logger.error(f"Error initializing agents: {str(e)}")
+            logger.error("Error initializing agents: %s", e)
             # Create a minimal set of working agents or raise the error
             raise
     
-    def get_agent_response(self, agent_type: str, query: str) -> str:
+    def preconnect(self, timeout: float = 10.0) -> List[str]:
+        """
+        Open a pooled OpenAI connection for each agent's primary model.
+        
+        Every agent has its own OpenAI client and connection pool, so each one makes a
+        models.retrieve request (no tokens used) to finish DNS, TCP and TLS setup
+        before the first plan needs it.
+        
+        Args:
+            timeout: Per-request timeout in seconds
+            
+        Returns:
+            The "agent/model" pairs that were reached
+            
+        Raises:
+            RuntimeError: If any agent could not reach its model
+        """
+        targets = [
+            (agent_type, agent, model_router.primary(agent_type))
+            for agent_type, agent in self.agents.items()
+            if agent.client is not None
+        ]
+        
+        def connect(target):
+            agent_type, agent, model = target
+            # OpenAIWrapper keeps one OpenAI client per config; routed clients have a single config
+            routed_client(agent, model)._clients[0].models.retrieve(model, timeout=timeout)
+            return f"{agent_type}/{model}"
+        
+        reached, failures = [], []
+        with ThreadPoolExecutor(max_workers=max(1, len(targets)), thread_name_prefix="preconnect") as pool:
+            futures = [(target, pool.submit(connect, target)) for target in targets]
+            for (agent_type, _, model), future in futures:
+                try:
+                    reached.append(future.result())
+                except Exception as e:
+                    failures.append(f"{agent_type}/{model} ({type(e).__name__})")
+        if failures:
+            raise RuntimeError(f"Could not reach OpenAI for {', '.join(failures)}")
+        return reached
+    
+    def get_agent_response(self, agent_type: str, query: str, priority: int = None,
+                           generation: GenerationSettings = None) -> str:
         """
         Get a response from a specific agent.
         
         Args:
             agent_type: Type of agent to query (attractions, food, etc.)
             query: The query string
+            priority: Optional admission priority for the upstream calls made by this query
+            generation: Optional generation settings replacing the stage defaults for this call
             
         Returns:
             Response string from the agent
+            
+        Raises:
+            AgentCallError: If the agent could not be reached or gave no reply
+            RateLimitExceeded: If the OpenAI call could not be admitted in time
+            CircuitOpenError: If the OpenAI circuit is open
+            RequestCancelled: If the current request was cancelled
         """
+        check_cancelled()
+        with self._call_scope(priority, generation):
+            return self._get_agent_response(agent_type, query)
+    
+    def get_planner_part(self, query: str, priority: int = None,
+                         generation: GenerationSettings = None) -> str:
+        """
+        Have the TripPlannerAgent write one part of an itinerary, such as the outline or a day.
+        
+        Unlike `get_agent_response`, the query is sent as is (without the instruction
+        to repeat the insights, links and images verbatim, which the parts leave out)
+        and failures raise instead of being returned as error text, so they cannot be
+        merged into the itinerary.
+        
+        Args:
+            query: The query string
+            priority: Optional admission priority for the upstream calls made by this query
+            generation: Optional generation settings replacing the planner defaults for this call
+            
+        Returns:
+            The planner's reply
+            
+        Raises:
+            RuntimeError: If the planner gave no reply
+            RateLimitExceeded, CircuitOpenError, RequestCancelled: As for the upstream call
+        """
+        check_cancelled()
+        agent = self.agents["planner"]
+        with self._call_scope(priority, generation):
+            temp_proxy = self.proxies.acquire(10)
+            try:
+                temp_proxy.initiate_chat(agent, message=query)
+                content = last_reply(agent, temp_proxy)
+            finally:
+                release_conversation(agent, temp_proxy)
+                self.proxies.release(temp_proxy)
+        if not content or not content.strip():
+            raise RuntimeError("the planner gave no reply")
+        return content.strip()
+    
+    @staticmethod
+    def _call_scope(priority: int = None, generation: GenerationSettings = None) -> ExitStack:
+        scopes = ExitStack()
+        if priority is not None:
+            scopes.enter_context(request_priority(priority))
+        if generation is not None:
+            scopes.enter_context(generation_scope(generation))
+        scopes.enter_context(completion_scope())
+        return scopes
+    
+    def _get_agent_response(self, agent_type: str, query: str) -> str:
+        """Run the query against the agent; see `get_agent_response`."""
         if agent_type not in self.agents:
             raise ValueError(f"Unknown agent type: {agent_type}")
         
@@ -472,44 +784,24 @@ class AgentService:
         
         # For search agents, directly use the API without LLM processing
         if agent_type == "images":
-            logger.info(f"Using direct image search for query: {query}")
+            logger.debug("Using direct image search for query: %s", query)
             return direct_image_search(query)
         elif agent_type == "reviews":
-            logger.info(f"Using direct reviews search for query: {query}")
+            logger.debug("Using direct reviews search for query: %s", query)
             return direct_reviews_search(query)
             
-        # Create a temporary proxy agent with termination condition
-        temp_proxy = autogen.UserProxyAgent(
-            name="TempProxy",
-            human_input_mode="NEVER",
-            max_consecutive_auto_reply=10,
-            is_termination_msg=is_termination_msg,
-            code_execution_config=False,
-        )
+        # Pooled proxy agent with termination condition; complex planner outputs may need more turns
+        temp_proxy = self.proxies.acquire(25 if agent.name == "TripPlannerAgent" else 10)
         
         try:
-            # Clear the chat history
-            temp_proxy.reset()
-            agent.reset()
-            
             # Start a chat and get the response
             # For regular agents including TripPlannerAgent
-            logger.info(f"Initiating chat with regular agent {agent.name} for query: {query}")
+            logger.info("Initiating chat with regular agent %s for query: %s", agent.name, query)
             
             # Special handling for TripPlannerAgent to preserve all data
             if agent.name == "TripPlannerAgent":
                 logger.info("Using enhanced extraction for TripPlannerAgent")
                 try:
-                    # Set higher max_consecutive_auto_reply for TripPlannerAgent to allow for complex outputs
-                    temp_proxy.max_consecutive_auto_reply = 25
-                    
-                    # Increase the max token limit for TripPlannerAgent to handle verbose outputs
-                    if "llm_config" in agent.__dict__ and "config_list" in agent.llm_config:
-                        for config in agent.llm_config["config_list"]:
-                            # Increase max tokens for output
-                            if "api_type" not in config or config["api_type"] == "open_ai":
-                                config["max_tokens"] = 4000
-                    
                     # Initiate chat with explicit message to preserve all input data
                     enhanced_query = f"""
 {query}
@@ -524,19 +816,17 @@ This is especially important for:
 DO NOT MODIFY, SUMMARIZE, OR OMIT ANY INFORMATION from these sections.
 The final itinerary MUST include ALL of this information exactly as provided.
 """
-                    logger.info(f"Sending enhanced query to TripPlannerAgent with specific preservation instructions")
+                    logger.info("Sending enhanced query to TripPlannerAgent with specific preservation instructions")
                     chat_result = temp_proxy.initiate_chat(agent, message=enhanced_query)
                     
                     # Try more aggressively to extract all content
                     full_response = ""
                     
-                    # Method 1: Extract from chat_messages
-                    if hasattr(temp_proxy, "chat_messages") and agent in temp_proxy.chat_messages:
-                        for msg in reversed(temp_proxy.chat_messages[agent]):
-                            if msg.get("role") == "assistant" and "content" in msg and msg["content"] is not None:
-                                full_response = msg["content"]
-                                logger.info("Successfully extracted response from chat_messages")
-                                break
+                    # Method 1: The planner's own side of this conversation
+                    # (in the proxy's history, "assistant" messages are the proxy's)
+                    full_response = last_reply(agent, temp_proxy) or ""
+                    if full_response:
+                        logger.info("Successfully extracted response from chat_messages")
                     
                     # Method 2: If not found, try to extract from agent's chat history
                     if not full_response and hasattr(agent, "chat_history") and agent.chat_history:
@@ -554,47 +844,49 @@ The final itinerary MUST include ALL of this information exactly as provided.
                                 full_response = last_msg["content"]
                                 logger.info("Successfully extracted response using last_message method")
                         except Exception as last_msg_error:
-                            logger.error(f"Error extracting last message: {str(last_msg_error)}")
+                            logger.error("Error extracting last message: %s", last_msg_error)
                     
                     # Process the response if found
                     if full_response:
-                        # Clean up response - remove TASK_COMPLETE marker
-                        clean_response = full_response.replace("TASK_COMPLETE", "").strip()
-                        logger.info(f"Successfully extracted TripPlannerAgent response of length {len(clean_response)}")
+                        # The marker is a stop sequence, so only whitespace needs trimming
+                        clean_response = full_response.strip()
+                        logger.info("Successfully extracted TripPlannerAgent response of length %s", len(clean_response))
                         
                         # Verify that the response includes key expected sections
                         has_insights = "TRAVELER INSIGHTS" in clean_response
                         has_resource_links = "Useful Resource Links" in clean_response or "USEFUL RESOURCE LINKS" in clean_response
                         
                         if not has_insights or not has_resource_links:
-                            logger.warning(f"Response may be missing key sections - has_insights: {has_insights}, has_resource_links: {has_resource_links}")
+                            logger.warning("Response may be missing key sections - has_insights: %s, has_resource_links: %s", has_insights, has_resource_links)
                         
                         return clean_response
                     
                     logger.error("Failed to extract content from TripPlannerAgent after trying multiple methods")
-                    return "Error: Could not extract full response from TripPlannerAgent. The response may be too large or an unexpected format."
+                    raise AgentCallError("Could not extract a response from TripPlannerAgent")
+                except (RateLimitExceeded, CircuitOpenError, AgentCallError):
+                    raise
                 except Exception as e:
-                    logger.error(f"Error during chat with TripPlannerAgent: {str(e)}")
-                    return f"Error communicating with TripPlannerAgent: {str(e)}"
+                    logger.error("Error during chat with TripPlannerAgent: %s", e)
+                    raise AgentCallError(f"Error communicating with TripPlannerAgent: {str(e)}") from e
             
             # For other regular agents
             try:
                 chat_result = temp_proxy.initiate_chat(agent, message=query)
-                logger.info(f"Chat with {agent.name} completed successfully")
+                logger.info("Chat with %s completed successfully", agent.name)
                 
                 # Print the chat history for debugging
                 print_agent_chat_history(agent)
                 
-                # Try to extract the last message using our helper function
-                content = extract_last_message_content(agent)
+                # This conversation first; other calls may be talking to the same agent
+                content = last_reply(agent, temp_proxy) or extract_last_message_content(agent)
                 if content:
-                    logger.info(f"Successfully extracted message from {agent.name}")
-                    return content.replace("TASK_COMPLETE", "").strip()
+                    logger.info("Successfully extracted message from %s", agent.name)
+                    return content.strip()
                 
                 # Debug the chat_result structure
-                logger.info(f"Chat result type: {type(chat_result)}")
+                logger.debug("Chat result type: %s", type(chat_result))
                 if isinstance(chat_result, list) and len(chat_result) > 0:
-                    logger.info(f"Chat result contains {len(chat_result)} messages")
+                    logger.debug("Chat result contains %s messages", len(chat_result))
                 
                 # The problem might be that we're checking if chat_result is truthy,
                 # but it might be an empty list or some other non-None value
@@ -607,48 +899,58 @@ The final itinerary MUST include ALL of this information exactly as provided.
                 for msg in reversed(messages):
                     if msg and isinstance(msg, dict) and msg.get("role") == "assistant" and msg.get("content") is not None:
                         content = msg["content"]
-                        logger.info(f"Found content in chat history from {agent.name}")
-                        # Remove the TASK_COMPLETE marker if present
-                        return content.replace("TASK_COMPLETE", "").strip()
+                        logger.info("Found content in chat history from %s", agent.name)
+                        return content.strip()
                         
                 # If we couldn't find a message in chat_result, try last_message methods
-                logger.info(f"Trying alternative methods to get response from {agent.name}")
+                logger.info("Trying alternative methods to get response from %s", agent.name)
+            except (RateLimitExceeded, CircuitOpenError):
+                raise
             except Exception as e:
-                logger.error(f"Error during chat with {agent.name}: {str(e)}")
-                return f"Error communicating with {agent.name}: {str(e)}"
+                logger.error("Error during chat with %s: %s", agent.name, e)
+                raise AgentCallError(f"Error communicating with {agent.name}: {str(e)}") from e
             
             try:
                 response = agent.last_message()
                 if response and isinstance(response, dict) and "content" in response and response["content"] is not None:
-                    # Remove the TASK_COMPLETE marker if present
-                    return response["content"].replace("TASK_COMPLETE", "").strip()
+                    return response["content"].strip()
                 else:
-                    logger.warning(f"Invalid response format from {agent.name}: {response}")
-                    return f"No valid response from {agent.name}. Please try a different query."
+                    logger.warning("Invalid response format from %s: %s", agent.name, response)
+                    raise AgentCallError(f"No valid response from {agent.name}")
+            except AgentCallError:
+                raise
             except Exception as e:
-                logger.error(f"Error getting response from {agent.name}: {str(e)}")
+                logger.error("Error getting response from %s: %s", agent.name, e)
                 try:
                     response = agent.last_message(temp_proxy)
                     if response and isinstance(response, dict) and "content" in response and response["content"] is not None:
-                        return response["content"].replace("TASK_COMPLETE", "").strip()
+                        return response["content"].strip()
                     else:
-                        logger.warning(f"Invalid secondary response format from {agent.name}: {response}")
-                        return f"Could not retrieve a proper response from {agent.name}. Please try a different query."
+                        logger.warning("Invalid secondary response format from %s: %s", agent.name, response)
+                        raise AgentCallError(f"Could not retrieve a proper response from {agent.name}")
+                except AgentCallError:
+                    raise
                 except Exception as inner_e:
-                    logger.error(f"Failed to get response with sender specified: {str(inner_e)}")
-                    return f"Error retrieving response from {agent.name}: {str(inner_e)}"
-            
-            # This return statement should not be reached, but is included as a fallback
-            return f"Could not retrieve a proper response from {agent.name}. Please try again with a different query."
+                    logger.error("Failed to get response with sender specified: %s", inner_e)
+                    raise AgentCallError(f"Error retrieving response from {agent.name}: {str(inner_e)}") from inner_e
+        except (RateLimitExceeded, CircuitOpenError, AgentCallError):
+            raise
         except Exception as e:
-            logger.error(f"Unexpected error in get_agent_response for {agent_type}: {str(e)}")
-            return f"An error occurred while processing your request: {str(e)}"
+            logger.error("Unexpected error in get_agent_response for %s: %s", agent_type, e)
+            raise AgentCallError(f"An error occurred while processing your request: {str(e)}") from e
+        finally:
+            # The result has been extracted; drop the prompt and answer held by both agents
+            release_conversation(agent, temp_proxy)
+            self.proxies.release(temp_proxy)
 
 # Replace the ImageSearchAgent implementation with direct API handling
 def direct_image_search(query: str) -> str:
     """
     Performs image search and returns the results directly without LLM processing.
     
+    Candidates are paged, deduplicated, ranked and liveness-probed by the image
+    pipeline; fallback images only fill the slots left when fewer than five survive.
+    
     Args:
         query: The search query
         
@@ -656,77 +958,19 @@ def direct_image_search(query: str) -> str:
         String containing image URLs separated by newlines
     """
     try:
-        results = google_image_search(query)
-        if not results:
-            logger.warning(f"No image search results found for query: {query}")
-            return """https://images.unsplash.com/photo-1523906834658-6e24ef2386f9
-https://images.unsplash.com/photo-1515542622106-78bda8ba0e5b
-https://images.unsplash.com/photo-1511739001486-6bfe10ce785f
-https://images.unsplash.com/photo-1520939817895-060bdaf4bc05
-https://images.unsplash.com/photo-1532498551838-b7a1cfac622e"""
-            
-        # Extract URLs directly from results
-        image_urls = [item.get("link", "") for item in results if item.get("link")]
-        
-        # Deduplicate URLs using more sophisticated approach
-        unique_images = []
-        seen_patterns = set()  # Track URL patterns we've seen
-        
-        for url in image_urls:
-            # Skip empty URLs
-            if not url:
-                continue
-                
-            # Extract filename and base parts for checking similarity
-            filename = url.split('/')[-1].lower()
-            base_url = '/'.join(url.split('/')[:-1])
-            
-            # Create a similarity pattern by combining parts of the URL and filename
-            # This helps catch different sizes/versions of the same image
-            url_parts = url.split('/')
-            domain = url_parts[2] if len(url_parts) > 2 else ""
-            
-            # Extract parts of the filename to create a pattern
-            # This handles cases where the same image has different size suffixes or parameters
-            filename_base = filename.split('.')[0]
-            # Remove common size indicators like dimensions (e.g., 500x300)
-            filename_base = re.sub(r'-\d+x\d+', '', filename_base)
-            filename_base = re.sub(r'_\d+x\d+', '', filename_base)
-            # Remove common parameters 
-            filename_base = re.sub(r'-\d+$', '', filename_base)
-            
-            # Create a similarity key
-            similarity_key = f"{domain}:{filename_base}"
-            
-            # If we haven't seen this pattern before, add it
-            if similarity_key not in seen_patterns:
-                seen_patterns.add(similarity_key)
-                unique_images.append(url)
-                
-            # Make sure we get at least 5 images if available
-            if len(unique_images) >= 5:
-                break
+        unique_images = image_pipeline.find_images(query, count=5)
+        if not unique_images:
+            logger.warning("No image search results found for query: %s", query)
         
         # If we have fewer than 5 valid URLs, add fallbacks to reach 5
         if len(unique_images) < 5:
-            fallback_urls = [
-                "https://images.unsplash.com/photo-1523906834658-6e24ef2386f9",
-                "https://images.unsplash.com/photo-1515542622106-78bda8ba0e5b",
-                "https://images.unsplash.com/photo-1511739001486-6bfe10ce785f",
-                "https://images.unsplash.com/photo-1520939817895-060bdaf4bc05",
-                "https://images.unsplash.com/photo-1532498551838-b7a1cfac622e"
-            ]
-            unique_images.extend(fallback_urls[:(5-len(unique_images))])
+            unique_images.extend(FALLBACK_IMAGE_URLS[:(5-len(unique_images))])
         
         # Return up to 5 unique image URLs as a newline-separated string
         return "\n".join(unique_images[:5])
     except Exception as e:
-        logger.error(f"Error in direct_image_search: {str(e)}")
-        return """https://images.unsplash.com/photo-1523906834658-6e24ef2386f9
-https://images.unsplash.com/photo-1515542622106-78bda8ba0e5b
-https://images.unsplash.com/photo-1511739001486-6bfe10ce785f
-https://images.unsplash.com/photo-1520939817895-060bdaf4bc05
-https://images.unsplash.com/photo-1532498551838-b7a1cfac622e"""
+        logger.error("Error in direct_image_search: %s", e)
+        return "\n".join(FALLBACK_IMAGE_URLS)
 
 # Direct reviews search function - similar to direct_image_search
 def direct_reviews_search(query: str) -> str:
@@ -740,15 +984,15 @@ def direct_reviews_search(query: str) -> str:
         Formatted string with search results
     """
     try:
-        logger.info(f"direct_reviews_search started for query: {query}")
+        logger.debug("direct_reviews_search started for query: %s", query)
         results = google_search(query, num_results=5)
-        logger.info(f"Google search completed. Number of results: {len(results) if results else 0}")
+        logger.debug("Google search completed. Number of results: %s", len(results) if results else 0)
         
         if not results:
-            logger.warning(f"No Google search results found for query: {query}")
+            logger.warning("No Google search results found for query: %s", query)
             return f"""# TRAVELER INSIGHTS AND REVIEWS 
 
-## No Search Results Found - Using Default Information
+## No Search Results Found - {DEFAULT_INSIGHTS_MARKER}
 
 ### Local Experiences
 - Travelers consistently mention the welcoming atmosphere and rich cultural experiences.
@@ -792,7 +1036,7 @@ def direct_reviews_search(query: str) -> str:
             link = result.get("link", "")
             
             # Log the result for debugging
-            logger.info(f"Processing result {i+1}: Title: {title[:30]}..., Link: {link[:30]}...")
+            logger.debug("Processing result %s: Title: %.30s..., Link: %.30s...", i+1, title, link)
             
             # Add to resource links if it's a valid URL
             if link and link.startswith("http"):
@@ -856,16 +1100,16 @@ def direct_reviews_search(query: str) -> str:
             for link in resource_links:
                 formatted_results += f"- [{link['title']}]({link['url']}) - {link['source']}\n"
                 
-        logger.info(f"direct_reviews_search completed. Output length: {len(formatted_results)} characters")
-        logger.info(f"Output preview: {formatted_results[:200]}...")
+        logger.info("direct_reviews_search completed. Output length: %s characters", len(formatted_results))
+        logger.debug("Output preview: %.200s...", formatted_results)
         
         return formatted_results
     except Exception as e:
-        logger.error(f"Error in direct_reviews_search: {str(e)}")
+        logger.error("Error in direct_reviews_search: %s", e)
         destination = query.replace('What do people say about visiting ', '').replace('?', '')
         return f"""# TRAVELER INSIGHTS AND REVIEWS
 
-## ERROR - Using Default Information
+## ERROR - {DEFAULT_INSIGHTS_MARKER}
 
 ### Local Experiences
 - Travelers consistently mention the welcoming atmosphere and rich cultural experiences.
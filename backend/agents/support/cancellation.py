@@ -0,0 +1,165 @@
+import os
+import time
+import logging
+import threading
+import contextvars
+from concurrent.futures import Future, ThreadPoolExecutor, TimeoutError as FuturesTimeoutError
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# How often blocked waits check whether their request was cancelled
+CANCEL_POLL_SECONDS = float(os.getenv("CANCEL_POLL_SECONDS", 0.25))
+
+# Shared pool for calls that cancelled requests may stop waiting for
+_cancellable_executor = ThreadPoolExecutor(max_workers=int(os.getenv("CANCELLABLE_MAX_WORKERS", 32)),
+                                           thread_name_prefix="cancellable-call")
+
+
+class RequestCancelled(BaseException):
+    """
+    Raised inside a cancelled request's work to unwind it.
+
+    A BaseException (like asyncio.CancelledError), so the `except Exception`
+    fallbacks around agent calls do not turn a cancellation into fallback text.
+    """
+
+    def __init__(self, reason: str = "cancelled"):
+        self.reason = reason
+        super().__init__(reason)
+
+
+class CancelToken:
+    """Cancellation flag shared by everything one request (or plan job) runs."""
+
+    def __init__(self):
+        self._event = threading.Event()
+        self.reason = None
+
+    @property
+    def cancelled(self) -> bool:
+        return self._event.is_set()
+
+    def cancel(self, reason: str = "cancelled"):
+        if not self._event.is_set():
+            self.reason = reason
+            self._event.set()
+            logger.info("Cancelling request work: %s", reason)
+
+    def raise_if_cancelled(self):
+        if self._event.is_set():
+            raise RequestCancelled(self.reason)
+
+    def sleep(self, seconds: float):
+        """Sleep, waking up early to raise if cancelled meanwhile."""
+        if self._event.wait(seconds):
+            raise RequestCancelled(self.reason)
+
+
+# Token of the request whose work runs in the current thread/context
+current_cancel = contextvars.ContextVar("current_cancel", default=None)
+
+
+@contextmanager
+def cancel_scope(token: Optional[CancelToken]):
+    """Run the enclosed work under `token`; stages and upstream calls check it."""
+    handle = current_cancel.set(token)
+    try:
+        yield token
+    finally:
+        current_cancel.reset(handle)
+
+
+def check_cancelled():
+    """Raise RequestCancelled if the current request was cancelled."""
+    token = current_cancel.get()
+    if token is not None:
+        token.raise_if_cancelled()
+
+
+def cancellable_sleep(seconds: float):
+    """`time.sleep` that raises RequestCancelled as soon as the current request is cancelled."""
+    token = current_cancel.get()
+    if token is None:
+        time.sleep(seconds)
+    else:
+        token.sleep(seconds)
+
+
+def wait_result(future: Future, timeout: Optional[float] = None) -> Any:
+    """
+    `future.result(timeout)` that gives up as soon as the current request is cancelled.
+
+    The future itself is left running; its result is simply no longer waited for.
+    """
+    token = current_cancel.get()
+    if token is None:
+        return future.result(timeout)
+    remaining = timeout
+    while True:
+        token.raise_if_cancelled()
+        step = CANCEL_POLL_SECONDS if remaining is None else min(CANCEL_POLL_SECONDS, remaining)
+        try:
+            return future.result(step)
+        except FuturesTimeoutError:
+            if remaining is not None:
+                remaining -= step
+                if remaining <= 0:
+                    raise
+
+
+def run_cancellable(fn: Callable[[], Any]) -> Any:
+    """
+    Run a blocking call so the current request can stop waiting for it.
+
+    Without a cancel token this is just `fn()`. Otherwise `fn` runs on a shared
+    pool (with the caller's context) and the caller returns as soon as the
+    request is cancelled; a call that cannot be interrupted, such as an HTTP
+    request in flight, finishes in the background and its result is dropped,
+    and a call still queued for a thread is not started at all.
+    """
+    if current_cancel.get() is None:
+        return fn()
+    future = _cancellable_executor.submit(contextvars.copy_context().run, fn)
+    try:
+        return wait_result(future)
+    except RequestCancelled:
+        future.cancel()
+        raise
+
+
+class CancelRegistry:
+    """Cancel tokens of running work, by ID (plan ID or request key)."""
+
+    def __init__(self):
+        self._tokens: Dict[str, CancelToken] = {}
+        self._lock = threading.Lock()
+
+    def register(self, key: str) -> CancelToken:
+        with self._lock:
+            token = self._tokens.get(key)
+            if token is None:
+                token = self._tokens[key] = CancelToken()
+            return token
+
+    def get(self, key: str) -> Optional[CancelToken]:
+        with self._lock:
+            return self._tokens.get(key)
+
+    def unregister(self, key: str):
+        with self._lock:
+            self._tokens.pop(key, None)
+
+    def cancel(self, key: str, reason: str = "cancelled") -> bool:
+        """Cancel the work registered under `key`; returns False if there is none."""
+        token = self.get(key)
+        if token is None:
+            return False
+        token.cancel(reason)
+        return True
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._tokens)
@@ -0,0 +1,144 @@
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Any, Callable, Dict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+OFF = "off"
+RECORD = "record"
+REPLAY = "replay"
+
+
+class CassetteMiss(Exception):
+    """Raised in replay mode when no recording matches a request."""
+
+    def __init__(self, kind: str, key: str):
+        self.kind = kind
+        self.key = key
+        super().__init__(f"No recorded {kind} response for request {key[:12]}")
+
+
+def request_key(kind: str, request: Dict[str, Any]) -> str:
+    """Stable hash identifying a request, independent of key order."""
+    encoded = json.dumps({"kind": kind, "request": request}, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class Cassette:
+    """
+    Records upstream responses to files and replays them without the network.
+
+    Each distinct request is stored once as `<directory>/<kind>/<key>.json` with its
+    response and how long the upstream took. In replay mode the same request is
+    always answered from that file, so runs are deterministic and offline; with a
+    `latency_scale` above zero the recorded timing is slept (scaled) first.
+
+    Args:
+        directory: Where cassette files are kept
+        mode: "off" (pass through), "record" or "replay"
+        latency_scale: Multiplier for recorded latencies in replay mode (0 = no delay)
+    """
+
+    def __init__(self, directory: str = "cassettes", mode: str = OFF, latency_scale: float = 0.0,
+                 sleep: Callable[[float], None] = time.sleep, clock: Callable[[], float] = time.monotonic):
+        if mode not in (OFF, RECORD, REPLAY):
+            raise ValueError(f"Unknown cassette mode: {mode}")
+        self.directory = directory
+        self.mode = mode
+        self.latency_scale = latency_scale
+        self._sleep = sleep
+        self._clock = clock
+        self._loaded = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.recorded = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != OFF
+
+    def _path(self, kind: str, key: str) -> str:
+        return os.path.join(self.directory, kind, f"{key}.json")
+
+    def call(self, kind: str, request: Dict[str, Any], perform: Callable[[], Any]) -> Any:
+        """
+        Make an upstream call through the cassette.
+
+        Args:
+            kind: Upstream call type (e.g. "openai", "google_search"); one folder per kind
+            request: Everything that determines the response; must be JSON-serializable
+            perform: Makes the real call; its result must be JSON-serializable
+
+        Returns:
+            The response (JSON round-tripped when it comes from a recording)
+
+        Raises:
+            CassetteMiss: In replay mode, if the request was never recorded
+        """
+        if self.mode == OFF:
+            return perform()
+        key = request_key(kind, request)
+        if self.mode == REPLAY:
+            entry = self._load(kind, key)
+            if self.latency_scale > 0:
+                self._sleep(entry["seconds"] * self.latency_scale)
+            return entry["response"]
+
+        start = self._clock()
+        response = perform()
+        self._save(kind, key, {"kind": kind, "request": request, "response": response,
+                               "seconds": round(self._clock() - start, 4)})
+        return response
+
+    def _load(self, kind: str, key: str) -> Dict[str, Any]:
+        with self._lock:
+            entry = self._loaded.get(key)
+        if entry is None:
+            try:
+                with open(self._path(kind, key), encoding="utf-8") as f:
+                    entry = json.load(f)
+            except FileNotFoundError:
+                raise CassetteMiss(kind, key) from None
+        with self._lock:
+            self._loaded[key] = entry
+            self.hits += 1
+        return entry
+
+    def _save(self, kind: str, key: str, entry: Dict[str, Any]):
+        directory = os.path.join(self.directory, kind)
+        os.makedirs(directory, exist_ok=True)
+        # Write then rename, so concurrent recordings of one request never leave a partial file
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=1, default=str)
+        os.replace(temp_path, self._path(kind, key))
+        with self._lock:
+            self.recorded += 1
+        logger.debug("Recorded %s response %s", kind, key[:12])
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"mode": self.mode, "directory": self.directory, "hits": self.hits, "recorded": self.recorded}
+
+
+def cassette_from_env() -> Cassette:
+    """Build the process cassette from CASSETTE_MODE, CASSETTE_DIR and CASSETTE_LATENCY_SCALE."""
+    mode = os.getenv("CASSETTE_MODE", OFF).lower()
+    cassette = Cassette(
+        directory=os.getenv("CASSETTE_DIR", "cassettes"),
+        mode=mode,
+        latency_scale=float(os.getenv("CASSETTE_LATENCY_SCALE", 0)),
+    )
+    if cassette.enabled:
+        logger.warning("Upstream calls go through cassettes in %s mode (%s)", mode, cassette.directory)
+    return cassette
+
+
+# Shared by every upstream call in the process
+cassette = cassette_from_env()
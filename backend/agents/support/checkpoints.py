@@ -0,0 +1,55 @@
+import json
+import hashlib
+import logging
+from collections.abc import MutableMapping
+from typing import Any, Dict
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def input_hash(inputs: Dict[str, Any]) -> str:
+    """Stable hash of a job's inputs, independent of key order."""
+    encoded = json.dumps(inputs, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+
+class StageCheckpoints:
+    """
+    Completed stage outputs of running jobs, keyed by job ID and input hash.
+
+    A job that is interrupted (worker crash, redeploy, transient failure) loads
+    its checkpoint on the next attempt and only runs the remaining stages.
+    Checkpoints saved for different inputs under the same job ID are discarded
+    rather than reused.
+
+    Args:
+        mapping: Where checkpoints are kept; a shared_state mapping so that any
+                 worker process can resume the job
+    """
+
+    def __init__(self, mapping: MutableMapping):
+        self.mapping = mapping
+
+    def load(self, job_id: str, inputs_hash: str) -> Dict[str, str]:
+        """Return the checkpointed outputs keyed by result field (empty if there are none)."""
+        entry = self.mapping.get(job_id)
+        if entry is None or entry["input_hash"] != inputs_hash:
+            return {}
+        return dict(entry["stages"])
+
+    def save(self, job_id: str, inputs_hash: str, field: str, content: str):
+        """Record the output of one completed stage."""
+        def add_stage(entry):
+            stages = entry["stages"] if entry["input_hash"] == inputs_hash else {}
+            return {"input_hash": inputs_hash, "stages": {**stages, field: content}}
+
+        try:
+            self.mapping.modify(job_id, add_stage)
+        except KeyError:
+            self.mapping[job_id] = {"input_hash": inputs_hash, "stages": {field: content}}
+        logger.debug("Checkpointed %s stage of job %s", field, job_id)
+
+    def clear(self, job_id: str):
+        """Drop a job's checkpoint once the job has finished or failed for good."""
+        self.mapping.pop(job_id, None)
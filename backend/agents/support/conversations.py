@@ -0,0 +1,121 @@
+import os
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Messages kept in one conversation; older turns are dropped (the first message, the task, stays)
+CHAT_HISTORY_MAX_MESSAGES = int(os.getenv("CHAT_HISTORY_MAX_MESSAGES", 20))
+
+# Roles of messages that answer a function or tool call in the message before them
+RESULT_ROLES = ("function", "tool")
+
+# Idle proxy agents kept for reuse
+PROXY_POOL_SIZE = int(os.getenv("PROXY_POOL_SIZE", 16))
+
+
+def cap_history(messages: List[Dict[str, Any]], max_messages: int = CHAT_HISTORY_MAX_MESSAGES) -> int:
+    """
+    Drop the oldest turns of a conversation in place, keeping the first message.
+
+    Whole turns are dropped: function (or tool) results are never kept without
+    the message that called them, so the history may end up a little shorter
+    than `max_messages`.
+
+    Returns:
+        Number of messages dropped
+    """
+    if max_messages < 2 or len(messages) <= max_messages:
+        return 0
+    cut = 1 + len(messages) - max_messages
+    while cut < len(messages) and messages[cut].get("role") in RESULT_ROLES:
+        cut += 1
+    del messages[1:cut]
+    return cut - 1
+
+
+def last_reply(agent, partner) -> Optional[str]:
+    """The last non-empty message `agent` itself sent in its conversation with `partner`."""
+    # chat_messages is a defaultdict; .get avoids creating an empty conversation
+    for message in reversed(agent.chat_messages.get(partner, [])):
+        if message.get("role") == "assistant" and message.get("content"):
+            return message["content"]
+    return None
+
+
+def release_conversation(agent, partner):
+    """
+    Drop the state two agents keep about their conversation.
+
+    Unlike `agent.reset()`, this leaves the agent's conversations with other
+    partners (concurrent requests) untouched.
+    """
+    for owner, other in ((agent, partner), (partner, agent)):
+        owner._oai_messages.pop(other, None)
+        owner._consecutive_auto_reply_counter.pop(other, None)
+        owner._max_consecutive_auto_reply_dict.pop(other, None)
+        owner.reply_at_receive.pop(other, None)
+
+
+def retained_memory(agent) -> Dict[str, int]:
+    """Conversations, messages and message bytes an agent currently holds."""
+    conversations = list(agent.chat_messages.values())
+    return {
+        "conversations": len(conversations),
+        "messages": sum(len(messages) for messages in conversations),
+        "retained_bytes": sum(
+            len(str(message.get("content") or "").encode("utf-8"))
+            for messages in conversations for message in messages
+        ),
+    }
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Current resident set size of this process, where the platform exposes it."""
+    try:
+        with open("/proc/self/statm") as statm:
+            return int(statm.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ProxyPool:
+    """
+    Reusable proxy agents for one-shot chats with the specialized agents.
+
+    Building an autogen agent registers its reply functions and hooks, so proxies
+    are kept after use instead of being built per call. Each proxy is used by
+    one chat at a time and must be released (with its conversation) afterwards.
+
+    Args:
+        factory: Builds a new proxy agent
+        max_idle: Idle proxies to keep; extra ones are discarded
+    """
+
+    def __init__(self, factory: Callable[[], Any], max_idle: int = PROXY_POOL_SIZE):
+        self.factory = factory
+        self.max_idle = max_idle
+        self._idle = []
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def acquire(self, max_consecutive_auto_reply: int):
+        with self._lock:
+            proxy = self._idle.pop() if self._idle else None
+            if proxy is None:
+                self._created += 1
+        if proxy is None:
+            proxy = self.factory()
+        proxy.update_max_consecutive_auto_reply(max_consecutive_auto_reply)
+        return proxy
+
+    def release(self, proxy):
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(proxy)
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"idle": len(self._idle), "created": self._created}
@@ -0,0 +1,126 @@
+import time
+import logging
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Optional
+
+from .cancellation import CANCEL_POLL_SECONDS, CancelToken, RequestCancelled, cancel_scope, current_cancel
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Cancel reason of work stopped by its deadline
+DEADLINE_REASON = "deadline exceeded"
+
+
+class DeadlineExceeded(Exception):
+    """Raised by `enforce_deadline` when the enclosed work was stopped at its deadline."""
+
+
+class Deadline:
+    """
+    Latency budget of one request, counted from when the request arrived.
+
+    Args:
+        seconds: The budget
+        start: When the budget started (defaults to now)
+        clock: Monotonic time source
+    """
+
+    def __init__(self, seconds: float, start: Optional[float] = None,
+                 clock: Callable[[], float] = time.monotonic):
+        self.seconds = seconds
+        self._clock = clock
+        self.start = clock() if start is None else start
+
+    def elapsed(self) -> float:
+        return self._clock() - self.start
+
+    def remaining(self) -> float:
+        return self.seconds - self.elapsed()
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+# Deadline of the request whose work runs in the current thread/context
+current_deadline = contextvars.ContextVar("current_deadline", default=None)
+
+
+@contextmanager
+def deadline_scope(deadline: Optional[Deadline]):
+    """Run the enclosed work against `deadline`; the coordinator and upstream admission honour it."""
+    handle = current_deadline.set(deadline)
+    try:
+        yield deadline
+    finally:
+        current_deadline.reset(handle)
+
+
+class DeadlineToken(CancelToken):
+    """
+    Cancel token that is cancelled once `deadline` passes, or when `parent` is.
+
+    Both are checked whenever the token is, so no timer thread is needed: blocked
+    waits already poll their token every CANCEL_POLL_SECONDS.
+    """
+
+    def __init__(self, deadline: Deadline, parent: Optional[CancelToken] = None):
+        super().__init__()
+        self.deadline = deadline
+        self.parent = parent
+
+    def _check(self):
+        if self._event.is_set():
+            return
+        if self.parent is not None and self.parent.cancelled:
+            self.cancel(self.parent.reason)
+        elif self.deadline.expired:
+            self.cancel(DEADLINE_REASON)
+
+    @property
+    def cancelled(self) -> bool:
+        self._check()
+        return super().cancelled
+
+    def raise_if_cancelled(self):
+        self._check()
+        super().raise_if_cancelled()
+
+    def sleep(self, seconds: float):
+        end = time.monotonic() + seconds
+        while True:
+            self.raise_if_cancelled()
+            left = end - time.monotonic()
+            if left <= 0:
+                return
+            self._event.wait(min(left, CANCEL_POLL_SECONDS))
+
+
+@contextmanager
+def enforce_deadline(deadline: Optional[Deadline]):
+    """
+    Stop the enclosed work once `deadline` passes.
+
+    The work runs under a `DeadlineToken`, so stage checks, admission waits and
+    upstream calls give up at the deadline the way they do for a cancelled
+    request. Cancellation of the request itself still raises RequestCancelled.
+
+    Raises:
+        DeadlineExceeded: If the work was stopped at the deadline
+    """
+    if deadline is None:
+        yield
+        return
+    parent = current_cancel.get()
+    token = DeadlineToken(deadline, parent)
+    try:
+        with cancel_scope(token):
+            token.raise_if_cancelled()
+            yield
+    except RequestCancelled:
+        if token.reason != DEADLINE_REASON or (parent is not None and parent.cancelled):
+            raise
+        raise DeadlineExceeded(f"{DEADLINE_REASON} after {deadline.elapsed():.1f}s") from None
+
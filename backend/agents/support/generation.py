@@ -0,0 +1,145 @@
+import os
+import logging
+import contextvars
+import dataclasses
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Any, Dict, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Legacy end-of-answer marker; kept as a stop sequence so it is never generated into output
+TERMINATION_MARKER = "TASK_COMPLETE"
+
+# Finish reasons that mean the model has finished answering (as opposed to
+# "function_call"/"tool_calls", which expect the conversation to continue)
+TERMINAL_FINISH_REASONS = ("stop", "length", "content_filter")
+
+
+@dataclass(frozen=True)
+class GenerationSettings:
+    """
+    Immutable completion parameters for one LLM call.
+
+    Instances are never modified in place; use `with_overrides` to derive a
+    new one, so settings can be shared freely between agents and threads.
+    """
+
+    max_tokens: Optional[int] = None
+    temperature: Optional[float] = None
+    stop: Tuple[str, ...] = (TERMINATION_MARKER,)
+
+    def with_overrides(self, **changes) -> "GenerationSettings":
+        """Return a copy with the given fields replaced (None values are ignored)."""
+        changes = {key: value for key, value in changes.items() if value is not None}
+        if "stop" in changes:
+            changes["stop"] = tuple(changes["stop"])
+        return dataclasses.replace(self, **changes)
+
+    def as_create_kwargs(self) -> Dict[str, Any]:
+        """Keyword arguments for `OpenAIWrapper.create`."""
+        kwargs = {}
+        if self.max_tokens is not None:
+            kwargs["max_tokens"] = self.max_tokens
+        if self.temperature is not None:
+            kwargs["temperature"] = self.temperature
+        if self.stop:
+            # The chat completions API accepts at most four stop sequences
+            kwargs["stop"] = list(self.stop[:4])
+        return kwargs
+
+
+# Explicit output budget per stage
+DEFAULT_GENERATION_SETTINGS = {
+    "attractions": GenerationSettings(max_tokens=1200, temperature=0.7),
+    "food": GenerationSettings(max_tokens=1200, temperature=0.7),
+    "accommodation": GenerationSettings(max_tokens=1000, temperature=0.7),
+    "reviews": GenerationSettings(max_tokens=800, temperature=0.5),
+    "images": GenerationSettings(max_tokens=300, temperature=0.2),
+    "planner": GenerationSettings(max_tokens=4000, temperature=0.7),
+}
+
+# Settings used for agent types without an entry above
+FALLBACK_GENERATION_SETTINGS = GenerationSettings(max_tokens=1000, temperature=0.7)
+
+# Per-call override for the current request/thread
+current_generation = contextvars.ContextVar("current_generation", default=None)
+
+
+class CompletionState:
+    """Finish reason of the latest completion in the current agent conversation."""
+
+    def __init__(self):
+        self.finish_reason = None
+        self.completions = 0
+
+    @property
+    def finished(self) -> bool:
+        return self.finish_reason in TERMINAL_FINISH_REASONS
+
+
+# Completion state for the conversation running in the current request/thread
+current_completion = contextvars.ContextVar("current_completion", default=None)
+
+
+def _load_settings_from_env() -> Dict[str, GenerationSettings]:
+    """Apply MAX_TOKENS_<AGENT_TYPE> and TEMPERATURE_<AGENT_TYPE> overrides."""
+    settings = {}
+    for agent_type, defaults in DEFAULT_GENERATION_SETTINGS.items():
+        max_tokens = os.getenv(f"MAX_TOKENS_{agent_type.upper()}")
+        temperature = os.getenv(f"TEMPERATURE_{agent_type.upper()}")
+        try:
+            settings[agent_type] = defaults.with_overrides(
+                max_tokens=int(max_tokens) if max_tokens else None,
+                temperature=float(temperature) if temperature else None,
+            )
+        except ValueError:
+            logger.warning("Invalid generation settings for %s, using defaults", agent_type)
+            settings[agent_type] = defaults
+    return settings
+
+
+stage_settings = _load_settings_from_env()
+
+
+def settings_for(agent_type: str) -> GenerationSettings:
+    """
+    Resolve the generation settings for a call made by `agent_type`.
+
+    A per-call override set with `generation_scope` takes precedence over the
+    stage defaults.
+    """
+    override = current_generation.get()
+    if override is not None:
+        return override
+    return stage_settings.get(agent_type, FALLBACK_GENERATION_SETTINGS)
+
+
+@contextmanager
+def generation_scope(settings: GenerationSettings):
+    """Run the enclosed LLM calls with the given generation settings."""
+    token = current_generation.set(settings)
+    try:
+        yield
+    finally:
+        current_generation.reset(token)
+
+
+@contextmanager
+def completion_scope():
+    """Track the finish reasons of the LLM calls made by one agent conversation."""
+    state = CompletionState()
+    token = current_completion.set(state)
+    try:
+        yield state
+    finally:
+        current_completion.reset(token)
+
+
+def record_finish_reason(finish_reason: Optional[str]):
+    """Store the finish reason of a completion for the active conversation, if any."""
+    state = current_completion.get()
+    if state is not None:
+        state.finish_reason = finish_reason
+        state.completions += 1
@@ -0,0 +1,312 @@
+import os
+import re
+import csv
+import math
+import logging
+import threading
+import unicodedata
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+import numpy as np
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Offline gazetteer of well-known places (CSV: destination,name,aliases,kind,lat,lon; "|" separates aliases)
+GAZETTEER_PATH = os.getenv("GAZETTEER_PATH", os.path.join(os.path.dirname(__file__), "data", "gazetteer.csv"))
+# Grid cell size of the spatial index
+GEO_CELL_KM = float(os.getenv("GEO_CELL_KM", 1.0))
+
+EARTH_RADIUS_KM = 6371.0
+# Legs up to this distance are walked; longer ones take public transport
+WALKING_MAX_KM = 1.5
+WALKING_KMH = 4.5
+TRANSIT_KMH = 18.0
+# Waiting and getting to/from stops
+TRANSIT_OVERHEAD_MINUTES = 10
+# Restaurants suggested per day, and how far from the day's area they may be
+RESTAURANTS_PER_DAY = 3
+RESTAURANT_RADIUS_KM = 1.5
+
+
+def fold(text: str) -> str:
+    """Lowercase and strip accents, so "Sacré-Cœur" and "sacre-coeur" compare equal."""
+    text = unicodedata.normalize("NFKD", text.replace("œ", "oe").replace("Œ", "Oe"))
+    return "".join(c for c in text if not unicodedata.combining(c)).casefold()
+
+
+@dataclass(frozen=True)
+class Place:
+    """A gazetteer entry."""
+
+    name: str
+    kind: str
+    lat: float
+    lon: float
+    aliases: Tuple[str, ...] = ()
+
+
+class Gazetteer:
+    """
+    Places of each destination, matched by name in free text.
+
+    Args:
+        path: CSV file to load; read on first use
+    """
+
+    def __init__(self, path: str = GAZETTEER_PATH):
+        self.path = path
+        self._destinations: Optional[List[Tuple[Tuple[str, ...], List[Place]]]] = None
+        self._lock = threading.Lock()
+
+    def _load(self) -> List[Tuple[Tuple[str, ...], List[Place]]]:
+        with self._lock:
+            if self._destinations is None:
+                places: Dict[Tuple[str, ...], List[Place]] = {}
+                try:
+                    with open(self.path, encoding="utf-8", newline="") as f:
+                        for row in csv.DictReader(f):
+                            keys = tuple(fold(key.strip()) for key in row["destination"].split("|") if key.strip())
+                            aliases = tuple(alias.strip() for alias in (row.get("aliases") or "").split("|") if alias.strip())
+                            places.setdefault(keys, []).append(
+                                Place(row["name"].strip(), row["kind"].strip(), float(row["lat"]), float(row["lon"]), aliases)
+                            )
+                except (OSError, KeyError, ValueError) as e:
+                    logger.warning("Could not load gazetteer %s: %s", self.path, e)
+                self._destinations = list(places.items())
+                logger.info("Loaded gazetteer with %s destinations", len(self._destinations))
+            return self._destinations
+
+    def places_for(self, destination: str) -> List[Place]:
+        """Places of the destination named in `destination` (e.g. "Paris, France")."""
+        folded = fold(destination)
+        for keys, places in self._load():
+            if any(re.search(rf"\b{re.escape(key)}\b", folded) for key in keys):
+                return places
+        return []
+
+    def find(self, destination: str, text: str, kind: Optional[str] = None) -> List[Place]:
+        """Places of the destination mentioned in `text`, in order of first mention."""
+        folded = fold(text or "")
+        found = []
+        for place in self.places_for(destination):
+            if kind is not None and place.kind != kind:
+                continue
+            positions = [
+                match.start()
+                for name in (place.name,) + place.aliases
+                for match in [re.search(rf"(?<!\w){re.escape(fold(name))}(?!\w)", folded)]
+                if match
+            ]
+            if positions:
+                found.append((min(positions), place))
+        return [place for _, place in sorted(found, key=lambda item: item[0])]
+
+
+def project(lats: np.ndarray, lons: np.ndarray, lat0: float) -> np.ndarray:
+    """Equirectangular projection to kilometres around latitude `lat0`; accurate within a city."""
+    scale = math.pi / 180 * EARTH_RADIUS_KM
+    return np.column_stack((lons * scale * math.cos(math.radians(lat0)), lats * scale))
+
+
+def haversine_km(lat1, lon1, lat2, lon2) -> np.ndarray:
+    """Great-circle distances, element-wise over arrays."""
+    lat1, lon1, lat2, lon2 = (np.radians(np.asarray(value, dtype=float)) for value in (lat1, lon1, lat2, lon2))
+    a = np.sin((lat2 - lat1) / 2) ** 2 + np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(a))
+
+
+def travel_minutes(km: float) -> int:
+    """Door-to-door estimate: walking for short legs, public transport otherwise."""
+    if km <= WALKING_MAX_KM:
+        return max(1, round(km / WALKING_KMH * 60))
+    return round(km / TRANSIT_KMH * 60 + TRANSIT_OVERHEAD_MINUTES)
+
+
+def travel_mode(km: float) -> str:
+    return "walk" if km <= WALKING_MAX_KM else "public transport"
+
+
+class GridIndex:
+    """
+    Uniform grid over projected points for radius queries.
+
+    Args:
+        points: (n, 2) coordinates in kilometres
+        cell_km: Grid cell size
+    """
+
+    def __init__(self, points: np.ndarray, cell_km: float = GEO_CELL_KM):
+        self.points = np.asarray(points, dtype=float).reshape(-1, 2)
+        self.cell_km = cell_km
+        self.cells: Dict[Tuple[int, int], List[int]] = {}
+        for i, cell in enumerate(np.floor(self.points / cell_km).astype(int)):
+            self.cells.setdefault((int(cell[0]), int(cell[1])), []).append(i)
+
+    def _candidates(self, point: np.ndarray, rings: int) -> List[int]:
+        cx, cy = (int(v) for v in np.floor(point / self.cell_km))
+        return [i for dx in range(-rings, rings + 1) for dy in range(-rings, rings + 1)
+                for i in self.cells.get((cx + dx, cy + dy), ())]
+
+    def within(self, point: Sequence[float], radius_km: float) -> List[Tuple[int, float]]:
+        """Indices and distances of the points within `radius_km`, nearest first."""
+        point = np.asarray(point, dtype=float)
+        candidates = self._candidates(point, math.ceil(radius_km / self.cell_km))
+        if not candidates:
+            return []
+        distances = np.linalg.norm(self.points[candidates] - point, axis=1)
+        order = np.argsort(distances, kind="stable")
+        return [(candidates[i], float(distances[i])) for i in order if distances[i] <= radius_km]
+
+
+def balanced_kmeans(points: np.ndarray, k: int, iterations: int = 25, seed: int = 0) -> np.ndarray:
+    """
+    Cluster points into `k` groups of near-equal size (at most ceil(n / k) each).
+
+    Uses k-means++ seeding and vectorized distance matrices; each assignment step
+    hands out the globally closest (point, centre) pairs first while respecting
+    the group capacity, so no day is overloaded. Deterministic for a given seed.
+
+    Returns:
+        Group label of each point
+    """
+    n = len(points)
+    k = max(1, min(k, n))
+    rng = np.random.default_rng(seed)
+    centres = [points[rng.integers(n)]]
+    for _ in range(1, k):
+        d2 = np.min(((points[:, None, :] - np.array(centres)[None, :, :]) ** 2).sum(axis=2), axis=1)
+        centres.append(points[rng.choice(n, p=d2 / d2.sum())] if d2.sum() > 0 else points[rng.integers(n)])
+    centres = np.array(centres)
+    capacity = math.ceil(n / k)
+
+    labels = np.full(n, -1)
+    for _ in range(iterations):
+        distances = np.linalg.norm(points[:, None, :] - centres[None, :, :], axis=2)
+        new_labels = np.full(n, -1)
+        sizes = np.zeros(k, dtype=int)
+        for flat in np.argsort(distances, axis=None, kind="stable"):
+            point, group = divmod(int(flat), k)
+            if new_labels[point] == -1 and sizes[group] < capacity:
+                new_labels[point] = group
+                sizes[group] += 1
+        if np.array_equal(new_labels, labels):
+            break
+        labels = new_labels
+        centres = np.array([points[labels == group].mean(axis=0) if np.any(labels == group) else centres[group]
+                            for group in range(k)])
+    return labels
+
+
+def nearest_neighbour_order(points: np.ndarray, start: int) -> List[int]:
+    """Visit order that always moves to the closest unvisited point."""
+    order = [start]
+    remaining = set(range(len(points))) - {start}
+    while remaining:
+        candidates = sorted(remaining)
+        distances = np.linalg.norm(points[candidates] - points[order[-1]], axis=1)
+        order.append(candidates[int(np.argmin(distances))])
+        remaining.discard(order[-1])
+    return order
+
+
+@dataclass
+class DayGroup:
+    """Places to visit on one day, in visiting order, with travel estimates."""
+
+    day: int
+    places: List[Place]
+    # (kilometres, minutes) from each place to the next
+    legs: List[Tuple[float, int]] = field(default_factory=list)
+    restaurants: List[Tuple[Place, float]] = field(default_factory=list)
+    # (kilometres, minutes) from the previous day's area, None on the first day
+    from_previous: Optional[Tuple[float, int]] = None
+
+    @property
+    def theme(self) -> str:
+        return f"Around {self.places[0].name}" if self.places else "Free day to explore at your own pace"
+
+    def route(self) -> str:
+        """Stops and travel estimates, e.g. "A → (12 min walk) → B"."""
+        if not self.places:
+            return "no fixed stops"
+        parts = [self.places[0].name]
+        for place, (km, minutes) in zip(self.places[1:], self.legs):
+            parts.append(f"({minutes} min {travel_mode(km)}, {km:.1f} km) → {place.name}")
+        route = " → ".join(parts)
+        if self.restaurants:
+            route += "; food nearby: " + ", ".join(f"{place.name} ({km:.1f} km)" for place, km in self.restaurants)
+        return route
+
+
+def group_by_day(destination: str, trip_length: int, attractions: str, food: str = "",
+                 gazetteer: Optional["Gazetteer"] = None) -> Optional[List[DayGroup]]:
+    """
+    Pre-group the attractions named in the specialist output into `trip_length` days.
+
+    Attractions are resolved against the gazetteer, clustered by location into
+    balanced days, ordered into walking routes, and paired with restaurants from
+    the food output that are close to each day's area.
+
+    Returns:
+        One group per day in visiting order, or None if fewer than two named
+        attractions could be located (the planner then groups them itself)
+    """
+    gazetteer = gazetteer or default_gazetteer
+    places = gazetteer.find(destination, attractions, kind="attraction")
+    if len(places) < 2 or trip_length < 1:
+        return None
+    lats = np.array([place.lat for place in places])
+    lons = np.array([place.lon for place in places])
+    points = project(lats, lons, float(lats.mean()))
+    labels = balanced_kmeans(points, trip_length)
+
+    groups = [members for members in (np.flatnonzero(labels == group) for group in range(trip_length)) if members.size]
+    centres = np.array([points[members].mean(axis=0) for members in groups])
+    # Start with the most central area, then always move to the closest remaining one
+    day_order = nearest_neighbour_order(centres, int(np.argmin(np.linalg.norm(centres - points.mean(axis=0), axis=1))))
+
+    restaurants = gazetteer.find(destination, food, kind="food")
+    restaurant_index = None
+    if restaurants:
+        restaurant_points = project(np.array([r.lat for r in restaurants]), np.array([r.lon for r in restaurants]),
+                                    float(lats.mean()))
+        restaurant_index = GridIndex(restaurant_points)
+
+    days = []
+    previous_end = None
+    for day, group in enumerate(day_order, start=1):
+        members = groups[group]
+        local = points[members]
+        # Begin the day at the stop closest to where the previous day ended
+        anchor = previous_end if previous_end is not None else centres[group]
+        order = [members[i] for i in nearest_neighbour_order(local, int(np.argmin(np.linalg.norm(local - anchor, axis=1))))]
+        distances = haversine_km(lats[order[:-1]], lons[order[:-1]], lats[order[1:]], lons[order[1:]])
+        entry = DayGroup(day, [places[i] for i in order],
+                         legs=[(float(km), travel_minutes(float(km))) for km in distances])
+        if previous_end is not None:
+            km = float(np.linalg.norm(points[order[0]] - previous_end))
+            entry.from_previous = (km, travel_minutes(km))
+        if restaurant_index is not None:
+            entry.restaurants = [(restaurants[i], km) for i, km in
+                                 restaurant_index.within(centres[group], RESTAURANT_RADIUS_KM)[:RESTAURANTS_PER_DAY]]
+        days.append(entry)
+        previous_end = points[order[-1]]
+    days.extend(DayGroup(day, []) for day in range(len(days) + 1, trip_length + 1))
+    return days
+
+
+def format_day_groups(days: List[DayGroup]) -> str:
+    """Planner-readable description of the pre-grouped days."""
+    lines = []
+    for day in days:
+        line = f"Day {day.day}: {day.route()}"
+        if day.from_previous is not None:
+            km, minutes = day.from_previous
+            line += f" [from the previous day's last stop: {km:.1f} km, about {minutes} min by {travel_mode(km)}]"
+        lines.append(line)
+    return "\n".join(lines)
+
+
+# Shared by all requests; loaded on first use
+default_gazetteer = Gazetteer()
@@ -0,0 +1,208 @@
+import os
+import re
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from .cassettes import cassette
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Patterns used to build similarity keys (e.g. "view-800x600.jpg" and "view.jpg" are the same image)
+_DIMENSION_SUFFIX = re.compile(r"[-_]\d+x\d+")
+_TRAILING_NUMBER = re.compile(r"-\d+$")
+
+# Custom Search returns at most 10 results per page
+RESULTS_PER_PAGE = 10
+
+
+def similarity_key(url: str) -> str:
+    """Key shared by size/format variants of the same image on the same host."""
+    parts = url.split("/")
+    domain = parts[2] if len(parts) > 2 else ""
+    filename_base = parts[-1].lower().split(".")[0]
+    filename_base = _DIMENSION_SUFFIX.sub("", filename_base)
+    filename_base = _TRAILING_NUMBER.sub("", filename_base)
+    return f"{domain}:{filename_base}"
+
+
+class ProbeCache:
+    """Bounded LRU cache of URL liveness results with separate TTLs for hits and misses."""
+
+    def __init__(self, max_entries: int = 4096, ok_ttl: float = 86400.0, failed_ttl: float = 3600.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.max_entries = max_entries
+        self.ok_ttl = ok_ttl
+        self.failed_ttl = failed_ttl
+        self._clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, url: str) -> Optional[bool]:
+        with self._lock:
+            entry = self._entries.get(url)
+            if entry is None:
+                return None
+            ok, expires = entry
+            if expires < self._clock():
+                del self._entries[url]
+                return None
+            self._entries.move_to_end(url)
+            return ok
+
+    def set(self, url: str, ok: bool):
+        ttl = self.ok_ttl if ok else self.failed_ttl
+        with self._lock:
+            self._entries[url] = (ok, self._clock() + ttl)
+            self._entries.move_to_end(url)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class ImagePipeline:
+    """
+    Find a fixed number of working images for a query within a latency budget.
+
+    Candidates are paged in from image search, deduplicated by similarity key,
+    ranked by reported pixel size, and probed concurrently with bounded
+    HEAD (or 1-byte range GET) requests. Dead, non-image and hotlink-blocked
+    URLs are dropped; probe outcomes are cached per URL.
+
+    Args:
+        search: Image search function taking (query, num_results, start)
+        max_pages: Maximum result pages to request per query
+        probe_timeout: Timeout in seconds for a single probe request
+        budget: Total wall time in seconds for search plus probing
+        min_width: Images narrower than this (when reported) are skipped
+    """
+
+    def __init__(self, search: Callable[..., List[Dict]], max_pages: int = 2, probe_timeout: float = 1.5,
+                 budget: float = 4.0, min_width: int = 400, probe_workers: int = 8,
+                 cache: Optional[ProbeCache] = None):
+        self.search = search
+        self.max_pages = max_pages
+        self.probe_timeout = probe_timeout
+        self.budget = budget
+        self.min_width = min_width
+        self.cache = cache or ProbeCache()
+        self._executor = ThreadPoolExecutor(max_workers=probe_workers, thread_name_prefix="image-probe")
+        self._session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=probe_workers, pool_maxsize=probe_workers, max_retries=0)
+        self._session.mount("http://", adapter)
+        self._session.mount("https://", adapter)
+        self._session.headers["User-Agent"] = "Mozilla/5.0 (compatible; TravelPlanner/1.0)"
+
+    def probe(self, url: str) -> bool:
+        """Check that `url` serves an image, using the cached outcome when available."""
+        cached = self.cache.get(url)
+        if cached is not None:
+            return cached
+        ok = cassette.call("image_probe", {"url": url}, lambda: self._check(url))
+        self.cache.set(url, ok)
+        return ok
+
+    def _check(self, url: str) -> bool:
+        ok = False
+        try:
+            response = self._session.head(url, timeout=self.probe_timeout, allow_redirects=True)
+            if response.status_code in (403, 405, 501):
+                # Some hosts reject HEAD; fetch a single byte instead
+                response = self._session.get(url, timeout=self.probe_timeout, stream=True,
+                                             headers={"Range": "bytes=0-0"})
+                response.close()
+            content_type = response.headers.get("Content-Type", "")
+            ok = response.status_code < 400 and content_type.startswith("image/")
+        except requests.RequestException:
+            ok = False
+        return ok
+
+    def _rank(self, items: List[Dict], seen: set) -> List[Dict]:
+        """Drop duplicates and undersized images, largest first."""
+        candidates = []
+        for item in items:
+            url = item.get("link", "")
+            if not url or urlparse(url).scheme not in ("http", "https"):
+                continue
+            key = similarity_key(url)
+            if key in seen:
+                continue
+            seen.add(key)
+            width = int(item.get("width") or 0)
+            if width and width < self.min_width:
+                continue
+            candidates.append(item)
+        return sorted(candidates, key=lambda item: int(item.get("width") or 0) * int(item.get("height") or 0),
+                      reverse=True)
+
+    def find_images(self, query: str, count: int = 5) -> List[str]:
+        """
+        Return up to `count` probed image URLs for `query`, best first.
+
+        Args:
+            query: The image search query
+            count: Number of images wanted
+
+        Returns:
+            List of working image URLs (may be shorter than `count`)
+        """
+        deadline = time.monotonic() + self.budget
+        seen = set()
+        accepted = []
+        for page in range(self.max_pages):
+            if len(accepted) >= count or time.monotonic() >= deadline:
+                break
+            items = self.search(query, num_results=RESULTS_PER_PAGE, start=page * RESULTS_PER_PAGE + 1)
+            candidates = self._rank(items, seen)
+            if not candidates:
+                break
+
+            # Probe the whole page concurrently, keeping results in rank order
+            futures = {self._executor.submit(self.probe, item["link"]): index for index, item in enumerate(candidates)}
+            alive = {}
+            pending = set(futures)
+            while pending and time.monotonic() < deadline:
+                done, pending = wait(pending, timeout=deadline - time.monotonic(), return_when=FIRST_COMPLETED)
+                for future in done:
+                    if future.result():
+                        alive[futures[future]] = candidates[futures[future]]["link"]
+                # Stop early once the best remaining candidates can no longer change the outcome
+                ready = sorted(alive)
+                if len(accepted) + len(ready) >= count and all(
+                    futures[f] > ready[count - len(accepted) - 1] for f in pending
+                ):
+                    break
+            for future in pending:
+                future.cancel()
+            accepted.extend(alive[index] for index in sorted(alive))
+            if len(items) < RESULTS_PER_PAGE:
+                break
+
+        logger.info("Image pipeline accepted %s images for '%s'", min(len(accepted), count), query)
+        return accepted[:count]
+
+
+def _env_number(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning("Invalid value for %s, using default %s", name, default)
+        return default
+
+
+def build_image_pipeline(search: Callable[..., List[Dict]]) -> ImagePipeline:
+    """Create an image pipeline configured from IMAGE_* environment variables."""
+    return ImagePipeline(
+        search,
+        max_pages=int(_env_number("IMAGE_SEARCH_PAGES", 2)),
+        probe_timeout=_env_number("IMAGE_PROBE_TIMEOUT_SECONDS", 1.5),
+        budget=_env_number("IMAGE_PIPELINE_BUDGET_SECONDS", 4.0),
+        min_width=int(_env_number("IMAGE_MIN_WIDTH", 400)),
+    )
@@ -0,0 +1,253 @@
+import os
+import json
+import time
+import logging
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from .state_store import SQLiteDatabase, shared_database
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Job states
+QUEUED = "queued"
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+# Error of jobs whose worker stopped renewing the lease on their last attempt
+LEASE_EXPIRED = "worker lease expired"
+
+
+@dataclass
+class Job:
+    """A claimed job; `attempts` counts this attempt."""
+    id: str
+    queue: str
+    payload: Dict[str, Any]
+    attempts: int
+    worker_id: str
+
+
+class JobQueue:
+    """
+    Durable job queue in a SQLite database, FIFO within each priority.
+
+    Jobs survive process crashes: a claimed job holds a lease that the worker
+    renews with `heartbeat`. If the worker dies, the lease expires and another
+    worker claims the job again, up to `max_attempts` times. A cancelled job is
+    never claimed again; its worker notices through `cancelled`.
+
+    Args:
+        database: The SQLite database to keep jobs in
+        name: Queue name, so several queues can share one database
+        lease_seconds: How long a claim lasts without a heartbeat
+        max_attempts: Attempts (including lease expiries) before a job fails
+        clock: Wall-clock time source; leases must compare across processes
+        on_expired: Called with (job_id, error) for each job that `claim` fails because
+                    its worker's lease expired on the last attempt, so its owner can
+                    record the failure (nobody else will)
+    """
+
+    def __init__(self, database: SQLiteDatabase, name: str = "plans", lease_seconds: float = 120.0,
+                 max_attempts: int = 3, clock=time.time,
+                 on_expired: Optional[Callable[[str, str], None]] = None):
+        self.database = database
+        self.name = name
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+        self._clock = clock
+        self.on_expired = on_expired
+        conn = self.database.connect()
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY, queue TEXT NOT NULL, payload TEXT NOT NULL, status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0, worker_id TEXT, lease_expires REAL,"
+            " available_at REAL NOT NULL, created_at REAL NOT NULL, updated_at REAL NOT NULL, error TEXT,"
+            " priority INTEGER NOT NULL DEFAULT 0)"
+        )
+        # Databases created before jobs had priorities
+        if "priority" not in {row[1] for row in conn.execute("PRAGMA table_info(jobs)")}:
+            conn.execute("ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS jobs_claim ON jobs (queue, status, available_at)")
+
+    def enqueue(self, job_id: str, payload: Dict[str, Any], priority: int = 0):
+        """Add a job; the payload must be JSON-serializable. Lower priorities are claimed first."""
+        now = self._clock()
+        self.database.connect().execute(
+            "INSERT INTO jobs (id, queue, payload, status, available_at, created_at, updated_at, priority)"
+            " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (job_id, self.name, json.dumps(payload), QUEUED, now, now, now, priority)
+        )
+
+    def claim(self, worker_id: str, priorities: Optional[List[int]] = None) -> Optional[Job]:
+        """
+        Claim the most urgent, then oldest, available job, including jobs whose worker's lease expired.
+
+        Args:
+            worker_id: Identifies the claiming worker's lease
+            priorities: Only claim jobs with these priorities (default: any)
+
+        Returns:
+            The claimed job, or None if nothing is available
+        """
+        if priorities is not None and not priorities:
+            return None
+        only = ""
+        if priorities is not None:
+            only = f" AND priority IN ({', '.join('?' * len(priorities))})"
+        now = self._clock()
+        with self.database.transaction() as conn:
+            # Jobs abandoned by a crashed worker that have used up their attempts
+            expired = [row[0] for row in conn.execute(
+                "SELECT id FROM jobs WHERE queue = ? AND status = ? AND lease_expires < ? AND attempts >= ?",
+                (self.name, RUNNING, now, self.max_attempts)
+            ).fetchall()]
+            if expired:
+                conn.execute(
+                    f"UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id IN ({', '.join('?' * len(expired))})",
+                    (FAILED, LEASE_EXPIRED, now, *expired)
+                )
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM jobs"
+                " WHERE queue = ? AND ((status = ? AND available_at <= ?) OR (status = ? AND lease_expires < ?))"
+                f"{only} ORDER BY priority, created_at LIMIT 1",
+                (self.name, QUEUED, now, RUNNING, now, *(priorities or ()))
+            ).fetchone()
+            if row is not None:
+                job_id, payload, attempts = row
+                conn.execute(
+                    "UPDATE jobs SET status = ?, attempts = ?, worker_id = ?, lease_expires = ?, updated_at = ?"
+                    " WHERE id = ?",
+                    (RUNNING, attempts + 1, worker_id, now + self.lease_seconds, now, job_id)
+                )
+        for expired_id in expired:
+            logger.error("Job %s failed: its worker's lease expired on the last attempt", expired_id)
+            if self.on_expired is not None:
+                try:
+                    self.on_expired(expired_id, LEASE_EXPIRED)
+                except Exception as e:
+                    logger.error("Could not record the failure of expired job %s: %s", expired_id, e)
+        if row is None:
+            return None
+        return Job(job_id, self.name, json.loads(payload), attempts + 1, worker_id)
+
+    def _finish(self, job: Job, status: str, error: Optional[str] = None, delay: float = 0.0) -> bool:
+        now = self._clock()
+        cursor = self.database.connect().execute(
+            "UPDATE jobs SET status = ?, error = ?, worker_id = NULL, lease_expires = NULL,"
+            " available_at = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+            (status, error, now + delay, now, job.id, job.worker_id, RUNNING)
+        )
+        # False means the lease was lost and another worker owns the job now
+        return cursor.rowcount == 1
+
+    def heartbeat(self, job: Job) -> bool:
+        """Extend the lease of a running job. Returns False if the lease was lost."""
+        now = self._clock()
+        cursor = self.database.connect().execute(
+            "UPDATE jobs SET lease_expires = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+            (now + self.lease_seconds, now, job.id, job.worker_id, RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def cancel(self, job_id: str) -> bool:
+        """
+        Cancel a queued or running job.
+
+        A running job's worker finds out through `cancelled` and stops it; its
+        later `complete`, `fail` or `retry` then returns False.
+
+        Returns:
+            False if the job does not exist or has already finished
+        """
+        now = self._clock()
+        cursor = self.database.connect().execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ? AND status IN (?, ?)",
+            (CANCELLED, "cancelled", now, job_id, QUEUED, RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def cancelled(self, job_ids: Iterable[str]) -> Set[str]:
+        """The IDs among `job_ids` that have been cancelled."""
+        job_ids = list(job_ids)
+        if not job_ids:
+            return set()
+        rows = self.database.connect().execute(
+            f"SELECT id FROM jobs WHERE status = ? AND id IN ({', '.join('?' * len(job_ids))})",
+            (CANCELLED, *job_ids)
+        ).fetchall()
+        return {row[0] for row in rows}
+
+    def complete(self, job: Job) -> bool:
+        """Mark a job as done."""
+        return self._finish(job, DONE)
+
+    def fail(self, job: Job, error: str) -> bool:
+        """Mark a job as permanently failed."""
+        return self._finish(job, FAILED, error)
+
+    def retry(self, job: Job, error: str, delay: float = 0.0) -> bool:
+        """
+        Put a job back in the queue after `delay` seconds, or fail it if it is out of attempts.
+
+        Returns:
+            True if the job will be retried
+        """
+        if job.attempts >= self.max_attempts:
+            self.fail(job, error)
+            return False
+        return self._finish(job, QUEUED, error, delay)
+
+    def release(self, job: Job) -> bool:
+        """Return a job to the queue without counting the attempt (e.g. on shutdown)."""
+        now = self._clock()
+        cursor = self.database.connect().execute(
+            "UPDATE jobs SET status = ?, attempts = attempts - 1, worker_id = NULL, lease_expires = NULL,"
+            " available_at = ?, updated_at = ? WHERE id = ? AND worker_id = ? AND status = ?",
+            (QUEUED, now, now, job.id, job.worker_id, RUNNING)
+        )
+        return cursor.rowcount == 1
+
+    def status(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the state of one job, or None if it does not exist."""
+        row = self.database.connect().execute(
+            "SELECT status, attempts, error, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        return dict(zip(("status", "attempts", "error", "created_at", "updated_at"), row))
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Job counts per status and the age of the oldest queued job."""
+        conn = self.database.connect()
+        counts = dict(conn.execute(
+            "SELECT status, COUNT(*) FROM jobs WHERE queue = ? GROUP BY status", (self.name,)
+        ).fetchall())
+        oldest = conn.execute(
+            "SELECT MIN(created_at) FROM jobs WHERE queue = ? AND status = ?", (self.name, QUEUED)
+        ).fetchone()[0]
+        return {
+            "counts": {state: counts.get(state, 0) for state in (QUEUED, RUNNING, DONE, FAILED, CANCELLED)},
+            "oldest_queued_seconds": round(self._clock() - oldest, 1) if oldest else 0.0,
+        }
+
+
+def build_plan_queue() -> JobQueue:
+    """
+    Create the plan generation queue in the shared state database.
+
+    Configured with JOB_LEASE_SECONDS and JOB_MAX_ATTEMPTS. Requires
+    STATE_BACKEND=sqlite, since API and worker processes must share it.
+    """
+    database = shared_database()
+    if database is None:
+        raise RuntimeError("The plan job queue requires STATE_BACKEND=sqlite")
+    return JobQueue(
+        database,
+        name="plans",
+        lease_seconds=float(os.getenv("JOB_LEASE_SECONDS", 120)),
+        max_attempts=int(os.getenv("JOB_MAX_ATTEMPTS", 3)),
+    )
@@ -0,0 +1,187 @@
+import os
+import sys
+import json
+import queue
+import atexit
+import logging
+import threading
+from logging.handlers import QueueHandler, QueueListener
+from typing import Dict, Optional, TextIO
+
+TEXT_FORMAT = "%(asctime)s %(levelname)s %(name)s: %(message)s"
+
+# Noisy third-party loggers, unless overridden with LOG_LEVELS
+DEFAULT_MODULE_LEVELS = {
+    "googleapiclient.discovery_cache": logging.ERROR,
+    "httpx": logging.WARNING,
+    "urllib3": logging.WARNING,
+}
+
+# Attributes every LogRecord has; anything else was passed with `extra=`
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Keep one in `every` records at or below `max_level` per call site.
+
+    Call sites are identified by logger name and the unformatted message
+    template, so lazily formatted messages ("Result %d: %s") are sampled
+    together however their arguments vary. Records above `max_level` always pass.
+    """
+
+    def __init__(self, every: int = 10, max_level: int = logging.DEBUG, max_sites: int = 10000):
+        super().__init__()
+        self.every = max(1, every)
+        self.max_level = max_level
+        self.max_sites = max_sites
+        self._counts = {}
+        self._lock = threading.Lock()
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.every == 1 or record.levelno > self.max_level:
+            return True
+        key = (record.name, record.msg if isinstance(record.msg, str) else type(record.msg).__name__)
+        with self._lock:
+            if len(self._counts) >= self.max_sites:
+                # Eagerly formatted messages create a new site per call; do not grow without bound
+                self._counts.clear()
+            count = self._counts.get(key, 0)
+            self._counts[key] = count + 1
+        return count % self.every == 0
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any fields passed with `extra=`."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            entry["exc_info"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class NonBlockingQueueHandler(QueueHandler):
+    """Queue handler that drops records instead of blocking when the queue is full."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class LoggingPipeline:
+    """The installed queue handler and the listener thread that writes its records."""
+
+    def __init__(self, handler: NonBlockingQueueHandler, listener: QueueListener):
+        self.handler = handler
+        self.listener = listener
+
+    def stop(self):
+        """Flush queued records and stop the listener thread."""
+        self.listener.stop()
+
+    def snapshot(self) -> Dict[str, int]:
+        return {"queued": self.handler.queue.qsize(), "dropped": self.handler.dropped}
+
+
+_pipeline = None
+_pipeline_lock = threading.Lock()
+
+
+def parse_module_levels(spec: str) -> Dict[str, int]:
+    """
+    Parse per-module levels such as "routers=WARNING,agents.support.resilience=DEBUG".
+
+    Invalid entries are ignored.
+    """
+    levels = {}
+    for item in spec.split(","):
+        name, _, level = item.partition("=")
+        level = logging.getLevelName(level.strip().upper())
+        if name.strip() and isinstance(level, int):
+            levels[name.strip()] = level
+    return levels
+
+
+def configure_logging(level: Optional[str] = None, module_levels: Optional[Dict[str, int]] = None,
+                      log_format: Optional[str] = None, sample_every: Optional[int] = None,
+                      queue_size: Optional[int] = None, stream: Optional[TextIO] = None) -> LoggingPipeline:
+    """
+    Route all logging through a bounded queue drained by a background thread.
+
+    Request threads only enqueue records; formatting of the final line and the
+    write to the stream happen on the listener thread. Settings default to the
+    LOG_LEVEL, LOG_LEVELS, LOG_FORMAT, LOG_DEBUG_SAMPLE_EVERY and LOG_QUEUE_SIZE
+    environment variables. Calling this again replaces the previous pipeline.
+
+    Args:
+        level: Root level name (e.g. "INFO")
+        module_levels: Per-logger levels, applied on top of DEFAULT_MODULE_LEVELS
+        log_format: "text" or "json"
+        sample_every: Keep one in this many DEBUG records per call site
+        queue_size: Maximum queued records before new ones are dropped
+        stream: Where to write (defaults to stderr)
+
+    Returns:
+        The installed logging pipeline
+    """
+    global _pipeline
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    if module_levels is None:
+        module_levels = parse_module_levels(os.getenv("LOG_LEVELS", ""))
+    log_format = (log_format or os.getenv("LOG_FORMAT", "text")).lower()
+    if sample_every is None:
+        sample_every = int(os.getenv("LOG_DEBUG_SAMPLE_EVERY", 10))
+    if queue_size is None:
+        queue_size = int(os.getenv("LOG_QUEUE_SIZE", 10000))
+
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+
+        output = logging.StreamHandler(stream or sys.stderr)
+        output.setFormatter(JsonFormatter() if log_format == "json" else logging.Formatter(TEXT_FORMAT))
+
+        handler = NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+        handler.addFilter(SamplingFilter(every=sample_every))
+        listener = QueueListener(handler.queue, output, respect_handler_level=True)
+
+        root = logging.getLogger()
+        for existing in list(root.handlers):
+            root.removeHandler(existing)
+        root.addHandler(handler)
+        root.setLevel(level)
+        for name, module_level in {**DEFAULT_MODULE_LEVELS, **module_levels}.items():
+            logging.getLogger(name).setLevel(module_level)
+
+        listener.start()
+        if _pipeline is None:
+            atexit.register(shutdown_logging)
+        _pipeline = LoggingPipeline(handler, listener)
+        return _pipeline
+
+
+def shutdown_logging():
+    """Flush and stop the logging pipeline, if one is installed."""
+    global _pipeline
+    with _pipeline_lock:
+        if _pipeline is not None:
+            _pipeline.stop()
+            logging.getLogger().removeHandler(_pipeline.handler)
+            _pipeline = None
@@ -0,0 +1,202 @@
+import os
+import time
+import logging
+import threading
+from typing import Callable, Dict, List, Optional
+
+from .resilience import LatencyTracker
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Model tiers; each tier is a fallback chain tried in order
+DEFAULT_TIERS = {
+    "fast": "gpt-3.5-turbo",
+    "strong": "gpt-4-turbo,gpt-3.5-turbo",
+}
+
+# Tier used by each agent type unless MODEL_ROUTE_<AGENT_TYPE> overrides it
+DEFAULT_AGENT_ROUTES = {
+    "attractions": "fast",
+    "food": "fast",
+    "accommodation": "fast",
+    "reviews": "fast",
+    "images": "fast",
+    "coordinator": "fast",
+    "planner": "strong",
+}
+
+
+class ModelHealth:
+    """Observed latency and failure streak for a single model."""
+
+    def __init__(self):
+        self.latency = LatencyTracker(window=100)
+        self.consecutive_failures = 0
+        self.demoted_until = 0.0
+        self.calls = 0
+        self.failures = 0
+
+
+class ModelRouter:
+    """
+    Choose which model serves each agent call.
+
+    Every agent type maps to a fallback chain of models. At call time the chain
+    is reordered so that healthy models within the stage's latency budget come
+    first, in configured order; models that keep failing or are observed to be
+    slower than the budget are demoted to the end of the chain rather than removed.
+    Latency only affects the order for agent types with a budget
+    (MODEL_LATENCY_BUDGET_<AGENT_TYPE>); without one, only failures do.
+
+    Args:
+        routes: Fallback chain of model names per agent type
+        default_route: Chain used for agent types without a route
+        latency_budgets: Optional p95 latency budget in seconds per agent type
+        failure_threshold: Consecutive failures before a model is demoted
+        demotion_seconds: How long a failing model stays demoted
+    """
+
+    def __init__(self, routes: Dict[str, List[str]], default_route: List[str],
+                 latency_budgets: Optional[Dict[str, float]] = None, failure_threshold: int = 3,
+                 demotion_seconds: float = 60.0, clock: Callable[[], float] = time.monotonic):
+        self.routes = routes
+        self.default_route = default_route
+        self.latency_budgets = latency_budgets or {}
+        self.failure_threshold = failure_threshold
+        self.demotion_seconds = demotion_seconds
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._health = {}
+
+    def _get_health(self, model: str) -> ModelHealth:
+        with self._lock:
+            if model not in self._health:
+                self._health[model] = ModelHealth()
+            return self._health[model]
+
+    def chain(self, agent_type: str) -> List[str]:
+        """Configured fallback chain for an agent type (never empty), in preference order."""
+        return list(self.routes.get(agent_type) or self.default_route)
+
+    def primary(self, agent_type: str) -> str:
+        """First configured model for an agent type."""
+        return self.chain(agent_type)[0]
+
+    def route(self, agent_type: str) -> List[str]:
+        """
+        Ordered list of models to try for one call.
+
+        Args:
+            agent_type: Type of agent making the call
+
+        Returns:
+            Models to try in order; the first is the preferred choice
+        """
+        chain = self.chain(agent_type)
+        budget = self.latency_budgets.get(agent_type)
+        now = self._clock()
+
+        def penalty(model: str) -> int:
+            health = self._get_health(model)
+            if health.demoted_until > now:
+                return 2
+            if budget is not None:
+                p95 = health.latency.percentile(95)
+                if p95 is not None and p95 > budget:
+                    return 1
+            return 0
+
+        # sorted() is stable, so models with equal penalty keep their configured order
+        return sorted(chain, key=penalty)
+
+    def record_success(self, model: str, seconds: float):
+        health = self._get_health(model)
+        with self._lock:
+            health.calls += 1
+            health.consecutive_failures = 0
+            health.demoted_until = 0.0
+        health.latency.record(seconds)
+
+    def record_failure(self, model: str):
+        health = self._get_health(model)
+        with self._lock:
+            health.calls += 1
+            health.failures += 1
+            health.consecutive_failures += 1
+            if health.consecutive_failures >= self.failure_threshold:
+                health.demoted_until = self._clock() + self.demotion_seconds
+                logger.warning("Model %s demoted for %.0fs after %s consecutive failures",
+                               model, self.demotion_seconds, health.consecutive_failures)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        """Routes plus per-model health for metrics endpoints."""
+        now = self._clock()
+        models = {}
+        with self._lock:
+            health_items = list(self._health.items())
+        for model, health in health_items:
+            p50 = health.latency.percentile(50)
+            p95 = health.latency.percentile(95)
+            models[model] = {
+                "calls": health.calls,
+                "failures": health.failures,
+                "demoted": health.demoted_until > now,
+                "latency_p50": round(p50, 3) if p50 is not None else None,
+                "latency_p95": round(p95, 3) if p95 is not None else None,
+            }
+        routes = {agent_type: self.route(agent_type) for agent_type in self.routes}
+        return {"routes": routes, "models": models}
+
+
+def _split(value: str) -> List[str]:
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def _expand(entries: List[str], tiers: Dict[str, List[str]]) -> List[str]:
+    """Expand tier names into their model chains, dropping duplicates."""
+    models = []
+    for entry in entries:
+        for model in tiers.get(entry, [entry]):
+            if model not in models:
+                models.append(model)
+    return models
+
+
+def load_router_from_env() -> ModelRouter:
+    """
+    Build the model router from environment variables.
+
+    - MODEL_TIER_<TIER>: comma-separated model chain for a tier (e.g. MODEL_TIER_STRONG)
+    - MODEL_ROUTE_<AGENT_TYPE>: comma-separated tiers and/or models for an agent
+    - MODEL_LATENCY_BUDGET_<AGENT_TYPE>: p95 latency budget in seconds for an agent
+
+    Empty tiers and routes are ignored in favour of the default, since an agent
+    with no model to call would fail every request.
+    """
+    tiers = {}
+    for tier, default in DEFAULT_TIERS.items():
+        tiers[tier] = _split(os.getenv(f"MODEL_TIER_{tier.upper()}", default))
+        if not tiers[tier]:
+            logger.warning("MODEL_TIER_%s lists no models; using %s", tier.upper(), default)
+            tiers[tier] = _split(default)
+
+    routes = {}
+    budgets = {}
+    for agent_type, default in DEFAULT_AGENT_ROUTES.items():
+        routes[agent_type] = _expand(_split(os.getenv(f"MODEL_ROUTE_{agent_type.upper()}", default)), tiers)
+        if not routes[agent_type]:
+            logger.warning("MODEL_ROUTE_%s lists no models; using the %s tier", agent_type.upper(), default)
+            routes[agent_type] = _expand([default], tiers)
+        budget = os.getenv(f"MODEL_LATENCY_BUDGET_{agent_type.upper()}")
+        if budget:
+            try:
+                budgets[agent_type] = float(budget)
+            except ValueError:
+                logger.warning("Invalid latency budget for %s: %s", agent_type, budget)
+
+    return ModelRouter(routes, default_route=tiers["fast"], latency_budgets=budgets)
+
+
+# Shared router used by the agent service
+model_router = load_router_from_env()
@@ -0,0 +1,230 @@
+import os
+import sys
+import time
+import uuid
+import pstats
+import cProfile
+import logging
+import threading
+import contextvars
+from collections import Counter
+from contextlib import contextmanager
+from typing import List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Profiling is opt-in; when disabled nothing is installed, so there is no overhead
+PROFILING_ENABLED = os.getenv("PROFILING_ENABLED", "false").lower() in ("true", "1", "t")
+PROFILE_DIR = os.getenv("PROFILE_DIR", ".profiles")
+# When set, profiling requests must send it in the X-Profile-Token header
+PROFILE_TOKEN = os.getenv("PROFILE_TOKEN", "")
+PROFILE_MAX_SECONDS = float(os.getenv("PROFILE_MAX_SECONDS", 60))
+
+# Capture modes
+SAMPLE = "sample"
+CPROFILE = "cprofile"
+
+
+def frame_label(code) -> str:
+    return f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+class StackSampler:
+    """
+    Sampling profiler over every thread of the process.
+
+    A background thread records the stack of each other thread every `interval`
+    seconds. Stacks are aggregated in the "folded" format understood by
+    flamegraph.pl, speedscope and inferno: one `thread;outer;...;inner count` line
+    per distinct stack. Waiting shows up too (e.g. threads blocked in socket
+    reads), which is what separates I/O from CPU time.
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.stacks
+
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(frame_label(frame.f_code))
+                    frame = frame.f_back
+                labels.append(names.get(ident, str(ident)))
+                self.stacks[";".join(reversed(labels))] += 1
+            self.samples += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.stacks.most_common())
+
+
+class ProfileCapture:
+    """
+    One profile capture, written to `directory` when it finishes.
+
+    "sample" writes folded stacks (`.folded`) of all threads; "cprofile" writes a
+    deterministic pstats dump (`.prof`, viewable with snakeviz or convertible with
+    flameprof) of the calling thread, plus the work other threads run under
+    `profiled` while the capture is current (see `current_capture`).
+    """
+
+    # cProfile cannot run two profiles at once, and overlapping samplers would double the overhead
+    _active = threading.Lock()
+
+    def __init__(self, mode: str = SAMPLE, directory: str = PROFILE_DIR, label: str = "process",
+                 interval: float = 0.005):
+        if mode not in (SAMPLE, CPROFILE):
+            raise ValueError(f"Unknown profile mode: {mode}")
+        self.mode = mode
+        self.interval = interval
+        extension = "folded" if mode == SAMPLE else "prof"
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{label}-{uuid.uuid4().hex[:6]}.{extension}"
+        self.path = os.path.join(directory, name)
+        self.samples = 0
+        self._profiler = None
+        self._sampler = None
+        self._thread_profilers: List[cProfile.Profile] = []
+        self._thread_lock = threading.Lock()
+
+    def start(self) -> bool:
+        """Start capturing; returns False if another capture is already running."""
+        if not self._active.acquire(blocking=False):
+            return False
+        if self.mode == SAMPLE:
+            self._sampler = StackSampler(self.interval)
+            self._sampler.start()
+        else:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+        return True
+
+    def stop(self) -> Optional[str]:
+        """Stop capturing and write the output; returns its path (None if it never started)."""
+        if self._sampler is None and self._profiler is None:
+            return None
+        try:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            if self._sampler is not None:
+                self._sampler.stop()
+                self.samples = self._sampler.samples
+                with open(self.path, "w", encoding="utf-8") as f:
+                    f.write(self._sampler.folded())
+            else:
+                self._profiler.disable()
+                with self._thread_lock:
+                    profilers = [self._profiler, *self._thread_profilers]
+                    self._thread_profilers = []
+                stats = pstats.Stats()
+                for profiler in profilers:
+                    profiler.create_stats()
+                    if profiler.stats:
+                        stats.add(profiler)
+                stats.dump_stats(self.path)
+            logger.info("Wrote %s profile to %s", self.mode, self.path)
+            return self.path
+        finally:
+            self._sampler = self._profiler = None
+            self._active.release()
+
+    @contextmanager
+    def profile_thread(self):
+        """Add the enclosed work of the calling thread to a running cprofile capture."""
+        if self._profiler is None:
+            yield
+            return
+        profiler = cProfile.Profile()
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            with self._thread_lock:
+                if self._profiler is not None:
+                    self._thread_profilers.append(profiler)
+
+
+# cprofile capture of the request being handled; work it runs in other threads joins it with `profiled`
+current_capture = contextvars.ContextVar("current_capture", default=None)
+
+
+@contextmanager
+def profiled():
+    """
+    Include the enclosed work in the current request's cprofile capture, if any.
+
+    cProfile only sees the thread it was enabled in, so request work moved off
+    the event loop (e.g. with run_in_threadpool) must be wrapped in this to show
+    up. Sampling captures already cover every thread.
+    """
+    capture = current_capture.get()
+    if capture is None:
+        yield
+        return
+    with capture.profile_thread():
+        yield
+
+
+def authorized(token: Optional[str]) -> bool:
+    return not PROFILE_TOKEN or token == PROFILE_TOKEN
+
+
+class ProfileMiddleware:
+    """
+    Profile single requests that ask for it with an `X-Profile: sample|cprofile` header.
+
+    Only installed when PROFILING_ENABLED is set, and only applies under `path_prefix`.
+    The response carries an `X-Profile-Output` header with the file path, or
+    "busy" when another capture was running.
+    """
+
+    def __init__(self, app, path_prefix: str = "/api/agents/travel-plan", directory: str = PROFILE_DIR):
+        self.app = app
+        self.path_prefix = path_prefix
+        self.directory = directory
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(self.path_prefix):
+            await self.app(scope, receive, send)
+            return
+        headers = dict(scope["headers"])
+        mode = headers.get(b"x-profile", b"").decode().lower()
+        if mode not in (SAMPLE, CPROFILE) or not authorized(headers.get(b"x-profile-token", b"").decode()):
+            await self.app(scope, receive, send)
+            return
+
+        capture = ProfileCapture(mode, self.directory, label="request")
+        started = capture.start()
+        output = capture.path if started else "busy"
+
+        async def send_with_output(message):
+            if message["type"] == "http.response.start":
+                message = {**message, "headers": list(message.get("headers", [])) +
+                           [(b"x-profile-output", output.encode())]}
+            await send(message)
+
+        handle = current_capture.set(capture if started and mode == CPROFILE else None)
+        try:
+            await self.app(scope, receive, send_with_output)
+        finally:
+            current_capture.reset(handle)
+            if started:
+                capture.stop()
@@ -0,0 +1,238 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Callable, Dict, Optional
+
+from .cancellation import CANCEL_POLL_SECONDS, current_cancel
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Admission priorities - lower values are served first
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+# Priority applied to upstream calls made by the current request/thread
+current_priority = contextvars.ContextVar("current_priority", default=PRIORITY_NORMAL)
+# Best priority the current work may use; background and batch work cannot jump ahead of users
+priority_cap = contextvars.ContextVar("priority_cap", default=PRIORITY_HIGH)
+
+
+class RateLimitExceeded(Exception):
+    """Raised when an upstream call cannot be admitted within its wait budget."""
+
+    def __init__(self, upstream: str, retry_after: float, reason: str = "rate limit"):
+        self.upstream = upstream
+        self.retry_after = max(1.0, retry_after)
+        self.reason = reason
+        super().__init__(f"{upstream} {reason} exceeded, retry after {self.retry_after:.0f}s")
+
+
+class TokenBucket:
+    """
+    Classic token bucket: holds up to `capacity` tokens and refills
+    continuously so that `capacity` tokens become available every `period` seconds.
+    """
+
+    def __init__(self, capacity: float, period: float, clock: Callable[[], float] = time.monotonic):
+        self.capacity = float(capacity)
+        self.rate = self.capacity / period
+        self.tokens = self.capacity
+        self._clock = clock
+        self._updated = clock()
+
+    def _refill(self, now: float):
+        elapsed = max(0.0, now - self._updated)
+        self.tokens = min(self.capacity, self.tokens + elapsed * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available (0 if available now)."""
+        self._refill(self._clock())
+        # Requests larger than the bucket are clamped so they can still be admitted
+        amount = min(amount, self.capacity)
+        if self.tokens >= amount:
+            return 0.0
+        return (amount - self.tokens) / self.rate
+
+    def consume(self, amount: float):
+        """Remove `amount` tokens; callers must check `wait_time` first."""
+        self._refill(self._clock())
+        self.tokens -= min(amount, self.capacity)
+
+
+class UpstreamLimiter:
+    """
+    Admission control for a single upstream API.
+
+    A call is admitted only when every bucket (e.g. requests/min and tokens/min)
+    can cover its cost. Waiting callers are queued by priority, the queue is
+    bounded, and callers give up once their wait budget is exhausted so the
+    pressure surfaces to the HTTP layer instead of turning into upstream 429s.
+    """
+
+    def __init__(self, name: str, buckets: Dict[str, TokenBucket], max_queue: int = 50,
+                 max_wait: float = 30.0, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.buckets = buckets
+        self.max_queue = max_queue
+        self.max_wait = max_wait
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._waiters = []
+        self._seq = itertools.count()
+        self.stats = {"admitted": 0, "rejected": 0, "wait_seconds": 0.0}
+
+    def _wait_for(self, cost: Dict[str, float]) -> float:
+        return max((bucket.wait_time(cost.get(key, 0.0)) for key, bucket in self.buckets.items()), default=0.0)
+
+    @property
+    def queue_depth(self) -> int:
+        """Number of callers currently waiting for admission."""
+        return len(self._waiters)
+
+    def is_saturated(self) -> bool:
+        """True when the wait queue is full and new work should be shed."""
+        return self.queue_depth >= self.max_queue
+
+    def estimated_wait(self, cost: Optional[Dict[str, float]] = None) -> float:
+        """Rough number of seconds a new caller with `cost` would have to wait."""
+        with self._cond:
+            return self._wait_for(cost or {}) + self.queue_depth
+
+    def acquire(self, cost: Dict[str, float], priority: Optional[int] = None,
+                max_wait: Optional[float] = None) -> float:
+        """
+        Block until the call described by `cost` can be admitted.
+
+        Args:
+            cost: Tokens to take from each bucket, keyed by bucket name
+            priority: Admission priority (defaults to the current context priority; never above `priority_cap`)
+            max_wait: Maximum number of seconds to wait before giving up
+
+        Returns:
+            Number of seconds spent waiting
+
+        Raises:
+            RateLimitExceeded: If the queue is full or the wait budget is exhausted
+            RequestCancelled: If the waiting request is cancelled
+        """
+        priority = current_priority.get() if priority is None else priority
+        priority = max(priority, priority_cap.get())
+        cancel = current_cancel.get()
+        max_wait = self.max_wait if max_wait is None else max_wait
+        start = self._clock()
+        deadline = start + max_wait
+
+        with self._cond:
+            if self.is_saturated():
+                self.stats["rejected"] += 1
+                raise RateLimitExceeded(self.name, self._wait_for(cost) + self.queue_depth, "queue")
+
+            ticket = (priority, next(self._seq))
+            heapq.heappush(self._waiters, ticket)
+            try:
+                while True:
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    now = self._clock()
+                    if self._waiters[0] == ticket:
+                        wait = self._wait_for(cost)
+                        if wait <= 0:
+                            for key, bucket in self.buckets.items():
+                                bucket.consume(cost.get(key, 0.0))
+                            waited = now - start
+                            self.stats["admitted"] += 1
+                            self.stats["wait_seconds"] += waited
+                            return waited
+                        if now + wait > deadline:
+                            self.stats["rejected"] += 1
+                            raise RateLimitExceeded(self.name, wait)
+                    else:
+                        wait = deadline - now
+                        if wait <= 0:
+                            self.stats["rejected"] += 1
+                            raise RateLimitExceeded(self.name, self._wait_for(cost) + self.queue_depth, "queue")
+                    timeout = min(wait, deadline - now)
+                    if cancel is not None:
+                        # Nobody notifies the condition on cancel; wake up to check
+                        timeout = min(timeout, CANCEL_POLL_SECONDS)
+                    self._cond.wait(timeout=timeout)
+            finally:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def snapshot(self) -> Dict[str, float]:
+        """Current bucket levels and counters, for health/metrics endpoints."""
+        with self._cond:
+            levels = {key: round(bucket.tokens, 2) for key, bucket in self.buckets.items()}
+            return {"queue_depth": self.queue_depth, "buckets": levels, **self.stats}
+
+
+@contextmanager
+def request_priority(priority: int):
+    """Run the enclosed upstream calls with the given admission priority."""
+    token = current_priority.set(priority)
+    try:
+        yield
+    finally:
+        current_priority.reset(token)
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate (~4 characters per token) used for admission control."""
+    return len(text or "") // 4 + 1
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        logger.warning("Invalid value for %s, using default %s", name, default)
+        return default
+
+
+# Per-upstream limiters configured from the environment
+openai_limiter = UpstreamLimiter(
+    "openai",
+    {
+        "requests": TokenBucket(_env_float("OPENAI_REQUESTS_PER_MINUTE", 500), 60.0),
+        "tokens": TokenBucket(_env_float("OPENAI_TOKENS_PER_MINUTE", 160000), 60.0),
+    },
+    max_queue=int(_env_float("OPENAI_MAX_QUEUE", 50)),
+    max_wait=_env_float("OPENAI_MAX_WAIT_SECONDS", 30.0),
+)
+
+google_limiter = UpstreamLimiter(
+    "google",
+    {
+        "queries": TokenBucket(_env_float("GOOGLE_QUERIES_PER_DAY", 100), 86400.0),
+    },
+    max_queue=int(_env_float("GOOGLE_MAX_QUEUE", 20)),
+    # A drained daily quota cannot be waited out, so fail fast to the fallback content
+    max_wait=_env_float("GOOGLE_MAX_WAIT_SECONDS", 5.0),
+)
+
+limiters = {
+    "openai": openai_limiter,
+    "google": google_limiter,
+}
+
+
+def check_admission(upstream: str = "openai"):
+    """
+    Shed load before starting new work when the upstream queue is already full.
+
+    Raises:
+        RateLimitExceeded: If the upstream limiter is saturated
+    """
+    limiter = limiters[upstream]
+    if limiter.is_saturated():
+        raise RateLimitExceeded(upstream, limiter.estimated_wait(), "queue")
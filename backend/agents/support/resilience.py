@@ -0,0 +1,337 @@
+import os
+import time
+import random
+import socket
+import logging
+import threading
+import contextvars
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FuturesTimeoutError, wait, FIRST_COMPLETED
+from typing import Any, Callable, Dict, Optional
+
+from .cancellation import (
+    CANCEL_POLL_SECONDS, RequestCancelled, cancellable_sleep, check_cancelled, run_cancellable, wait_result
+)
+from .rate_limiter import RateLimitExceeded
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# HTTP status codes worth retrying
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+
+# Shared pool for hedged requests
+_hedge_executor = ThreadPoolExecutor(max_workers=int(os.getenv("HEDGE_MAX_WORKERS", 16)), thread_name_prefix="hedge")
+
+
+class CircuitOpenError(Exception):
+    """Raised when a call is refused because the upstream circuit is open."""
+
+    def __init__(self, upstream: str, retry_after: float):
+        self.upstream = upstream
+        self.retry_after = retry_after
+        super().__init__(f"{upstream} circuit is open, retry after {retry_after:.0f}s")
+
+
+def is_transient(error: Exception) -> bool:
+    """
+    Decide whether a failed upstream call is worth retrying.
+
+    Covers network errors, timeouts, and HTTP 408/409/429/5xx from both the
+    OpenAI client (`status_code`) and googleapiclient (`resp.status`).
+    """
+    if isinstance(error, (RateLimitExceeded, CircuitOpenError)):
+        return False
+    if isinstance(error, (TimeoutError, ConnectionError, socket.timeout)):
+        return True
+    status = getattr(error, "status_code", None)
+    if status is None:
+        status = getattr(getattr(error, "resp", None), "status", None)
+    if status is not None:
+        try:
+            return int(status) in TRANSIENT_STATUS_CODES
+        except (TypeError, ValueError):
+            return False
+    return type(error).__name__ in ("APIConnectionError", "APITimeoutError")
+
+
+class LatencyTracker:
+    """Rolling window of successful call durations."""
+
+    def __init__(self, window: int = 200):
+        self._samples = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float):
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, pct: float) -> Optional[float]:
+        """Latency at the given percentile (0-100), or None without samples."""
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(pct / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+class CircuitBreaker:
+    """
+    Per-upstream circuit breaker.
+
+    Opens after `failure_threshold` consecutive failures, refuses calls for
+    `reset_timeout` seconds, then lets a single trial call through (half-open).
+    """
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._clock = clock
+        self._lock = threading.Lock()
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self._trial_in_flight = False
+        self.times_opened = 0
+
+    def allow(self):
+        """
+        Check whether a call may proceed.
+
+        Raises:
+            CircuitOpenError: If the circuit is open (or a half-open trial is already running)
+        """
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            remaining = self.opened_at + self.reset_timeout - self._clock()
+            if self.state == self.OPEN and remaining <= 0:
+                self.state = self.HALF_OPEN
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(self.name, max(remaining, 1.0))
+
+    def release_trial(self):
+        """Give back a half-open trial slot for a call that never reached the upstream."""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("Circuit for %s closed", self.name)
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    self.times_opened += 1
+                    logger.warning("Circuit for %s opened after %s failures", self.name, self.consecutive_failures)
+                self.state = self.OPEN
+                self.opened_at = self._clock()
+
+
+class ResilientUpstream:
+    """
+    Retry, hedging and circuit breaking for calls to one upstream API.
+
+    Args:
+        name: Upstream name used in logs and metrics
+        max_retries: Retries after the first attempt for transient errors
+        backoff_base: First backoff delay in seconds (doubles per retry, with full jitter)
+        backoff_max: Upper bound for a single backoff delay
+        hedge_percentile: Send a second request once the first has run longer than
+            this latency percentile (None disables hedging)
+        hedge_min_samples: Observed calls required before hedging kicks in
+        breaker: Circuit breaker guarding this upstream; calls made with a `key` (such as
+            a model name) get a circuit of their own with the same settings
+    """
+
+    def __init__(self, name: str, max_retries: int = 2, backoff_base: float = 0.5, backoff_max: float = 8.0,
+                 hedge_percentile: Optional[float] = None, hedge_min_samples: int = 20,
+                 breaker: Optional[CircuitBreaker] = None, sleep: Callable[[float], None] = cancellable_sleep):
+        self.name = name
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.breaker = breaker or CircuitBreaker(name)
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._breakers_lock = threading.Lock()
+        self.latency = LatencyTracker()
+        self._sleep = sleep
+        self._stats_lock = threading.Lock()
+        self.stats = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "hedges": 0, "hedge_wins": 0,
+                      "rejected": 0}
+
+    def breaker_for(self, key: Optional[str] = None) -> CircuitBreaker:
+        """The circuit guarding calls made with `key`; calls without one share `breaker`."""
+        if key is None:
+            return self.breaker
+        with self._breakers_lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                breaker = self._breakers[key] = CircuitBreaker(
+                    f"{self.name}:{key}", failure_threshold=self.breaker.failure_threshold,
+                    reset_timeout=self.breaker.reset_timeout, clock=self.breaker._clock,
+                )
+            return breaker
+
+    def _count(self, key: str, amount: int = 1):
+        with self._stats_lock:
+            self.stats[key] += amount
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    def _hedge_delay(self) -> Optional[float]:
+        if self.hedge_percentile is None or len(self.latency) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(self.hedge_percentile)
+
+    def _attempt(self, fn: Callable[[], Any]) -> Any:
+        delay = self._hedge_delay()
+        if delay is None:
+            return run_cancellable(fn)
+
+        # Each submission needs its own context copy; a Context can't be entered twice
+        primary = _hedge_executor.submit(contextvars.copy_context().run, fn)
+        try:
+            return wait_result(primary, timeout=delay)
+        except FuturesTimeoutError:
+            pass
+
+        self._count("hedges")
+        logger.info("Hedging slow %s call after %.2fs", self.name, delay)
+        backup = _hedge_executor.submit(contextvars.copy_context().run, fn)
+        pending = {primary, backup}
+        error = None
+        while pending:
+            done, pending = wait(pending, timeout=CANCEL_POLL_SECONDS, return_when=FIRST_COMPLETED)
+            check_cancelled()
+            for future in done:
+                if future.exception() is None:
+                    if future is backup:
+                        self._count("hedge_wins")
+                    return future.result()
+                error = future.exception()
+        raise error
+
+    def call(self, fn: Callable[[], Any], key: Optional[str] = None) -> Any:
+        """
+        Run `fn` with the circuit breaker, retries and optional hedging applied.
+
+        Args:
+            fn: The upstream call
+            key: Circuit to use (see `breaker_for`), so one failing model does not
+                refuse calls to the others
+
+        Raises:
+            CircuitOpenError: If the circuit is open
+            Exception: The last error once retries are exhausted or the error is not transient
+        """
+        breaker = self.breaker_for(key)
+        self._count("calls")
+        for attempt in range(self.max_retries + 1):
+            try:
+                breaker.allow()
+            except CircuitOpenError:
+                self._count("rejected")
+                raise
+            start = time.monotonic()
+            try:
+                result = self._attempt(fn)
+            except (RateLimitExceeded, RequestCancelled):
+                # Local admission control or a cancelled request, not an upstream failure
+                breaker.release_trial()
+                raise
+            except Exception as e:
+                transient = is_transient(e)
+                if transient:
+                    breaker.record_failure()
+                else:
+                    # A rejected request (bad input, auth) says nothing about the upstream's health
+                    breaker.release_trial()
+                if attempt >= self.max_retries or not transient:
+                    self._count("failures")
+                    raise
+                delay = self._backoff(attempt)
+                self._count("retries")
+                logger.warning("Transient %s error (%s), retry %s in %.2fs", self.name, type(e).__name__, attempt + 1, delay)
+                self._sleep(delay)
+                check_cancelled()
+                continue
+            self.latency.record(time.monotonic() - start)
+            breaker.record_success()
+            self._count("successes")
+            return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Counters, breaker state and latency percentiles for metrics endpoints."""
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        with self._stats_lock:
+            stats = dict(self.stats)
+        with self._breakers_lock:
+            breakers = dict(self._breakers)
+        return {
+            **stats,
+            "circuit": self.breaker.state,
+            "times_opened": self.breaker.times_opened + sum(breaker.times_opened for breaker in breakers.values()),
+            "circuits": {key: breaker.state for key, breaker in breakers.items()},
+            "latency_p50": round(p50, 3) if p50 is not None else None,
+            "latency_p95": round(p95, 3) if p95 is not None else None,
+        }
+
+
+def _env_percentile(name: str) -> Optional[float]:
+    value = os.getenv(name)
+    if not value:
+        return None
+    try:
+        return float(value)
+    except ValueError:
+        logger.warning("Invalid value for %s, hedging disabled", name)
+        return None
+
+
+def _build_upstream(name: str, prefix: str) -> ResilientUpstream:
+    breaker = CircuitBreaker(
+        name,
+        failure_threshold=int(os.getenv(f"{prefix}_CIRCUIT_FAILURE_THRESHOLD", 5)),
+        reset_timeout=float(os.getenv(f"{prefix}_CIRCUIT_RESET_SECONDS", 30)),
+    )
+    return ResilientUpstream(
+        name,
+        max_retries=int(os.getenv(f"{prefix}_MAX_RETRIES", 2)),
+        backoff_base=float(os.getenv(f"{prefix}_BACKOFF_SECONDS", 0.5)),
+        hedge_percentile=_env_percentile(f"{prefix}_HEDGE_PERCENTILE"),
+        breaker=breaker,
+    )
+
+
+# Shared resilience policies for each upstream
+openai_upstream = _build_upstream("openai", "OPENAI")
+google_upstream = _build_upstream("google", "GOOGLE")
+
+upstreams = {
+    "openai": openai_upstream,
+    "google": google_upstream,
+}
@@ -0,0 +1,323 @@
+import os
+import time
+import heapq
+import logging
+import itertools
+import threading
+import contextvars
+from contextlib import contextmanager
+from dataclasses import dataclass
+from typing import Callable, Dict, Iterator, List, Optional
+
+from .cancellation import CANCEL_POLL_SECONDS, current_cancel
+from .deadline import Deadline, deadline_scope
+from .rate_limiter import RateLimitExceeded, PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, priority_cap
+from .resilience import LatencyTracker
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Work classes, most urgent first
+INTERACTIVE = "interactive"  # /travel-plan and regeneration, a user is waiting
+QUERY = "query"              # ad-hoc /query calls
+BACKGROUND = "background"    # prefetch and refresh work nobody is waiting for yet
+BATCH = "batch"              # bulk pre-generation
+
+
+@dataclass(frozen=True)
+class WorkClass:
+    """
+    A priority class of work.
+
+    Args:
+        name: Class name
+        rank: Lower ranks are admitted first
+        concurrency: Work of this class running at the same time
+        max_queue: Waiting work of this class before new work is rejected
+        max_wait: Seconds work of this class waits for a slot before it is rejected
+        priority: Best upstream admission priority its calls may use (see `priority_cap`)
+        deadline: Latency budget in seconds of each piece of work, counted from when it asked
+                  for a slot (None = no deadline; see `deadline_scope`)
+    """
+    name: str
+    rank: int
+    concurrency: int
+    max_queue: int
+    max_wait: float
+    priority: int
+    deadline: Optional[float] = None
+
+
+# Set by work that a slot holder is waiting for (see `lend_slot`)
+slot_lender = contextvars.ContextVar("slot_lender", default=None)
+
+
+@contextmanager
+def lend_slot(lent: threading.Event):
+    """
+    Let the enclosed work stop waiting for a slot of its own once `lent` is set.
+
+    For work started ahead of time, such as prefetched stages, that a plan
+    holding a slot ends up waiting for: counting it against the slots would
+    stall the plan until its wait budget ran out when the pool is full.
+    """
+    handle = slot_lender.set(lent)
+    try:
+        yield
+    finally:
+        slot_lender.reset(handle)
+
+
+class _Waiter:
+    __slots__ = ("tag", "seq", "work_class", "client", "admitted", "abandoned")
+
+    def __init__(self, tag: float, seq: int, work_class: str, client: str):
+        self.tag = tag
+        self.seq = seq
+        self.work_class = work_class
+        self.client = client
+        self.admitted = False
+        self.abandoned = False
+
+    def __lt__(self, other: "_Waiter") -> bool:
+        return (self.tag, self.seq) < (other.tag, other.seq)
+
+
+class FairScheduler:
+    """
+    Admits work into a shared pool of `max_concurrent` slots.
+
+    A free slot goes to the most urgent class that has waiting work and is under
+    its own concurrency limit, so batch runs cannot take the slots interactive
+    requests need; `reserved` slots are kept for the most urgent class alone, so
+    the other classes together can never fill the pool. Within a class, clients
+    share the class by weighted fair queuing (start-time fair queuing): every
+    client's work is tagged with a virtual start time that advances by 1/weight
+    per item, so a client that submits a hundred jobs only gets its weighted
+    share while others wait.
+
+    Args:
+        classes: The work classes
+        max_concurrent: Slots shared by all classes
+        client_weights: Weight per client (default 1.0)
+        clock: Time source for wait-time metrics
+        reserved: Slots only the most urgent class may use
+    """
+
+    def __init__(self, classes: List[WorkClass], max_concurrent: int = 8,
+                 client_weights: Optional[Dict[str, float]] = None, clock: Callable[[], float] = time.monotonic,
+                 reserved: int = 0):
+        self.classes = {work_class.name: work_class for work_class in classes}
+        self.max_concurrent = max_concurrent
+        self.reserved = max(0, min(reserved, max_concurrent - 1))
+        self.client_weights = dict(client_weights or {})
+        self._clock = clock
+        self._cond = threading.Condition()
+        self._seq = itertools.count()
+        self._order = sorted(self.classes.values(), key=lambda work_class: work_class.rank)
+        self._waiters: Dict[str, List[_Waiter]] = {name: [] for name in self.classes}
+        self._virtual: Dict[str, float] = {name: 0.0 for name in self.classes}
+        self._client_tags: Dict[tuple, float] = {}
+        self._queued: Dict[str, int] = {name: 0 for name in self.classes}
+        self._running: Dict[str, int] = {name: 0 for name in self.classes}
+        self._waits = {name: LatencyTracker() for name in self.classes}
+        self.stats = {name: {"admitted": 0, "rejected": 0, "lent": 0} for name in self.classes}
+
+    @property
+    def running(self) -> int:
+        return sum(self._running.values())
+
+    def _has_room(self, work_class: WorkClass) -> bool:
+        """Whether `work_class` may start work now; called with the lock held."""
+        if self.running >= self.max_concurrent or self._running[work_class.name] >= work_class.concurrency:
+            return False
+        urgent = self._order[0].name
+        return work_class.name == urgent or \
+            self.running - self._running[urgent] < self.max_concurrent - self.reserved
+
+    def _dispatch(self):
+        """Hand free slots to waiting work; called with the lock held."""
+        admitted = False
+        while self.running < self.max_concurrent:
+            for work_class in self._order:
+                heap = self._waiters[work_class.name]
+                while heap and heap[0].abandoned:
+                    heapq.heappop(heap)
+                if heap and self._has_room(work_class):
+                    waiter = heapq.heappop(heap)
+                    waiter.admitted = True
+                    self._virtual[work_class.name] = waiter.tag
+                    self._queued[work_class.name] -= 1
+                    self._running[work_class.name] += 1
+                    admitted = True
+                    break
+            else:
+                break
+        if admitted:
+            self._cond.notify_all()
+
+    def _tag(self, work_class: str, client: str) -> float:
+        key = (work_class, client)
+        start = max(self._virtual[work_class], self._client_tags.get(key, 0.0))
+        tag = start + 1.0 / max(self.client_weights.get(client, 1.0), 1e-6)
+        self._client_tags[key] = tag
+        if len(self._client_tags) > 10000:
+            # Clients at or behind the virtual time would restart from it anyway
+            self._client_tags = {
+                key: tag for key, tag in self._client_tags.items() if tag > self._virtual[key[0]]
+            }
+        return tag
+
+    def open_classes(self) -> List[str]:
+        """Classes that could start work right now, most urgent first."""
+        with self._cond:
+            return [work_class.name for work_class in self._order if self._has_room(work_class)]
+
+    @contextmanager
+    def slot(self, work_class: str, client: str = "anonymous") -> Iterator[None]:
+        """
+        Hold a slot of `work_class` for the enclosed work, waiting for one if needed.
+
+        The enclosed upstream calls are admitted no higher than the class priority,
+        and the enclosed work runs against the class deadline. Work inside
+        `lend_slot` stops waiting once its event is set and runs without a slot.
+
+        Raises:
+            RateLimitExceeded: If the class queue is full or no slot frees up within its wait budget
+            RequestCancelled: If the waiting request is cancelled
+        """
+        spec = self.classes[work_class]
+        cancel = current_cancel.get()
+        lender = slot_lender.get()
+        start = self._clock()
+        lent = False
+        with self._cond:
+            if self._queued[work_class] >= spec.max_queue:
+                self.stats[work_class]["rejected"] += 1
+                raise RateLimitExceeded(f"scheduler:{work_class}", self._retry_after(work_class), "queue")
+            waiter = _Waiter(self._tag(work_class, client), next(self._seq), work_class, client)
+            heapq.heappush(self._waiters[work_class], waiter)
+            self._queued[work_class] += 1
+            self._dispatch()
+            try:
+                while not waiter.admitted:
+                    if cancel is not None:
+                        cancel.raise_if_cancelled()
+                    if lender is not None and lender.is_set():
+                        # A slot holder is waiting for this work, so it runs in that slot's stead
+                        waiter.abandoned = True
+                        self._queued[work_class] -= 1
+                        lent = True
+                        break
+                    remaining = start + spec.max_wait - self._clock()
+                    if remaining <= 0:
+                        self.stats[work_class]["rejected"] += 1
+                        raise RateLimitExceeded(f"scheduler:{work_class}", self._retry_after(work_class), "wait")
+                    polled = cancel is not None or lender is not None
+                    self._cond.wait(timeout=min(remaining, CANCEL_POLL_SECONDS) if polled else remaining)
+            except BaseException:
+                if waiter.admitted:
+                    self._running[work_class] -= 1
+                    self._dispatch()
+                else:
+                    waiter.abandoned = True
+                    self._queued[work_class] -= 1
+                raise
+            self.stats[work_class]["lent" if lent else "admitted"] += 1
+        self._waits[work_class].record(self._clock() - start)
+
+        handle = priority_cap.set(spec.priority)
+        if lent:
+            try:
+                yield
+            finally:
+                priority_cap.reset(handle)
+            return
+        try:
+            with deadline_scope(Deadline(spec.deadline, start=start, clock=self._clock) if spec.deadline else None):
+                yield
+        finally:
+            priority_cap.reset(handle)
+            with self._cond:
+                self._running[work_class] -= 1
+                self._dispatch()
+                self._cond.notify_all()
+
+    def _retry_after(self, work_class: str) -> float:
+        p50 = self._waits[work_class].percentile(50)
+        return p50 if p50 is not None else 1.0
+
+    def snapshot(self) -> Dict[str, object]:
+        """Slots in use, and per class queue depth, counters and wait-time percentiles."""
+        with self._cond:
+            classes = {
+                name: {
+                    "running": self._running[name],
+                    "concurrency": self.classes[name].concurrency,
+                    "queue_depth": self._queued[name],
+                    **self.stats[name],
+                }
+                for name in self.classes
+            }
+            waiting_clients = {}
+            for heap in self._waiters.values():
+                for waiter in heap:
+                    if not waiter.abandoned:
+                        waiting_clients[waiter.client] = waiting_clients.get(waiter.client, 0) + 1
+            running = self.running
+        for name, stats in classes.items():
+            for pct in (50, 95):
+                wait = self._waits[name].percentile(pct)
+                stats[f"wait_p{pct}_seconds"] = round(wait, 3) if wait is not None else None
+        busiest = sorted(waiting_clients.items(), key=lambda item: -item[1])[:10]
+        return {"max_concurrent": self.max_concurrent, "running": running, "classes": classes,
+                "busiest_clients": dict(busiest)}
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Parse "client=weight,client=weight" (as in SCHEDULER_CLIENT_WEIGHTS)."""
+    weights = {}
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        client, _, weight = item.partition("=")
+        try:
+            weights[client.strip()] = float(weight)
+        except ValueError:
+            logger.warning("Ignoring invalid client weight %r", item)
+    return weights
+
+
+def build_scheduler(max_concurrent: Optional[int] = None) -> FairScheduler:
+    """
+    Create the plan scheduler from the environment.
+
+    SCHEDULER_MAX_CONCURRENT sets the shared slots; each class is tuned with
+    SCHEDULER_<CLASS>_CONCURRENCY, _MAX_QUEUE, _MAX_WAIT_SECONDS and
+    _DEADLINE_SECONDS (0 = none), and SCHEDULER_CLIENT_WEIGHTS
+    ("client=weight,...") gives clients larger shares. SCHEDULER_INTERACTIVE_RESERVED
+    slots (default a quarter) are kept for interactive work. Interactive and query
+    work default to PLAN_DEADLINE_SECONDS; background and batch work have no
+    deadline, since completeness matters more there than latency.
+    """
+    max_concurrent = max_concurrent or int(os.getenv("SCHEDULER_MAX_CONCURRENT", 8))
+    plan_deadline = float(os.getenv("PLAN_DEADLINE_SECONDS", 90))
+    defaults = [
+        # name, rank, concurrency, max_queue, max_wait, upstream priority, deadline
+        (INTERACTIVE, 0, max_concurrent, 100, 30.0, PRIORITY_HIGH, plan_deadline),
+        (QUERY, 1, max(1, max_concurrent // 2), 50, 30.0, PRIORITY_NORMAL, plan_deadline),
+        (BACKGROUND, 2, max(1, max_concurrent // 4), 100, 60.0, PRIORITY_LOW, 0.0),
+        (BATCH, 3, max(1, max_concurrent // 4), 1000, 3600.0, PRIORITY_LOW, 0.0),
+    ]
+    classes = []
+    for name, rank, concurrency, max_queue, max_wait, priority, deadline in defaults:
+        prefix = f"SCHEDULER_{name.upper()}_"
+        classes.append(WorkClass(
+            name, rank,
+            concurrency=int(os.getenv(prefix + "CONCURRENCY", concurrency)),
+            max_queue=int(os.getenv(prefix + "MAX_QUEUE", max_queue)),
+            max_wait=float(os.getenv(prefix + "MAX_WAIT_SECONDS", max_wait)),
+            priority=priority,
+            deadline=float(os.getenv(prefix + "DEADLINE_SECONDS", deadline)) or None,
+        ))
+    reserved = int(os.getenv("SCHEDULER_INTERACTIVE_RESERVED", max(1, max_concurrent // 4)))
+    return FairScheduler(classes, max_concurrent, parse_weights(os.getenv("SCHEDULER_CLIENT_WEIGHTS", "")),
+                         reserved=reserved)
@@ -0,0 +1,138 @@
+import time
+import logging
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Optional, Tuple
+from .checkpoints import input_hash
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+def preferences_key(preferences: Dict[str, Any]) -> str:
+    """
+    Canonical hash of travel preferences.
+
+    Payloads that would produce the same plan hash the same: the destination is
+    compared case- and whitespace-insensitively, and interests as a set.
+    """
+    interests = preferences.get("interests") or []
+    return input_hash({
+        "destination": " ".join(str(preferences.get("destination", "")).split()).casefold(),
+        "trip_length": preferences.get("trip_length"),
+        "budget": str(preferences.get("budget", "")).strip().lower(),
+        "interests": sorted({str(interest).strip().lower() for interest in interests}),
+        "get_insights": bool(preferences.get("get_insights", True)),
+        "get_images": bool(preferences.get("get_images", True)),
+    })
+
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls with the same key onto one execution.
+
+    The first caller for a key (the leader) does the work; callers arriving
+    while it runs join and receive the same result or exception. Results are
+    kept afterwards, so an identical call shortly after can reuse them instead
+    of starting over. Callers that stop waiting `leave`, so the work can be
+    cancelled once nobody is left to receive it.
+
+    Args:
+        reuse_seconds: How long a finished result is reused (0 = only join in-flight calls)
+        max_recent: Finished results kept for reuse
+    """
+
+    def __init__(self, reuse_seconds: float = 0.0, max_recent: int = 1000,
+                 clock: Callable[[], float] = time.monotonic):
+        self.reuse_seconds = reuse_seconds
+        self.max_recent = max_recent
+        self._clock = clock
+        self._in_flight: Dict[str, Future] = {}
+        self._waiting: Dict[str, int] = {}
+        self._recent: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"leaders": 0, "joined": 0, "reused": 0}
+
+    def begin(self, key: str, reusable: Optional[Callable[[Any], bool]] = None) -> Tuple[Future, bool]:
+        """
+        Join the call for `key`, or become its leader.
+
+        Args:
+            key: Identifies identical calls
+            reusable: Decides whether a finished result may be reused, instead of
+                      its age being checked against `reuse_seconds`
+
+        Returns:
+            Tuple of the call's future and whether the caller is the leader, who
+            must run the work and pass its outcome to `finish`
+        """
+        with self._lock:
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.stats["joined"] += 1
+                self._waiting[key] += 1
+                return future, False
+            if key in self._recent:
+                finished, result = self._recent[key]
+                if reusable(result) if reusable is not None else self._clock() - finished <= self.reuse_seconds:
+                    self.stats["reused"] += 1
+                    future = Future()
+                    future.set_result(result)
+                    return future, False
+                del self._recent[key]
+            future = Future()
+            self._in_flight[key] = future
+            self._waiting[key] = 1
+            self.stats["leaders"] += 1
+            return future, True
+
+    def finish(self, key: str, future: Future, result: Any = None, error: Optional[BaseException] = None):
+        """Publish the leader's outcome to everyone who joined; only results are kept for reuse."""
+        with self._lock:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+                del self._waiting[key]
+            if error is None:
+                self._recent[key] = (self._clock(), result)
+                self._recent.move_to_end(key)
+                while len(self._recent) > self.max_recent:
+                    self._recent.popitem(last=False)
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+    def leave(self, key: str, future: Future) -> int:
+        """
+        Stop waiting for the in-flight call `future` (leader or joiner).
+
+        Returns:
+            How many callers are still waiting for it (0 once it has finished)
+        """
+        with self._lock:
+            if self._in_flight.get(key) is not future:
+                return 0
+            self._waiting[key] = max(0, self._waiting[key] - 1)
+            return self._waiting[key]
+
+    def run(self, key: str, work: Callable[[], Any]) -> Tuple[Any, bool]:
+        """
+        Run `work` once for all concurrent callers with `key`.
+
+        Returns:
+            Tuple of the result and whether it was shared from another call
+        """
+        future, leader = self.begin(key)
+        if leader:
+            try:
+                result = work()
+            except BaseException as e:
+                self.finish(key, future, error=e)
+                raise
+            self.finish(key, future, result)
+        return future.result(), not leader
+
+    def snapshot(self) -> Dict[str, int]:
+        with self._lock:
+            return {"in_flight": len(self._in_flight), "recent": len(self._recent), **self.stats}
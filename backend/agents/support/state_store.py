@@ -0,0 +1,190 @@
+import os
+import pickle
+import sqlite3
+import logging
+import threading
+import time
+from collections.abc import MutableMapping
+from typing import Any, Callable, Iterator, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# "memory" keeps state in plain dicts (single process); "sqlite" shares it between
+# worker processes on the same host
+STATE_BACKEND = os.getenv("STATE_BACKEND", "memory").lower()
+STATE_DB_PATH = os.getenv("STATE_DB_PATH", os.path.join(".state", "state.db"))
+
+
+class SQLiteDatabase:
+    """
+    A SQLite file shared by all processes on the host.
+
+    Each thread of each process gets its own connection (connections must not
+    cross a fork), and the database runs in WAL mode so readers never wait for
+    the single writer.
+    """
+
+    def __init__(self, path: str, timeout: float = 30.0):
+        self.path = path
+        self.timeout = timeout
+        self._local = threading.local()
+        directory = os.path.dirname(os.path.abspath(path))
+        os.makedirs(directory, exist_ok=True)
+        with self.connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+
+    def connect(self) -> sqlite3.Connection:
+        """Return this thread's connection, opening a new one after a fork."""
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None,
+                                   check_same_thread=False)
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def transaction(self):
+        """Context manager for an immediate (write-locked) transaction."""
+        return _Transaction(self.connect())
+
+
+class _Transaction:
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __enter__(self) -> sqlite3.Connection:
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+
+    def __exit__(self, exc_type, exc, tb):
+        self.conn.execute("ROLLBACK" if exc_type else "COMMIT")
+        return False
+
+
+class SharedMapping(MutableMapping):
+    """
+    Dict-like view of one namespace of a SQLiteDatabase.
+
+    Values are pickled, so anything picklable can be stored. Values are copies:
+    mutating a value read from the mapping does not change the stored one, so
+    write it back (or use `modify`) after changing it. Iteration follows
+    insertion order, like a dict.
+    """
+
+    def __init__(self, database: SQLiteDatabase, namespace: str):
+        self.database = database
+        self.namespace = namespace
+        self.database.connect().execute(
+            "CREATE TABLE IF NOT EXISTS shared_state ("
+            " namespace TEXT NOT NULL, key TEXT NOT NULL, value BLOB NOT NULL, updated_at REAL NOT NULL,"
+            " PRIMARY KEY (namespace, key))"
+        )
+
+    def __getitem__(self, key: str) -> Any:
+        row = self.database.connect().execute(
+            "SELECT value FROM shared_state WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return pickle.loads(row[0])
+
+    def __setitem__(self, key: str, value: Any):
+        self.database.connect().execute(
+            "INSERT INTO shared_state (namespace, key, value, updated_at) VALUES (?, ?, ?, ?)"
+            " ON CONFLICT (namespace, key) DO UPDATE SET value = excluded.value, updated_at = excluded.updated_at",
+            (self.namespace, key, pickle.dumps(value), time.time())
+        )
+
+    def __delitem__(self, key: str):
+        cursor = self.database.connect().execute(
+            "DELETE FROM shared_state WHERE namespace = ? AND key = ?", (self.namespace, key)
+        )
+        if cursor.rowcount == 0:
+            raise KeyError(key)
+
+    def __contains__(self, key: object) -> bool:
+        return self.database.connect().execute(
+            "SELECT 1 FROM shared_state WHERE namespace = ? AND key = ?", (self.namespace, key)
+        ).fetchone() is not None
+
+    def _keys(self, order: str) -> Iterator[str]:
+        rows = self.database.connect().execute(
+            f"SELECT key FROM shared_state WHERE namespace = ? ORDER BY rowid {order}", (self.namespace,)
+        ).fetchall()
+        return iter([row[0] for row in rows])
+
+    def __iter__(self) -> Iterator[str]:
+        return self._keys("ASC")
+
+    def __reversed__(self) -> Iterator[str]:
+        return self._keys("DESC")
+
+    def __len__(self) -> int:
+        return self.database.connect().execute(
+            "SELECT COUNT(*) FROM shared_state WHERE namespace = ?", (self.namespace,)
+        ).fetchone()[0]
+
+    def modify(self, key: str, update: Callable[[Any], Any]) -> Any:
+        """
+        Atomically replace the value at `key` with `update(old_value)`.
+
+        The read and the write happen in one write-locked transaction, so
+        concurrent modifications from other processes are not lost.
+        """
+        with self.database.transaction() as conn:
+            row = conn.execute(
+                "SELECT value FROM shared_state WHERE namespace = ? AND key = ?", (self.namespace, key)
+            ).fetchone()
+            if row is None:
+                raise KeyError(key)
+            value = update(pickle.loads(row[0]))
+            conn.execute(
+                "UPDATE shared_state SET value = ?, updated_at = ? WHERE namespace = ? AND key = ?",
+                (pickle.dumps(value), time.time(), self.namespace, key)
+            )
+            return value
+
+
+class LocalMapping(dict):
+    """In-process stand-in for SharedMapping with the same `modify` helper."""
+
+    def __init__(self):
+        super().__init__()
+        self._lock = threading.Lock()
+
+    def modify(self, key: str, update: Callable[[Any], Any]) -> Any:
+        with self._lock:
+            value = update(self[key])
+            self[key] = value
+            return value
+
+
+_database = None
+_database_lock = threading.Lock()
+
+
+def shared_database() -> Optional[SQLiteDatabase]:
+    """The host-wide state database, or None when the memory backend is in use."""
+    global _database
+    if STATE_BACKEND != "sqlite":
+        return None
+    with _database_lock:
+        if _database is None:
+            _database = SQLiteDatabase(STATE_DB_PATH)
+            logger.info("Using shared state database at %s", STATE_DB_PATH)
+        return _database
+
+
+def shared_state(namespace: str) -> MutableMapping:
+    """
+    Return the mapping that holds `namespace` state.
+
+    With STATE_BACKEND=sqlite every worker process on the host sees the same
+    data; otherwise state lives in this process only.
+    """
+    database = shared_database()
+    if database is None:
+        return LocalMapping()
+    return SharedMapping(database, namespace)
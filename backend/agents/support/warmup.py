@@ -0,0 +1,84 @@
+import time
+import logging
+import threading
+from typing import Any, Callable, Dict, List, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Readiness states
+STARTING = "starting"
+WARMING = "warming"
+READY = "ready"
+
+
+class Readiness:
+    """
+    Warm-up progress of this worker process.
+
+    Liveness (`/api/health`) only says the process is up; readiness says it has
+    finished warming up and should receive traffic. A failed warm-up step is
+    recorded but does not keep the worker out of rotation: the step's work is
+    simply paid for by the first request that needs it, as before.
+    """
+
+    def __init__(self, clock=time.monotonic):
+        self.status = STARTING
+        self.steps: Dict[str, Dict[str, Any]] = {}
+        self._clock = clock
+        self._lock = threading.Lock()
+        self._started = None
+        self._finished = None
+
+    @property
+    def ready(self) -> bool:
+        return self.status == READY
+
+    def run(self, steps: List[Tuple[str, Callable[[], Any]]]):
+        """
+        Run warm-up steps in order, then mark the process ready.
+
+        Args:
+            steps: (name, function) pairs; a function's return value is reported
+                   as the step's detail
+        """
+        with self._lock:
+            self.status = WARMING
+            self._started = self._clock()
+        for name, step in steps:
+            start = self._clock()
+            try:
+                detail = step()
+                result = {"ok": True, "detail": detail}
+            except Exception as e:
+                logger.warning("Warm-up step %s failed: %s", name, e)
+                result = {"ok": False, "error": str(e)}
+            result["seconds"] = round(self._clock() - start, 3)
+            with self._lock:
+                self.steps[name] = result
+        with self._lock:
+            self._finished = self._clock()
+            self.status = READY
+        logger.info("Warm-up finished in %.2fs", self._finished - self._started)
+
+    def start(self, steps: List[Tuple[str, Callable[[], Any]]]) -> threading.Thread:
+        """Run the warm-up in a background thread so liveness checks answer meanwhile."""
+        thread = threading.Thread(target=self.run, args=(steps,), name="warmup", daemon=True)
+        thread.start()
+        return thread
+
+    def mark_ready(self):
+        """Skip the warm-up (e.g. when it is disabled)."""
+        with self._lock:
+            self.status = READY
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            seconds = None
+            if self._started is not None:
+                seconds = round((self._finished or self._clock()) - self._started, 3)
+            return {"status": self.status, "seconds": seconds, "steps": dict(self.steps)}
+
+
+# Warm-up state of this process, reported by /api/ready
+readiness = Readiness()
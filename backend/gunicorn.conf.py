@@ -0,0 +1,23 @@
+import os
+import multiprocessing
+
+# Production server settings, used by `python main.py` with SERVER_MODE=production
+# (or directly: gunicorn -c gunicorn.conf.py main:app)
+
+bind = f"{os.getenv('BACKEND_HOST', '0.0.0.0')}:{os.getenv('BACKEND_PORT', 8000)}"
+workers = int(os.getenv("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+worker_class = "uvicorn.workers.UvicornWorker"
+
+# Recycle workers after a number of requests to bound memory growth;
+# the jitter keeps all workers from restarting at the same time
+max_requests = int(os.getenv("WORKER_MAX_REQUESTS", 1000))
+max_requests_jitter = int(os.getenv("WORKER_MAX_REQUESTS_JITTER", 100))
+
+# Plan generation can take minutes, so allow long requests and a long drain on restart
+timeout = int(os.getenv("WORKER_TIMEOUT_SECONDS", 300))
+graceful_timeout = int(os.getenv("WORKER_GRACEFUL_TIMEOUT_SECONDS", 120))
+keepalive = 5
+
+# Plans and job status must be visible to every worker, so default to the shared backend.
+# This file is read by the master before workers start and import the app.
+os.environ.setdefault("STATE_BACKEND", "sqlite")
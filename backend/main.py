@@ -1,5 +1,6 @@
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 import uvicorn
 import os
 from dotenv import load_dotenv
@@ -7,6 +8,10 @@ from dotenv import load_dotenv
 # Load environment variables
 load_dotenv()
 
+# Route all logging through a non-blocking queue before any other module logs
+from agents.support.logging_config import configure_logging
+configure_logging()
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Travel Planning Agent API",
@@ -23,25 +28,64 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# Compress larger responses (endpoints that already set Content-Encoding are left alone)
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
+# Opt-in profiling; nothing is installed unless PROFILING_ENABLED is set
+from agents.support.profiling import PROFILING_ENABLED, ProfileMiddleware
+if PROFILING_ENABLED:
+    app.add_middleware(ProfileMiddleware)
+
 # Health check endpoint
 @app.get("/api/health")
 def health_check():
     return {"status": "ok", "message": "Travel Planning Agent API is running!"}
 
+from agents.support.warmup import readiness
+
+# Readiness endpoint: load balancers should only route to warmed-up workers
+@app.get("/api/ready")
+def readiness_check(response: Response):
+    snapshot = readiness.snapshot()
+    if not readiness.ready:
+        response.status_code = 503
+    return snapshot
+
 # Import and include routers
 from routers import agents
 app.include_router(agents.router, prefix="/api/agents", tags=["Agents"])
 # Import and include the new itinerary router
 from routers import itinerary
 app.include_router(itinerary.router, prefix="/api/itinerary", tags=["Itinerary"])
+if PROFILING_ENABLED:
+    from routers import admin
+    app.include_router(admin.router, prefix="/api/admin", tags=["Admin"])
+
+# Warm up in the background so /api/health answers while /api/ready reports 503
+@app.on_event("startup")
+def start_warmup():
+    if os.getenv("WARMUP_ENABLED", "true").lower() in ("true", "1", "t"):
+        readiness.start(agents.warmup_steps())
+    else:
+        readiness.mark_ready()
+
 # Uncomment other routers as they are implemented
 # from routers import travel_plans, users
 # app.include_router(travel_plans.router, prefix="/api/travel-plans", tags=["Travel Plans"])
 # app.include_router(users.router, prefix="/api/users", tags=["Users"])
 
 if __name__ == "__main__":
+    if os.getenv("SERVER_MODE", "development").lower() == "production":
+        # Several worker processes with recycling; plans and status are shared through
+        # the SQLite state backend. exec replaces this process, so nothing above leaks
+        # into the workers.
+        backend_dir = os.path.dirname(os.path.abspath(__file__))
+        os.execvp("gunicorn", ["gunicorn", "--chdir", backend_dir,
+                               "-c", os.path.join(backend_dir, "gunicorn.conf.py"), "main:app"])
+    
     port = int(os.getenv("BACKEND_PORT", 8000))
     host = os.getenv("BACKEND_HOST", "0.0.0.0")
     debug = os.getenv("DEBUG", "False").lower() in ("true", "1", "t")
     
-    uvicorn.run("main:app", host=host, port=port, reload=debug) 
\ No newline at end of file
+    # log_config=None lets uvicorn's own loggers go through the queue-based pipeline too
+    uvicorn.run("main:app", host=host, port=port, reload=debug, log_config=None) 
\ No newline at end of file
@@ -0,0 +1,36 @@
+from fastapi import APIRouter, HTTPException, Header
+from typing import Optional
+import asyncio
+import logging
+from agents.support.profiling import (
+    PROFILE_MAX_SECONDS, SAMPLE, ProfileCapture, authorized
+)
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Create router (only included when PROFILING_ENABLED is set)
+router = APIRouter()
+
+@router.post("/profile")
+async def profile_process(seconds: float = 10.0, interval_ms: float = 5.0,
+                          x_profile_token: Optional[str] = Header(None)):
+    """
+    Sample the stacks of every thread in this worker process for `seconds`.
+
+    Writes folded stacks (flamegraph.pl / speedscope / inferno input) and returns
+    the file path. Requests keep being served while the profile is captured.
+    """
+    if not authorized(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profile token")
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise HTTPException(status_code=400, detail=f"seconds must be between 0 and {PROFILE_MAX_SECONDS:.0f}")
+
+    capture = ProfileCapture(SAMPLE, interval=max(interval_ms, 1.0) / 1000)
+    if not capture.start():
+        raise HTTPException(status_code=409, detail="Another profile is being captured")
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        path = capture.stop()
+    return {"mode": capture.mode, "output": path, "samples": capture.samples}
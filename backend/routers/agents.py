@@ -1,9 +1,33 @@
-from fastapi import APIRouter, HTTPException, Depends
+from fastapi import APIRouter, HTTPException, Depends, BackgroundTasks, Request, Response
 from pydantic import BaseModel
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable, Tuple
+import os
 import logging
 import uuid
-from agents.core.coordinator import CoordinatorAgent
+import math
+import time
+import asyncio
+import hashlib
+from itertools import islice
+from dataclasses import dataclass
+from starlette.concurrency import run_in_threadpool
+from agents.core.coordinator import CoordinatorAgent, STAGE_OUTPUTS, invalidated_stages, plan_reuse
+from agents.core.prefetch import build_prefetcher
+from agents.support.rate_limiter import RateLimitExceeded, check_admission, limiters
+from agents.support.resilience import upstreams
+from agents.support.model_router import model_router
+from agents.support.state_store import shared_state
+from agents.support.job_queue import build_plan_queue
+from agents.support.checkpoints import StageCheckpoints, input_hash
+from agents.support.single_flight import SingleFlight, preferences_key
+from agents.support.cancellation import CancelRegistry, CancelToken, RequestCancelled, cancel_scope
+from agents.support.scheduler import BACKGROUND, INTERACTIVE, QUERY, build_scheduler
+from agents.support.profiling import profiled
+from agents.core.specialized_agents import customsearch_service
+from routers.http_cache import (
+    MIN_COMPRESS_BYTES, SUPPORTED_ENCODINGS, RepresentationCache, encode_body, http_date, is_not_modified,
+    json_bytes, make_etag
+)
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -14,8 +38,51 @@ router = APIRouter()
 # Initialize coordinator
 coordinator = CoordinatorAgent()
 
-# In-memory storage for travel plans (in a production app, this would be a database)
-travel_plans = {}
+# Storage for travel plans, shared by all worker processes when STATE_BACKEND=sqlite
+travel_plans = shared_state("travel_plans")
+
+# Preferences and raw stage outputs behind each stored plan, used for incremental regeneration
+plan_sources = shared_state("plan_sources")
+
+# Validated, pre-serialized finished plans served directly on retrieval
+encoded_plans = shared_state("encoded_plans")
+
+# Compressed bodies of finished plans; they never change, so each is compressed once
+plan_representations = RepresentationCache()
+
+# "inline" generates plans in this process; "queue" only enqueues them for worker.py
+PLAN_EXECUTION = os.getenv("PLAN_EXECUTION", "inline").lower()
+plan_jobs = build_plan_queue() if PLAN_EXECUTION == "queue" else None
+
+# Stage outputs of unfinished plan jobs, so a retried job only runs the remaining stages
+stage_checkpoints = StageCheckpoints(shared_state("stage_checkpoints"))
+
+# Shared slots for plan, query and prefetch work, by priority class and fair between clients
+plan_scheduler = build_scheduler()
+
+def scheduled(work_class: str, client: str, fn: Callable[..., Any], *args, **kwargs) -> Any:
+    """Run `fn` in a slot of the plan scheduler, waiting for one if needed."""
+    with plan_scheduler.slot(work_class, client):
+        return fn(*args, **kwargs)
+
+# Destination stages started from the questionnaire; adopted by plans generated in this process
+prefetcher = build_prefetcher(
+    lambda stage, preferences, priority, client: scheduled(BACKGROUND, client, coordinator.run_stage,
+                                                           stage, preferences, priority)
+)
+
+# Identical plan requests share one generation; PLAN_REUSE_SECONDS also reuses recently finished plans
+PLAN_COALESCING = os.getenv("PLAN_COALESCING", "true").lower() in ("true", "1", "t")
+PLAN_REUSE_SECONDS = float(os.getenv("PLAN_REUSE_SECONDS", 0))
+plan_flights = SingleFlight(reuse_seconds=PLAN_REUSE_SECONDS) if PLAN_COALESCING else None
+
+# Cancel tokens of plans generated in this process: progressive plans by plan ID, inline ones by request key
+active_plans = CancelRegistry()
+inline_plans = CancelRegistry()
+PLAN_CANCELLED = "Plan generation was cancelled"
+
+# How often an inline plan request checks whether its client is still connected
+DISCONNECT_POLL_SECONDS = float(os.getenv("DISCONNECT_POLL_SECONDS", 0.5))
 
 # Request models
 class TravelPreferences(BaseModel):
@@ -25,6 +92,21 @@ class TravelPreferences(BaseModel):
     interests: List[str] = []
     get_insights: bool = True
     get_images: bool = True
+    # Token of a prefetch session started with POST /prefetch
+    session_token: Optional[str] = None
+
+class PrefetchRequest(BaseModel):
+    session_token: str
+    destination: str
+    get_images: bool = True
+
+class PlanChanges(BaseModel):
+    destination: Optional[str] = None
+    trip_length: Optional[int] = None
+    budget: Optional[str] = None
+    interests: Optional[List[str]] = None
+    get_insights: Optional[bool] = None
+    get_images: Optional[bool] = None
 
 class AgentQuery(BaseModel):
     agent_type: str
@@ -43,87 +125,602 @@ class TravelPlanResponse(BaseModel):
     accommodation: str
     insights: Optional[str] = None
     images: Optional[str] = None
+    # Progressive plans are readable before generation finishes
+    sections_ready: Dict[str, bool] = {}
+    complete: bool = True
+    error: Optional[str] = None
+    # What was skipped, reused stale or shortened to meet the plan's deadline
+    degraded: List[Dict[str, str]] = []
+
+class RegeneratedPlanResponse(TravelPlanResponse):
+    source_plan_id: str
+    rerun_stages: List[str]
+    reused_stages: List[str]
 
 class AgentResponse(BaseModel):
     response: str
 
+# Field names a plan can be projected to with ?fields=
+PLAN_FIELDS = frozenset(TravelPlanResponse.model_fields)
+
+@dataclass(frozen=True)
+class EncodedPlan:
+    """A plan validated against TravelPlanResponse once and kept as JSON bytes."""
+    payload: Dict[str, Any]
+    body: bytes
+    etag: str
+    updated_at: float
+    complete: bool
+
+def encode_plan(plan: Dict[str, Any]) -> EncodedPlan:
+    """Validate a stored plan and serialize it for direct serving."""
+    payload = TravelPlanResponse(**plan).model_dump()
+    body = json_bytes(payload)
+    return EncodedPlan(payload, body, make_etag(body), plan.get("updated_at", time.time()), plan.get("complete", True))
+
 # Valid agent types
 VALID_AGENT_TYPES = ["attractions", "food", "accommodation", "reviews", "images", "planner"]
 
+def client_identity(request: Request) -> str:
+    """Who the scheduler shares capacity between: the API key if one is sent, else the client address."""
+    api_key = request.headers.get("x-api-key")
+    if api_key:
+        return "key:" + hashlib.sha256(api_key.encode()).hexdigest()[:12]
+    return "ip:" + (request.client.host if request.client else "unknown")
+
+def requested_work_class(request: Request, default: str) -> str:
+    """
+    The work class of a request: `default`, or a less urgent class asked for with X-Work-Class.
+
+    Clients can move bulk work out of the way (e.g. `X-Work-Class: batch`) but not ahead of it.
+    """
+    requested = request.headers.get("x-work-class")
+    if not requested:
+        return default
+    if requested not in plan_scheduler.classes:
+        raise HTTPException(status_code=400,
+                            detail=f"Unknown work class. Must be one of {', '.join(plan_scheduler.classes)}")
+    return max(default, requested, key=lambda name: plan_scheduler.classes[name].rank)
+
+def rate_limited_error(error: RateLimitExceeded) -> HTTPException:
+    """Translate upstream back-pressure into a 503 the client can retry."""
+    logger.warning("Shedding request: %s", error)
+    return HTTPException(
+        status_code=503,
+        detail=f"The service is busy ({error.upstream} {error.reason}). Please retry shortly.",
+        headers={"Retry-After": str(math.ceil(error.retry_after))}
+    )
+
+def store_travel_plan(response: Dict[str, Any], pref_dict: Dict[str, Any],
+                      plan_id: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Fill in defaults for missing fields, assign an ID (unless one was reserved
+    for a progressive plan) and store the finished plan together with the
+    preferences and raw stage outputs it was generated from.
+    
+    A reserved plan that was cancelled or failed meanwhile is left as it is and
+    returned instead.
+    """
+    # Keep the raw stage outputs before defaults are applied, so they can be reused as-is
+    stage_outputs = {field: response.get(field) for field in STAGE_OUTPUTS.values()}
+    # Fallback text and deadline stand-ins are shown, but re-run rather than reused
+    failed = response.pop("failed_sections", [])
+    
+    # Generate a unique ID for this travel plan
+    reserved = plan_id is not None
+    plan_id = plan_id or str(uuid.uuid4())
+    
+    # Add the ID to the response
+    response["id"] = plan_id
+    
+    # Ensure all required fields exist with default values if needed
+    # This prevents Pydantic validation errors
+    required_fields = {
+        "destination": pref_dict.get("destination", "Unknown"),
+        "trip_length": pref_dict.get("trip_length", 3),
+        "budget": pref_dict.get("budget", "moderate"),
+        "interests": pref_dict.get("interests", []),
+        "itinerary": "No itinerary available.",
+        "attractions": "No attractions information available.",
+        "food": "No food recommendations available.",
+        "accommodation": "No accommodation information available.",
+        "insights": "No insights available. Please try again later.",
+        "images": "No images available."
+    }
+    
+    # Only apply default values if the field is missing, None, or empty
+    for field, default_value in required_fields.items():
+        if field not in response:
+            response[field] = default_value
+        elif response[field] is None:
+            response[field] = default_value
+        elif isinstance(response[field], str) and not response[field].strip():
+            response[field] = default_value
+        # Don't apply the default if there's valid content (even partial)
+    
+    response["sections_ready"] = {field: True for field in STAGE_OUTPUTS.values()}
+    response["complete"] = True
+    response["updated_at"] = time.time()
+            
+    # Log what we're actually returning
+    logger.debug("Response insights length: %s", len(response.get('insights', '')))
+    logger.debug("Response images length: %s", len(response.get('images', '')))
+    if response.get('images') and logger.isEnabledFor(logging.DEBUG):
+        logger.debug("First 100 chars of images: %s", response.get('images', '')[:100])
+    
+    # Store the travel plan for later retrieval, validated and serialized once
+    if reserved:
+        def finish(plan):
+            if plan.get("complete") and plan.get("error"):
+                # Cancelled (or failed) while this generation was finishing; that outcome stands
+                return plan
+            return response
+    
+        stored = travel_plans.modify(plan_id, finish)
+        if stored is not response:
+            logger.info("Not storing travel plan %s; it already finished with: %s", plan_id, stored["error"])
+            return stored
+    else:
+        travel_plans[plan_id] = response
+    plan_sources[plan_id] = {"preferences": pref_dict, "stages": stage_outputs, "failed": failed}
+    encoded_plans[plan_id] = encode_plan(response)
+    
+    return response
+
+def start_progressive_plan(pref_dict: Dict[str, Any]) -> Dict[str, Any]:
+    """Reserve an ID and store an empty plan whose sections fill in as stages finish."""
+    plan_id = str(uuid.uuid4())
+    plan = {
+        "id": plan_id,
+        "destination": pref_dict.get("destination", "Unknown"),
+        "trip_length": pref_dict.get("trip_length", 3),
+        "budget": pref_dict.get("budget", "moderate"),
+        "interests": pref_dict.get("interests", []),
+        **{field: "" for field in STAGE_OUTPUTS.values()},
+        "sections_ready": {field: False for field in STAGE_OUTPUTS.values()},
+        "complete": False,
+        "error": None,
+        "updated_at": time.time(),
+    }
+    travel_plans[plan_id] = plan
+    return plan
+
+def publish_section(plan_id: str, field: str, content: str):
+    """Make one finished section of a progressive plan readable."""
+    def update(plan):
+        if plan.get("complete"):
+            return plan
+        # Replace rather than mutate, so concurrent readers always see a consistent plan
+        return {
+            **plan,
+            field: content or "",
+            "sections_ready": {**plan["sections_ready"], field: True},
+            "updated_at": time.time(),
+        }
+    
+    try:
+        travel_plans.modify(plan_id, update)
+    except KeyError:
+        pass
+
+def generate_plan(plan_id: str, pref_dict: Dict[str, Any], source_plan_id: Optional[str] = None,
+                  resumable: bool = False, prefetched: Optional[Dict[str, Any]] = None):
+    """
+    Generate a reserved plan, publishing each section as it completes.
+    
+    When `source_plan_id` is given, stages whose inputs did not change are reused
+    from that plan. `prefetched` sections (see `Prefetcher.adopt`) are adopted
+    instead of running their stages again. With `resumable`, each completed stage is checkpointed under the
+    plan ID and the hash of its inputs, a previous attempt's checkpoint is resumed,
+    and a failed planner raises so the job can be retried. Errors are raised to the caller.
+    """
+    on_section = lambda field, content: publish_section(plan_id, field, content)
+    reuse = {}
+    if source_plan_id is not None:
+        source = plan_sources[source_plan_id]
+        reuse, rerun = plan_reuse(source["preferences"], source["stages"], pref_dict, source.get("failed", ()))
+        logger.info("Regenerating plan %s from %s: re-running %s", plan_id, source_plan_id, sorted(rerun) or 'nothing')
+    if prefetched:
+        reuse.update(prefetched)
+
+    on_checkpoint = None
+    if resumable:
+        inputs_hash = input_hash({"preferences": pref_dict, "source_plan_id": source_plan_id})
+        checkpointed = stage_checkpoints.load(plan_id, inputs_hash)
+        if checkpointed:
+            logger.info("Resuming plan %s with checkpointed sections %s", plan_id, sorted(checkpointed))
+            reuse.update(checkpointed)
+        on_checkpoint = lambda field, content: stage_checkpoints.save(plan_id, inputs_hash, field, content)
+
+    response = coordinator.process_request(pref_dict, reuse=reuse, on_section=on_section,
+                                           on_checkpoint=on_checkpoint)
+    store_travel_plan(response, pref_dict, plan_id=plan_id)
+    if resumable:
+        stage_checkpoints.clear(plan_id)
+
+def fail_plan(plan_id: str, error: str):
+    """Mark a reserved plan as finished with an error and drop its checkpoint."""
+    stage_checkpoints.clear(plan_id)
+    travel_plans.modify(plan_id, lambda plan: {**plan, "complete": True, "error": error, "updated_at": time.time()})
+
+def run_progressive_plan(plan_id: str, pref_dict: Dict[str, Any], source_plan_id: Optional[str] = None,
+                         prefetched: Optional[Dict[str, Any]] = None, work_class: str = INTERACTIVE,
+                         client: str = "anonymous"):
+    """Generate a progressive plan in the background, recording any error on the plan."""
+    # Registered by submit_plan, so DELETE can cancel a plan whose task has not started yet
+    cancel = active_plans.register(plan_id)
+    try:
+        with cancel_scope(cancel), plan_scheduler.slot(work_class, client):
+            generate_plan(plan_id, pref_dict, source_plan_id, prefetched=prefetched)
+    except RequestCancelled:
+        logger.info("Progressive travel plan %s was cancelled", plan_id)
+    except Exception as e:
+        logger.error("Error generating progressive travel plan %s: %s", plan_id, e)
+        fail_plan(plan_id, str(e))
+    finally:
+        active_plans.unregister(plan_id)
+
+def submit_plan(pref_dict: Dict[str, Any], background_tasks: BackgroundTasks,
+                source_plan_id: Optional[str] = None, prefetched: Optional[Dict[str, Any]] = None,
+                work_class: str = INTERACTIVE, client: str = "anonymous") -> Dict[str, Any]:
+    """
+    Reserve a plan and hand its generation to the job queue (queue mode) or a background task.
+    
+    Either way it runs in a `work_class` slot of the scheduler, shared fairly with other clients.
+    """
+    plan = start_progressive_plan(pref_dict)
+    if plan_jobs is not None:
+        plan_jobs.enqueue(plan["id"], {"preferences": pref_dict, "source_plan_id": source_plan_id,
+                                       "work_class": work_class, "client": client},
+                          priority=plan_scheduler.classes[work_class].rank)
+    else:
+        active_plans.register(plan["id"])
+        background_tasks.add_task(run_progressive_plan, plan["id"], pref_dict, source_plan_id, prefetched,
+                                  work_class, client)
+    return plan
+
+def joinable_plan(plan_id: str) -> bool:
+    """Whether the plan of an earlier identical request can answer a new one."""
+    plan = travel_plans.get(plan_id)
+    if plan is None or plan.get("error"):
+        return False
+    if not plan.get("complete"):
+        # Still being generated in the background or by a worker
+        return True
+    return time.time() - plan.get("updated_at", 0) <= PLAN_REUSE_SECONDS
+
+def start_plan(preferences: TravelPreferences, pref_dict: Dict[str, Any], background_tasks: BackgroundTasks,
+               progressive: bool, cancel: Optional[CancelToken] = None, work_class: str = INTERACTIVE,
+               client: str = "anonymous") -> str:
+    """
+    Generate a plan (or submit it, when progressive) and return its ID.
+    
+    Inline generation waits for a `work_class` slot of the scheduler and stops
+    with RequestCancelled once `cancel` is cancelled. It runs in a threadpool
+    thread, so it joins the request's `X-Profile: cprofile` capture explicitly.
+    """
+    # Queued plans run in a worker process, which cannot wait on this process's prefetch
+    prefetched = {}
+    if plan_jobs is None:
+        prefetched = prefetcher.adopt(preferences.session_token, preferences.destination, preferences.get_images)
+    elif preferences.session_token:
+        prefetcher.cancel(preferences.session_token)
+    
+    if progressive:
+        return submit_plan(pref_dict, background_tasks, prefetched=prefetched, work_class=work_class,
+                           client=client)["id"]
+    
+    # Process the request with the coordinator
+    with profiled(), cancel_scope(cancel), plan_scheduler.slot(work_class, client):
+        response = coordinator.process_request(pref_dict, reuse=prefetched)
+    return store_travel_plan(response, pref_dict)["id"]
+
+async def watch_disconnect(request: Request, on_disconnect: Callable[[], None]):
+    """Call `on_disconnect` once the client of `request` has gone away; cancel the task to stop watching."""
+    while not await request.is_disconnected():
+        await asyncio.sleep(DISCONNECT_POLL_SECONDS)
+    on_disconnect()
+
 # Routes
+def warm_plan_cache(limit: int) -> int:
+    """
+    Compress the most recently stored plans into this worker's representation cache.
+
+    Recent plans are the ones most likely to be viewed or shared right after a
+    deploy; with a shared state backend they were stored by other (older) workers.
+
+    Returns:
+        Number of plans compressed
+    """
+    warmed = 0
+    for plan_id in islice(reversed(encoded_plans), limit):
+        encoded = encoded_plans.get(plan_id)
+        if encoded is None or not encoded.complete or len(encoded.body) < MIN_COMPRESS_BYTES:
+            continue
+        plan_representations.get_or_compress(encoded.etag, encoded.body, SUPPORTED_ENCODINGS[0])
+        warmed += 1
+    return warmed
+
+def warmup_steps() -> List[Tuple[str, Callable[[], Any]]]:
+    """
+    Startup work that would otherwise land on the first requests after a deploy.
+
+    Configured with WARMUP_OPENAI (default true) and WARMUP_RECENT_PLANS (default 50).
+    """
+    steps = [("google_search_client", lambda: type(customsearch_service()).__name__)]
+    if os.getenv("WARMUP_OPENAI", "true").lower() in ("true", "1", "t"):
+        steps.append(("openai_connections", coordinator.agent_service.preconnect))
+    recent_plans = int(os.getenv("WARMUP_RECENT_PLANS", 50))
+    if recent_plans > 0:
+        steps.append(("plan_cache", lambda: warm_plan_cache(recent_plans)))
+    return steps
+
 @router.post("/travel-plan", response_model=TravelPlanResponse)
-async def create_travel_plan(preferences: TravelPreferences):
+async def create_travel_plan(preferences: TravelPreferences, background_tasks: BackgroundTasks,
+                             request: Request, http_response: Response, progressive: bool = False):
     """
     Create a comprehensive travel plan based on user preferences.
     
     This endpoint coordinates multiple specialized agents to generate a complete
     travel itinerary with attractions, food, and accommodation recommendations.
+    
+    With `?progressive=true` the plan ID is returned immediately (202) and the plan
+    is generated in the background. `GET /travel-plan/{plan_id}` then returns each
+    section as soon as its stage finishes, with per-section `sections_ready` flags;
+    the itinerary fills in last and `complete` becomes true. With
+    PLAN_EXECUTION=queue every plan is handled this way, by a separate worker.
+    
+    A `session_token` from `POST /prefetch` lets the plan adopt the destination
+    stages that were started while the questionnaire was being filled in.
+    
+    Requests with identical preferences (double submits, client retries) that
+    arrive while a plan is being generated receive that plan instead of starting
+    another generation.
+    
+    An inline plan whose clients have all disconnected is cancelled: its
+    remaining stages and queued upstream calls are dropped. Progressive plans
+    are cancelled with `DELETE /travel-plan/{plan_id}`.
+    
+    Plans are interactive work; send `X-Work-Class: background` or `batch` for
+    bulk generation, so it only uses the slots interactive users leave free.
+    Capacity within a class is shared fairly by API key (X-API-Key) or client address.
     """
+    work_class, client = requested_work_class(request, INTERACTIVE), client_identity(request)
+    watcher = None
     try:
-        # Convert model to dict for processing
-        pref_dict = preferences.model_dump()
+        # Reject early if the OpenAI queue is already full
+        check_admission("openai")
         
-        # Process the request with the coordinator
-        response = coordinator.process_request(pref_dict)
-        
-        # Generate a unique ID for this travel plan
-        plan_id = str(uuid.uuid4())
+        # Convert model to dict for processing
+        pref_dict = preferences.model_dump(exclude={"session_token"})
+        progressive = progressive or plan_jobs is not None
         
-        # Add the ID to the response
-        response["id"] = plan_id
+        flight, leader = None, True
+        if plan_flights is not None:
+            key = f"{'progressive' if progressive else 'inline'}:{preferences_key(pref_dict)}"
+            flight, leader = plan_flights.begin(key, reusable=joinable_plan)
         
-        # Ensure all required fields exist with default values if needed
-        # This prevents Pydantic validation errors
-        required_fields = {
-            "destination": pref_dict.get("destination", "Unknown"),
-            "trip_length": pref_dict.get("trip_length", 3),
-            "budget": pref_dict.get("budget", "moderate"),
-            "interests": pref_dict.get("interests", []),
-            "itinerary": "No itinerary available.",
-            "attractions": "No attractions information available.",
-            "food": "No food recommendations available.",
-            "accommodation": "No accommodation information available.",
-            "insights": "No insights available. Please try again later.",
-            "images": "No images available."
-        }
+        # No await since `begin`, so a joiner always finds its leader's token here
+        cancel = None
+        if not progressive:
+            if flight is None:
+                cancel = CancelToken()
+            else:
+                cancel = inline_plans.register(key) if leader else inline_plans.get(key)
+        if cancel is not None:
+            def client_gone():
+                # A generation shared with joined requests is only cancelled once all of them are gone
+                if flight is None or plan_flights.leave(key, flight) == 0:
+                    cancel.cancel("client disconnected")
+            watcher = asyncio.create_task(watch_disconnect(request, client_gone))
         
-        # Only apply default values if the field is missing, None, or empty
-        for field, default_value in required_fields.items():
-            if field not in response:
-                response[field] = default_value
-            elif response[field] is None:
-                response[field] = default_value
-            elif isinstance(response[field], str) and not response[field].strip():
-                response[field] = default_value
-            # Don't apply the default if there's valid content (even partial)
-                
-        # Log what we're actually returning
-        logger.info(f"Response insights length: {len(response.get('insights', ''))}")
-        logger.info(f"Response images length: {len(response.get('images', ''))}")
-        if response.get('images'):
-            logger.info(f"First 100 chars of images: {response.get('images', '')[:100]}")
+        if leader:
+            try:
+                # Off the event loop, so identical requests can join while the plan is generated
+                plan_id = await run_in_threadpool(start_plan, preferences, pref_dict, background_tasks,
+                                                  progressive, cancel, work_class, client)
+            except BaseException as e:
+                if flight is not None:
+                    inline_plans.unregister(key)
+                    plan_flights.finish(key, flight, error=e)
+                raise
+            if flight is not None:
+                inline_plans.unregister(key)
+                plan_flights.finish(key, flight, plan_id)
+        else:
+            if preferences.session_token:
+                prefetcher.cancel(preferences.session_token)
+            # Shielded, so a joiner that goes away does not cancel the shared generation
+            plan_id = await asyncio.shield(asyncio.wrap_future(flight))
+            logger.info("Answered identical travel plan request with plan %s", plan_id)
         
-        # Store the travel plan for later retrieval
-        travel_plans[plan_id] = response
+        if progressive:
+            http_response.status_code = 202
+            return travel_plans[plan_id]
         
-        return response
+        # Serve the bytes encoded at storage time instead of validating the model again
+        return Response(content=encoded_plans[plan_id].body, media_type="application/json")
+    except RequestCancelled as e:
+        logger.info("Travel plan request cancelled: %s", e.reason)
+        # Nginx's "client closed request"; nobody is left to read it
+        return Response(status_code=499)
+    except RateLimitExceeded as e:
+        raise rate_limited_error(e)
     except Exception as e:
-        logger.error(f"Error creating travel plan: {str(e)}")
+        logger.error("Error creating travel plan: %s", e)
         raise HTTPException(status_code=500, detail=f"Error creating travel plan: {str(e)}")
+    finally:
+        if watcher is not None:
+            watcher.cancel()
+
+def parse_fields(fields: Optional[str]) -> Optional[set]:
+    """Parse a comma-separated ?fields= projection, rejecting unknown field names."""
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - PLAN_FIELDS
+    if unknown:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown fields: {', '.join(sorted(unknown))}. Must be among {', '.join(TravelPlanResponse.model_fields)}"
+        )
+    # The ID is always returned so projected responses stay addressable
+    return requested | {"id"}
+
+@router.post("/prefetch", status_code=202)
+async def prefetch_destination(prefetch: PrefetchRequest, request: Request):
+    """
+    Start the destination-only stages (attractions, food, accommodation, reviews,
+    images) before the rest of the preferences are known.
+    
+    Calling it again with the same token and another destination cancels the
+    stages that have not run yet and starts over. Submitting a plan with the same
+    `session_token` adopts the sections, finished or still running. The stages
+    are background work of the requesting client, shared fairly like its plans.
+    """
+    if plan_jobs is not None:
+        raise HTTPException(status_code=404, detail="Prefetching requires PLAN_EXECUTION=inline")
+    if not prefetch.destination.strip():
+        raise HTTPException(status_code=422, detail="Destination is required")
+    return prefetcher.start(prefetch.session_token, prefetch.destination, prefetch.get_images,
+                            client_identity(request))
+
+@router.delete("/prefetch/{session_token}", status_code=204)
+async def cancel_prefetch(session_token: str):
+    """Cancel a prefetch session that will not be submitted."""
+    if not prefetcher.cancel(session_token):
+        raise HTTPException(status_code=404, detail="Prefetch session not found")
+    return Response(status_code=204)
 
 @router.get("/travel-plan/{plan_id}", response_model=TravelPlanResponse)
-async def get_travel_plan(plan_id: str):
+async def get_travel_plan(plan_id: str, request: Request, fields: Optional[str] = None):
     """
     Retrieve a previously created travel plan by its ID.
+    
+    Use `?fields=itinerary,images` to return only some fields. Responses carry an
+    ETag and Last-Modified, honour If-None-Match / If-Modified-Since with 304, and
+    are compressed with brotli or gzip when the client accepts it.
     """
     # Check if the plan exists in our storage
     if plan_id not in travel_plans:
         raise HTTPException(status_code=404, detail=f"Travel plan with ID {plan_id} not found")
     
-    return travel_plans[plan_id]
+    include = parse_fields(fields)
+    # Finished plans were validated and serialized when stored; only progressive
+    # plans that are still filling in are encoded per request
+    encoded = encoded_plans.get(plan_id) or encode_plan(travel_plans[plan_id])
+    if include is None:
+        body, etag = encoded.body, encoded.etag
+    else:
+        body = json_bytes({name: value for name, value in encoded.payload.items() if name in include})
+        etag = make_etag(body)
+    
+    last_modified = encoded.updated_at
+    complete = encoded.complete
+    headers = {
+        "ETag": etag,
+        # Finished plans never change; progressive ones must be revalidated while they fill in
+        "Cache-Control": "public, max-age=86400, immutable" if complete else "no-cache",
+    }
+    headers["Last-Modified"] = http_date(last_modified)
+    
+    if is_not_modified(request.headers.get("if-none-match"), request.headers.get("if-modified-since"),
+                       etag, last_modified):
+        return Response(status_code=304, headers=headers)
+    
+    body, encoding_headers = encode_body(
+        body, etag, request.headers.get("accept-encoding"),
+        cache=plan_representations if complete else None
+    )
+    return Response(content=body, media_type="application/json", headers={**headers, **encoding_headers})
+
+@router.delete("/travel-plan/{plan_id}", response_model=TravelPlanResponse)
+async def cancel_travel_plan(plan_id: str):
+    """
+    Cancel a progressive or queued plan that is still being generated.
+    
+    Its remaining stages and upstream calls are dropped, in this process or in
+    the worker running the job (PLAN_EXECUTION=queue), and the plan is marked
+    complete with an error. Sections that already finished stay readable.
+    """
+    plan = travel_plans.get(plan_id)
+    if plan is None:
+        raise HTTPException(status_code=404, detail=f"Travel plan with ID {plan_id} not found")
+    if plan.get("complete"):
+        raise HTTPException(status_code=409, detail=f"Travel plan with ID {plan_id} is already complete")
+    
+    if plan_jobs is not None:
+        plan_jobs.cancel(plan_id)
+    else:
+        active_plans.cancel(plan_id, "cancelled by client")
+    
+    def cancelled(plan):
+        if plan.get("complete"):
+            # Finished while the cancellation was on its way
+            return plan
+        return {**plan, "complete": True, "error": PLAN_CANCELLED, "updated_at": time.time()}
+    
+    return travel_plans.modify(plan_id, cancelled)
+
+@router.post("/travel-plan/{plan_id}/regenerate", response_model=RegeneratedPlanResponse)
+async def regenerate_travel_plan(plan_id: str, changes: PlanChanges, background_tasks: BackgroundTasks,
+                                 request: Request, http_response: Response):
+    """
+    Regenerate a stored travel plan with changed preferences.
+
+    Only the stages whose inputs changed are run again; everything else is reused
+    from the stored plan. Changing only trip_length, budget or interests re-runs
+    just the trip planner. The result is stored under a new ID. With
+    PLAN_EXECUTION=queue the new plan is generated by a worker (202).
+    """
+    if plan_id not in travel_plans:
+        raise HTTPException(status_code=404, detail=f"Travel plan with ID {plan_id} not found")
+    if plan_id not in plan_sources:
+        raise HTTPException(status_code=409, detail=f"Travel plan with ID {plan_id} is still being generated")
+    work_class, client = requested_work_class(request, INTERACTIVE), client_identity(request)
+
+    try:
+        source = plan_sources[plan_id]
+        pref_dict = TravelPreferences(
+            **{**source["preferences"], **changes.model_dump(exclude_none=True)}
+        ).model_dump()
+
+        # Only pay for admission when at least one stage actually calls OpenAI
+        if invalidated_stages(source["preferences"], pref_dict) or source.get("failed"):
+            check_admission("openai")
+
+        if plan_jobs is not None:
+            _, rerun = plan_reuse(source["preferences"], source["stages"], pref_dict, source.get("failed", ()))
+            plan = submit_plan(pref_dict, background_tasks, source_plan_id=plan_id, work_class=work_class,
+                               client=client)
+            http_response.status_code = 202
+            return {
+                **plan,
+                "source_plan_id": plan_id,
+                "rerun_stages": sorted(rerun),
+                "reused_stages": sorted(set(STAGE_OUTPUTS) - rerun),
+            }
+
+        response, rerun = await run_in_threadpool(scheduled, work_class, client, coordinator.regenerate,
+                                                  source["preferences"], source["stages"], pref_dict,
+                                                  failed=source.get("failed", ()))
+        response = store_travel_plan(response, pref_dict)
+        logger.info("Regenerated plan %s as %s, re-ran stages: %s", plan_id, response['id'], sorted(rerun))
+
+        return {
+            **response,
+            "source_plan_id": plan_id,
+            "rerun_stages": sorted(rerun),
+            "reused_stages": sorted(set(STAGE_OUTPUTS) - rerun),
+        }
+    except RateLimitExceeded as e:
+        raise rate_limited_error(e)
+    except Exception as e:
+        logger.error("Error regenerating travel plan: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error regenerating travel plan: {str(e)}")
 
 @router.post("/query", response_model=AgentResponse)
-async def query_agent(query: AgentQuery):
+async def query_agent(query: AgentQuery, request: Request):
     """
     Query a specific agent type with a custom question.
     
@@ -140,17 +737,61 @@ async def query_agent(query: AgentQuery):
         error_msg = f"Invalid agent type. Must be one of {', '.join(VALID_AGENT_TYPES)}"
         logger.error(error_msg)
         raise HTTPException(status_code=400, detail=error_msg)
+    work_class, client = requested_work_class(request, QUERY), client_identity(request)
     
     try:
-        # Get response from the requested agent
-        response = coordinator.get_recommendations(query.agent_type, query.query)
+        check_admission("openai")
+        
+        # Get response from the requested agent, in a query slot off the event loop
+        response = await run_in_threadpool(scheduled, work_class, client, coordinator.get_recommendations,
+                                           query.agent_type, query.query)
         
         return {"response": response}
+    except RateLimitExceeded as e:
+        raise rate_limited_error(e)
     except ValueError as e:
         # Handle specific ValueError which could be from invalid agent types
-        logger.error(f"Value error querying agent: {str(e)}")
+        logger.error("Value error querying agent: %s", e)
         raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         # Handle other exceptions
-        logger.error(f"Error querying agent: {str(e)}")
-        raise HTTPException(status_code=500, detail=f"Error querying agent: {str(e)}") 
\ No newline at end of file
+        logger.error("Error querying agent: %s", e)
+        raise HTTPException(status_code=500, detail=f"Error querying agent: {str(e)}") 
+
+@router.get("/upstreams")
+async def get_upstream_metrics():
+    """
+    Report rate limiting, retry, hedging and circuit breaker metrics per upstream,
+    plus the current model routes and per-model health.
+    """
+    metrics = {
+        name: {
+            "rate_limit": limiters[name].snapshot(),
+            "resilience": upstream.snapshot()
+        }
+        for name, upstream in upstreams.items()
+    }
+    metrics["openai"]["routing"] = model_router.snapshot()
+    return metrics
+
+@router.get("/scheduler")
+async def get_scheduler_metrics():
+    """Report slots in use and, per work class, queue depth, admissions, rejections and wait times."""
+    return plan_scheduler.snapshot()
+
+@router.get("/memory")
+async def get_memory_metrics():
+    """
+    Report process RSS and the conversation state each agent retains.
+    
+    Conversations are released after every agent call, so idle agents should
+    report zero retained bytes.
+    """
+    return coordinator.agent_service.memory_snapshot()
+
+@router.get("/plan-jobs")
+async def get_plan_job_metrics():
+    """Report plan job counts and queueing delay (PLAN_EXECUTION=queue only)."""
+    if plan_jobs is None:
+        raise HTTPException(status_code=404, detail="Plans are generated inline (PLAN_EXECUTION=inline)")
+    return plan_jobs.snapshot()
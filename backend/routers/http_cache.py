@@ -0,0 +1,146 @@
+import gzip
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from email.utils import formatdate, parsedate_to_datetime
+from typing import Any, Dict, Optional, Tuple
+
+try:
+    import brotli
+except ImportError:  # Optional dependency; gzip is used when it is missing
+    brotli = None
+
+try:
+    import orjson
+except ImportError:  # Optional dependency; the standard library encoder is used when it is missing
+    orjson = None
+
+# Bodies smaller than this are not worth compressing
+MIN_COMPRESS_BYTES = 500
+
+# Encodings we can produce, in order of preference
+SUPPORTED_ENCODINGS = ("br", "gzip") if brotli is not None else ("gzip",)
+
+
+def json_bytes(content: Any) -> bytes:
+    """Encode JSON-compatible content the way FastAPI's JSONResponse does, using orjson when available."""
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode("utf-8")
+
+
+def make_etag(body: bytes) -> str:
+    """Weak validator for a response body, shared by all of its content codings."""
+    return 'W/"' + hashlib.sha1(body).hexdigest() + '"'
+
+
+def http_date(timestamp: float) -> str:
+    """Format a POSIX timestamp as an HTTP date (e.g. for Last-Modified)."""
+    return formatdate(timestamp, usegmt=True)
+
+
+def is_not_modified(if_none_match: Optional[str], if_modified_since: Optional[str],
+                    etag: str, last_modified: Optional[float]) -> bool:
+    """
+    Evaluate conditional GET headers against the current representation.
+
+    If-None-Match takes precedence over If-Modified-Since, as required by RFC 9110.
+    """
+    if if_none_match:
+        if if_none_match.strip() == "*":
+            return True
+        # Weak comparison: W/"x" matches "x"
+        candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+        return etag.removeprefix("W/") in candidates
+    if if_modified_since and last_modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since).timestamp()
+        except (TypeError, ValueError):
+            return False
+        # HTTP dates have one-second resolution
+        return int(last_modified) <= since
+    return False
+
+
+def choose_encoding(accept_encoding: Optional[str]) -> Optional[str]:
+    """Pick the best supported content coding from an Accept-Encoding header."""
+    if not accept_encoding:
+        return None
+    accepted = {}
+    for item in accept_encoding.split(","):
+        coding, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    for encoding in SUPPORTED_ENCODINGS:
+        quality = accepted.get(encoding, accepted.get("*", 0.0))
+        if quality > 0:
+            return encoding
+    return None
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a body with the given content coding."""
+    if encoding == "br":
+        return brotli.compress(body, quality=5)
+    return gzip.compress(body, compresslevel=6)
+
+
+class RepresentationCache:
+    """
+    Bounded LRU cache of compressed response bodies keyed by (etag, encoding).
+
+    Stored plans never change once complete, so each encoded representation
+    only has to be compressed once no matter how often it is viewed or shared.
+    """
+
+    def __init__(self, max_entries: int = 256):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get_or_compress(self, etag: str, body: bytes, encoding: str) -> bytes:
+        key = (etag, encoding)
+        with self._lock:
+            cached = self._entries.get(key)
+            if cached is not None:
+                self._entries.move_to_end(key)
+                return cached
+        compressed = compress(body, encoding)
+        with self._lock:
+            self._entries[key] = compressed
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return compressed
+
+
+def encode_body(body: bytes, etag: str, accept_encoding: Optional[str],
+                cache: Optional[RepresentationCache] = None) -> Tuple[bytes, Dict[str, str]]:
+    """
+    Compress a body for the client when it is large enough and an encoding is accepted.
+
+    Args:
+        body: The uncompressed response body
+        etag: Validator of the uncompressed body (used as the cache key)
+        accept_encoding: The request's Accept-Encoding header
+        cache: Optional cache of compressed representations
+
+    Returns:
+        Tuple of the (possibly compressed) body and headers to add to the response
+    """
+    headers = {"Vary": "Accept-Encoding"}
+    encoding = choose_encoding(accept_encoding) if len(body) >= MIN_COMPRESS_BYTES else None
+    if encoding is None:
+        return body, headers
+    if cache is not None:
+        body = cache.get_or_compress(etag, body, encoding)
+    else:
+        body = compress(body, encoding)
+    headers["Content-Encoding"] = encoding
+    return body, headers
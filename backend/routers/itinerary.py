@@ -3,6 +3,7 @@ from pydantic import BaseModel
 from typing import Dict, Any, List, Optional
 import logging
 import time
+from agents.support.state_store import shared_state
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -10,8 +11,8 @@ logger = logging.getLogger(__name__)
 # Create router
 router = APIRouter()
 
-# In-memory storage for tracking progress (in production, use a database)
-itinerary_status = {}
+# Progress tracking, shared by all worker processes when STATE_BACKEND=sqlite
+itinerary_status = shared_state("itinerary_status")
 
 class LogEntry(BaseModel):
     timestamp: str
@@ -148,4 +149,7 @@ async def get_itinerary_status(itinerary_id: str):
         status["status_message"] = "Your travel plan is ready!"
         status["completed"] = True
     
+    # Write the updated status back (values read from a shared store are copies)
+    itinerary_status[itinerary_id] = status
+    
     return status 
\ No newline at end of file
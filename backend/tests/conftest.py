@@ -0,0 +1,26 @@
+import sys
+import os
+import pytest
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.model_router import model_router
+from agents.support.resilience import CircuitBreaker, upstreams
+
+
+@pytest.fixture(autouse=True)
+def fresh_upstream_health(monkeypatch):
+    """
+    Give every test closed circuits and healthy models.
+
+    The upstream policies and the model router are module-level singletons, so
+    failures made on purpose in one test would otherwise open a circuit or
+    demote a model for the tests after it.
+    """
+    for upstream in upstreams.values():
+        breaker = upstream.breaker
+        monkeypatch.setattr(upstream, "breaker", CircuitBreaker(
+            breaker.name, failure_threshold=breaker.failure_threshold, reset_timeout=breaker.reset_timeout))
+        monkeypatch.setattr(upstream, "_breakers", {})
+    monkeypatch.setattr(model_router, "_health", {})
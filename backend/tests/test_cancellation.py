@@ -0,0 +1,158 @@
+import sys
+import os
+import time
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from agents.support.cancellation import CancelToken, RequestCancelled, cancel_scope, current_cancel, run_cancellable
+from agents.support.rate_limiter import TokenBucket, UpstreamLimiter
+from agents.support.resilience import ResilientUpstream
+from routers import agents as agents_router
+
+client = TestClient(app)
+
+PREFERENCES = {"destination": "Oslo", "trip_length": 2, "get_images": True}
+
+
+class CancellingAgentService:
+    """Stands in for AgentService; the client goes away while the food stage runs."""
+
+    def __init__(self, token=None):
+        self.token = token
+        self.calls = []
+
+    def get_agent_response(self, agent_type, query, priority=None, generation=None):
+        self.calls.append(agent_type)
+        if agent_type == "food" and self.token is not None:
+            self.token.cancel("client disconnected")
+        if agent_type == "images":
+            return "https://example.com/oslo.jpg"
+        return f"{agent_type} output for Oslo. " * 10
+
+
+class FakeRequest:
+    """Reports a disconnect on the given poll."""
+
+    def __init__(self, disconnect_after):
+        self.polls = 0
+        self.disconnect_after = disconnect_after
+
+    async def is_disconnected(self):
+        self.polls += 1
+        return self.polls > self.disconnect_after
+
+
+def cancel_later(token, seconds=0.1):
+    timer = threading.Timer(seconds, token.cancel)
+    timer.start()
+    return timer
+
+
+def test_cancelled_request_skips_remaining_stages(monkeypatch):
+    """Test that stages and the planner after a cancellation are never started."""
+    token = CancelToken()
+    service = CancellingAgentService(token)
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        agents_router.coordinator.process_request(PREFERENCES)
+
+    assert service.calls == ["attractions", "food"]
+
+def test_limiter_wait_stops_when_cancelled():
+    """Test that a request waiting for admission gives up its place once cancelled."""
+    limiter = UpstreamLimiter("test", {"requests": TokenBucket(1, 20.0)}, max_wait=30.0)
+    limiter.acquire({"requests": 1})
+    token = CancelToken()
+    cancel_later(token)
+
+    started = time.monotonic()
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        limiter.acquire({"requests": 1})
+    assert time.monotonic() - started < 5
+    assert limiter.queue_depth == 0
+
+def test_blocked_upstream_call_is_abandoned():
+    """Test that a cancelled request stops waiting for a call that cannot be interrupted."""
+    release = threading.Event()
+    token = CancelToken()
+    cancel_later(token)
+
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        run_cancellable(lambda: release.wait(10))
+    release.set()
+    assert run_cancellable(lambda: "done") == "done"
+
+    # Calls run on the shared pool, with the caller's token
+    with cancel_scope(CancelToken()) as scoped:
+        thread_name, seen = run_cancellable(lambda: (threading.current_thread().name, current_cancel.get()))
+    assert thread_name.startswith("cancellable-call") and seen is scoped
+
+def test_retry_backoff_stops_when_cancelled(monkeypatch):
+    """Test that a request waiting to retry an upstream call gives up as soon as it is cancelled."""
+    monkeypatch.setattr("agents.support.resilience.random.uniform", lambda low, high: high)
+    upstream = ResilientUpstream("test", max_retries=1, backoff_base=30.0, backoff_max=30.0)
+    token = CancelToken()
+    cancel_later(token)
+
+    def failing():
+        raise ConnectionError("connection reset")
+
+    started = time.monotonic()
+    with cancel_scope(token), pytest.raises(RequestCancelled):
+        upstream.call(failing)
+    assert time.monotonic() - started < 5
+    assert upstream.stats["retries"] == 1
+
+def test_disconnect_watcher_reports_gone_client():
+    """Test that the watcher calls back once the client disconnects."""
+    gone = []
+    request = FakeRequest(disconnect_after=2)
+    asyncio.run(agents_router.watch_disconnect(request, lambda: gone.append(True)))
+    assert gone == [True] and request.polls == 3
+
+def test_delete_cancels_progressive_plan(monkeypatch):
+    """Test that DELETE cancels a pending progressive plan before its stages run."""
+    service = CancellingAgentService()
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    plan = agents_router.start_progressive_plan(PREFERENCES)
+    token = agents_router.active_plans.register(plan["id"])
+
+    response = client.delete(f"/api/agents/travel-plan/{plan['id']}")
+    assert response.status_code == 200
+    assert response.json()["complete"] is True
+    assert response.json()["error"] == agents_router.PLAN_CANCELLED
+    assert token.cancelled
+
+    agents_router.run_progressive_plan(plan["id"], PREFERENCES)
+    assert service.calls == []
+    assert agents_router.travel_plans[plan["id"]]["error"] == agents_router.PLAN_CANCELLED
+    assert len(agents_router.active_plans) == 0
+
+    assert client.delete(f"/api/agents/travel-plan/{plan['id']}").status_code == 409
+    assert client.delete("/api/agents/travel-plan/missing").status_code == 404
+
+def test_plan_cancelled_while_finishing_stays_cancelled(monkeypatch):
+    """Test that a plan cancelled after its last stage started is not overwritten by the finished result."""
+    plan = agents_router.start_progressive_plan(PREFERENCES)
+
+    class LateDeleteAgentService(CancellingAgentService):
+        def get_agent_response(self, agent_type, query, priority=None, generation=None):
+            if agent_type == "planner":
+                # The cancellation arrives too late to stop the planner
+                assert client.delete(f"/api/agents/travel-plan/{plan['id']}").status_code == 200
+            return super().get_agent_response(agent_type, query, priority, generation)
+
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", LateDeleteAgentService())
+    agents_router.generate_plan(plan["id"], PREFERENCES)
+
+    stored = agents_router.travel_plans[plan["id"]]
+    assert stored["complete"] is True
+    assert stored["error"] == agents_router.PLAN_CANCELLED
+    assert plan["id"] not in agents_router.encoded_plans
@@ -0,0 +1,50 @@
+import sys
+import os
+import pytest
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.core import specialized_agents
+from agents.support.cassettes import Cassette, CassetteMiss
+
+
+def test_record_then_replay(tmp_path):
+    """Test that replay answers recorded requests without calling the upstream."""
+    calls = []
+
+    def perform():
+        calls.append(1)
+        return ["Day 1: Louvre", "stop"]
+
+    recorder = Cassette(str(tmp_path), "record")
+    assert recorder.call("openai", {"model": "gpt-4", "messages": [{"role": "user", "content": "Paris"}]}, perform) == \
+        ["Day 1: Louvre", "stop"]
+
+    slept = []
+    player = Cassette(str(tmp_path), "replay", latency_scale=2.0, sleep=slept.append)
+    # Key order does not matter
+    request = {"messages": [{"content": "Paris", "role": "user"}], "model": "gpt-4"}
+    assert player.call("openai", request, perform) == ["Day 1: Louvre", "stop"]
+    assert len(calls) == 1
+    assert len(slept) == 1 and slept[0] >= 0
+
+    with pytest.raises(CassetteMiss):
+        player.call("openai", {"model": "gpt-4", "messages": []}, perform)
+
+def test_google_search_replays_offline(tmp_path, monkeypatch):
+    """Test that a recorded Custom Search response is served when the network is unavailable."""
+    result = {"items": [{"title": "Rome guide", "link": "https://example.com/rome", "snippet": "Ciao"}]}
+    monkeypatch.setattr(specialized_agents, "google_api_key", "test-google-key-0123456789")
+    monkeypatch.setattr(specialized_agents, "search_engine_id", "test-engine")
+    monkeypatch.setattr(specialized_agents.google_upstream, "call", lambda attempt: result)
+    monkeypatch.setattr(specialized_agents, "cassette", Cassette(str(tmp_path), "record"))
+    recorded = specialized_agents.google_search("Rome travel tips", num_results=3)
+
+    def offline(attempt):
+        raise ConnectionError("network is unreachable")
+
+    monkeypatch.setattr(specialized_agents.google_upstream, "call", offline)
+    monkeypatch.setattr(specialized_agents, "cassette", Cassette(str(tmp_path), "replay"))
+    assert specialized_agents.google_search("Rome travel tips", num_results=3) == recorded
+    assert recorded[0]["title"] == "Rome guide"
@@ -0,0 +1,77 @@
+import sys
+import os
+import autogen
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.core import specialized_agents
+from agents.core.specialized_agents import AgentService
+from agents.support.conversations import CHAT_HISTORY_MAX_MESSAGES, cap_history, retained_memory
+
+
+def test_cap_history_keeps_the_task_message():
+    """Test that capping drops the oldest turns but keeps the first message."""
+    messages = [{"role": "user", "content": f"message {i}"} for i in range(6)]
+    assert cap_history(messages, 4) == 2
+    assert [m["content"] for m in messages] == ["message 0", "message 3", "message 4", "message 5"]
+    assert cap_history(messages, 4) == 0
+
+def test_cap_history_keeps_function_calls_with_their_results():
+    """Test that a function call cut off by the cap takes its result with it."""
+    messages = [
+        {"role": "user", "content": "task"},
+        {"role": "assistant", "content": None, "function_call": {"name": "search", "arguments": "{}"}},
+        {"role": "function", "name": "search", "content": "results"},
+        {"role": "assistant", "content": "summary"},
+        {"role": "user", "content": "follow-up"},
+    ]
+    # Dropping one message would leave the search results without their call
+    assert cap_history(messages, 4) == 2
+    assert [m["content"] for m in messages] == ["task", "summary", "follow-up"]
+
+def test_agent_calls_release_their_conversation():
+    """Test that agents hold no conversation state once a call has returned."""
+    service = AgentService()
+    agent = service.agents["food"]
+    other = autogen.UserProxyAgent(name="OtherRequest", human_input_mode="NEVER", code_execution_config=False)
+    # A conversation from a concurrent request must survive
+    agent._oai_messages[other].append({"role": "user", "content": "still running"})
+
+    def fake_reply(recipient, messages=None, sender=None, config=None):
+        return True, "Try the night market. " * 50
+
+    agent.register_reply([autogen.Agent, None], fake_reply, position=0)
+
+    for _ in range(3):
+        response = service.get_agent_response("food", "Where should I eat in Taipei?")
+        assert response.startswith("Try the night market.")
+
+    memory = service.memory_snapshot()
+    assert memory["agents"]["food"] == {"conversations": 1, "messages": 1, "retained_bytes": len("still running")}
+    assert memory["agents"]["planner"]["retained_bytes"] == 0
+    # One proxy served all three calls
+    assert memory["proxy_pool"] == {"idle": 1, "created": 1}
+    assert retained_memory(service.proxies.acquire(10))["conversations"] == 0
+
+def test_llm_replies_cap_the_conversation_they_are_given(monkeypatch):
+    """Test that a reply generated through autogen trims the stored conversation before calling the model."""
+    sent = []
+
+    class RecordingCassette:
+        def call(self, upstream, request, fn):
+            sent.append(request["messages"])
+            return "Noted.", "stop"
+
+    monkeypatch.setattr(specialized_agents, "cassette", RecordingCassette())
+    agent = AgentService().agents["food"]
+    sender = autogen.UserProxyAgent(name="LongChat", human_input_mode="NEVER", code_execution_config=False)
+    agent._oai_messages[sender].extend(
+        {"role": "user", "content": f"message {i}"} for i in range(CHAT_HISTORY_MAX_MESSAGES + 10))
+
+    assert agent.generate_reply(sender=sender) == "Noted."
+    history = agent._oai_messages[sender]
+    assert len(history) == CHAT_HISTORY_MAX_MESSAGES
+    assert history[0]["content"] == "message 0"
+    # The system message plus the capped history
+    assert len(sent[0]) == CHAT_HISTORY_MAX_MESSAGES + 1
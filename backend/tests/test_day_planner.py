@@ -0,0 +1,125 @@
+import sys
+import os
+import threading
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.core.day_planner import FREE_DAY, merge_itinerary, parse_outline, use_map_reduce
+from routers import agents as agents_router
+
+PREFERENCES = {
+    "destination": "Lisbon",
+    "trip_length": 4,
+    "budget": "moderate",
+    "interests": ["food"],
+    "get_insights": True,
+    "get_images": True,
+}
+
+OUTLINE = """Here is the plan:
+Day 1: Alfama | São Jorge Castle; Lisbon Cathedral
+**Day 2:** Belém | Jerónimos Monastery; Belém Tower
+- Day 4 - Sintra | Pena Palace
+"""
+
+
+class DayPlanningAgentService:
+    """Stands in for AgentService; day calls wait for each other to prove they run concurrently."""
+
+    def __init__(self, days):
+        self.calls = []
+        self.barrier = threading.Barrier(days, timeout=5)
+
+    def get_agent_response(self, agent_type, query, priority=None, generation=None):
+        self.calls.append((agent_type, generation.max_tokens if generation else None))
+        if agent_type == "planner" and "Reply with EXACTLY" in query:
+            return OUTLINE
+        if agent_type == "planner" and "Write ONLY Day" in query:
+            day = query.split("Write ONLY Day ")[1].split(" ")[0]
+            self.barrier.wait()
+            return f"## Day {day}: planned\nMorning walk."
+        if agent_type == "images":
+            return "https://example.com/lisbon.jpg"
+        if agent_type == "reviews":
+            return "Reviews of Lisbon. " * 5 + "\n## Useful Resource Links\n- https://example.com/guide"
+        return f"{agent_type} output for Lisbon. " * 10
+
+    def get_planner_part(self, query, priority=None, generation=None):
+        return self.get_agent_response("planner", query, priority, generation)
+
+
+class FailingDaysAgentService(DayPlanningAgentService):
+    """Every day call fails, as with an open circuit; the single planner call works."""
+
+    def get_planner_part(self, query, priority=None, generation=None):
+        self.calls.append(("planner_part", None))
+        if "Reply with EXACTLY" in query:
+            return OUTLINE
+        raise ConnectionError("planner unavailable")
+
+    def get_agent_response(self, agent_type, query, priority=None, generation=None):
+        if agent_type == "planner":
+            self.calls.append((agent_type, None))
+            return "## Day 1: single call itinerary\nMorning walk. " * 10
+        return super().get_agent_response(agent_type, query, priority, generation)
+
+
+def test_parse_outline_fills_missing_days():
+    """Test that outline lines are parsed leniently and skipped days become free days."""
+    outline = parse_outline(OUTLINE, 4)
+    assert [entry.day for entry in outline] == [1, 2, 3, 4]
+    assert outline[0].theme == "Alfama"
+    assert outline[0].places == ["São Jorge Castle", "Lisbon Cathedral"]
+    assert outline[1].places == ["Jerónimos Monastery", "Belém Tower"]
+    assert outline[2].theme == FREE_DAY
+    assert outline[3].places == ["Pena Palace"]
+
+def test_merge_keeps_day_order_and_verbatim_sections():
+    """Test that the merge adds missing headings and copies insights and images unchanged."""
+    outline = parse_outline(OUTLINE, 3)
+    insights = "Great city.\n## Useful Resource Links\n- https://example.com/guide"
+    merged = merge_itinerary("Lisbon", 3, outline, ["Castle in the morning.", None, "## Day 3: Sintra"],
+                             insights, "https://example.com/a.jpg")
+
+    assert merged.index("## Day 1: Alfama") < merged.index("## Day 2: Belém") < merged.index("## Day 3: Sintra")
+    assert "Details for this day could not be generated" in merged
+    assert f"## TRAVELER INSIGHTS\n{insights}" in merged
+    assert "## USEFUL RESOURCE LINKS\n- https://example.com/guide" in merged
+    assert "https://example.com/a.jpg" in merged
+
+def test_map_reduce_mode_selection():
+    """Test that auto mode only plans long trips day by day."""
+    assert use_map_reduce(6, mode="auto", min_days=5)
+    assert not use_map_reduce(3, mode="auto", min_days=5)
+    assert not use_map_reduce(10, mode="single")
+    assert use_map_reduce(2, mode="map_reduce")
+
+def test_long_trip_days_are_written_concurrently(monkeypatch):
+    """Test that a long trip is outlined once and its days are written in parallel planner calls."""
+    service = DayPlanningAgentService(days=4)
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    monkeypatch.setattr("agents.core.coordinator.use_map_reduce", lambda trip_length: True)
+
+    plan = agents_router.coordinator.process_request(PREFERENCES)
+
+    planner_calls = [max_tokens for agent_type, max_tokens in service.calls if agent_type == "planner"]
+    assert len(planner_calls) == 5
+    itinerary = plan["itinerary"]
+    assert [itinerary.index(f"## Day {day}:") for day in range(1, 5)] == sorted(
+        itinerary.index(f"## Day {day}:") for day in range(1, 5))
+    assert "TRAVELER INSIGHTS" in itinerary
+    assert itinerary.count("## USEFUL RESOURCE LINKS") == 1
+
+def test_failed_days_fall_back_to_a_single_planner_call(monkeypatch):
+    """Test that day calls that all fail are not merged and the single planner call is used instead."""
+    service = FailingDaysAgentService(days=4)
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    monkeypatch.setattr("agents.core.coordinator.use_map_reduce", lambda trip_length: True)
+
+    plan = agents_router.coordinator.process_request({**PREFERENCES, "destination": "Porto"})
+
+    assert [call for call, _ in service.calls].count("planner_part") == 5
+    assert [call for call, _ in service.calls].count("planner") == 1
+    assert "single call itinerary" in plan["itinerary"]
+    assert "could not be generated" not in plan["itinerary"]
@@ -0,0 +1,194 @@
+import sys
+import os
+import time
+import autogen
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from agents.core.degradation import RecentResults, StageTimings
+from agents.core.specialized_agents import AgentService
+from agents.support.cancellation import CancelToken, RequestCancelled, cancel_scope, check_cancelled
+from agents.support.deadline import Deadline, DeadlineExceeded, current_deadline, deadline_scope, enforce_deadline
+from agents.support.rate_limiter import PRIORITY_HIGH, PRIORITY_LOW, TokenBucket, UpstreamLimiter
+from agents.support.scheduler import BATCH, INTERACTIVE, FairScheduler, WorkClass
+from routers import agents as agents_router
+
+client = TestClient(app)
+
+PREFERENCES = {"destination": "Lisbon", "trip_length": 2, "get_images": True}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+class RecordingAgentService:
+    """Stands in for AgentService and records the calls and planner settings it gets."""
+
+    def __init__(self, clock=None, slow_stage=None):
+        self.calls = []
+        self.planner_generation = []
+        self.clock = clock
+        self.slow_stage = slow_stage
+
+    def get_agent_response(self, agent_type, query, priority=None, generation=None):
+        self.calls.append(agent_type)
+        if agent_type == self.slow_stage:
+            # Takes far longer than expected; upstream calls notice a passed deadline like a cancellation
+            self.clock.now += 200
+            check_cancelled()
+        if agent_type == "planner":
+            self.planner_generation.append(generation)
+            return "Day 1: Alfama and the castle. " * 10
+        if agent_type == "images":
+            return "https://example.com/lisbon.jpg"
+        return f"{agent_type} output for Lisbon. " * 10
+
+
+@pytest.fixture
+def service(monkeypatch):
+    """A recording service, with fresh timings and stale results on the shared coordinator."""
+    service = RecordingAgentService()
+    coordinator = agents_router.coordinator
+    monkeypatch.setattr(coordinator, "agent_service", service)
+    monkeypatch.setattr(coordinator, "stage_timings", StageTimings())
+    monkeypatch.setattr(coordinator, "recent_results", RecentResults())
+    return service
+
+
+def test_short_deadline_skips_optional_stages_and_shortens_planner(service):
+    """Test that reviews and images are skipped and the planner budget cut when the deadline is close."""
+    with deadline_scope(Deadline(10.0)):
+        result = agents_router.coordinator.process_request(PREFERENCES)
+
+    # Required stages still run; there is nothing to stand in for them
+    assert service.calls == ["attractions", "food", "accommodation", "planner"]
+    assert "https://" in result["images"] and result["insights"]
+    assert 0 < service.planner_generation[0].max_tokens < 4000
+    assert [(entry["stage"], entry["action"]) for entry in result["degraded"]] == [
+        ("insights", "skipped"), ("images", "skipped"), ("itinerary", "shortened"),
+    ]
+
+def test_stale_results_stand_in_for_slow_stages(service):
+    """Test that stages that no longer fit reuse the last good output for the destination."""
+    fresh = agents_router.coordinator.process_request(PREFERENCES)
+    assert fresh["degraded"] == []
+    assert service.planner_generation == [None]
+    service.calls.clear()
+
+    with deadline_scope(Deadline(10.0)):
+        result = agents_router.coordinator.process_request({**PREFERENCES, "destination": " lisbon "})
+
+    assert service.calls == ["planner"]
+    assert result["attractions"] == fresh["attractions"]
+    assert result["images"] == fresh["images"]
+    actions = {entry["stage"]: entry["action"] for entry in result["degraded"]}
+    assert actions == {"attractions": "stale", "food": "stale", "accommodation": "stale",
+                       "insights": "stale", "images": "stale", "itinerary": "shortened"}
+
+def test_stage_timings_replace_defaults_once_measured():
+    """Test that measured stage durations replace the default estimates."""
+    timings = StageTimings(defaults={"food": 15.0}, min_samples=3)
+    for seconds in (0.5, 0.6, 0.7):
+        timings.record("food", seconds)
+    assert timings.estimate("food") < 1.0
+    assert timings.estimate("planner") == 10.0
+
+    results = RecentResults(max_entries=1, max_age=60, clock=lambda: now)
+    now = 0.0
+    results.put("a", "old")
+    results.put("b", "new")
+    assert results.get("a") is None and results.get("b") == ("new", 0.0)
+    now = 61.0
+    assert results.get("b") is None
+
+def test_failed_stages_are_not_timed_or_kept_as_last_good_results(monkeypatch):
+    """Test that a stage whose agent call fails is neither cached for stand-ins nor counted in timings."""
+    agent_service = AgentService()
+
+    def failing_reply(recipient, messages=None, sender=None, config=None):
+        raise ConnectionError("down")
+
+    agent_service.agents["attractions"].register_reply([autogen.Agent, None], failing_reply, position=0)
+    coordinator = agents_router.coordinator
+    monkeypatch.setattr(coordinator, "agent_service", agent_service)
+    monkeypatch.setattr(coordinator, "stage_timings", StageTimings(defaults={}, min_samples=1))
+    monkeypatch.setattr(coordinator, "recent_results", RecentResults())
+
+    content, ok = coordinator.run_stage("attractions", {"destination": "Paris"})
+    assert (content, ok) == ("No attractions information available for Paris.", False)
+    assert len(coordinator.recent_results) == 0
+    assert coordinator.stage_timings.snapshot() == {}
+
+def test_deadline_passed_before_planner_returns_finished_sections(service):
+    """Test that a plan past its deadline stops its running stage and skips the rest instead of failing."""
+    clock = FakeClock()
+    service.clock, service.slow_stage = clock, "food"
+    with deadline_scope(Deadline(100.0, clock=clock)):
+        result = agents_router.coordinator.process_request(PREFERENCES)
+
+    assert service.calls == ["attractions", "food"]
+    assert result["attractions"] == "attractions output for Lisbon. " * 10
+    assert result["accommodation"] == "No accommodation information available for Lisbon."
+    assert "could not be written in time" in result["itinerary"]
+    # The food call itself was stopped at the deadline
+    assert result["food"] == "No food information available for Lisbon."
+    assert [(entry["stage"], entry["action"]) for entry in result["degraded"]] == [
+        ("food", "skipped"), ("accommodation", "skipped"), ("insights", "skipped"), ("images", "skipped"),
+        ("itinerary", "skipped"),
+    ]
+
+def test_planner_is_stopped_at_the_deadline(service):
+    """Test that a planner call still running at the deadline is abandoned and the plan returned."""
+    clock = FakeClock()
+    service.clock, service.slow_stage = clock, "planner"
+    with deadline_scope(Deadline(200.0, clock=clock)):
+        result = agents_router.coordinator.process_request(PREFERENCES)
+
+    assert service.calls == ["attractions", "food", "accommodation", "reviews", "images", "planner"]
+    assert result["images"] == "https://example.com/lisbon.jpg"
+    assert result["degraded"] == [{"stage": "itinerary", "action": "skipped",
+                                   "detail": "deadline passed before the planner finished"}]
+
+def test_admission_wait_stops_at_deadline():
+    """Test that a call waiting for admission gives up at the deadline, and cancellation still wins."""
+    limiter = UpstreamLimiter("test", {"requests": TokenBucket(1, 20.0)}, max_wait=30.0)
+    limiter.acquire({"requests": 1})
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded), enforce_deadline(Deadline(0.1)):
+        limiter.acquire({"requests": 1})
+    assert time.monotonic() - started < 5
+    assert limiter.queue_depth == 0
+
+    token = CancelToken()
+    token.cancel("client disconnected")
+    with cancel_scope(token), pytest.raises(RequestCancelled), enforce_deadline(Deadline(30.0)):
+        pass
+
+def test_scheduler_attaches_class_deadline():
+    """Test that interactive work runs against its class deadline and batch work has none."""
+    scheduler = FairScheduler([
+        WorkClass(INTERACTIVE, 0, concurrency=1, max_queue=5, max_wait=5.0, priority=PRIORITY_HIGH, deadline=30.0),
+        WorkClass(BATCH, 3, concurrency=1, max_queue=5, max_wait=5.0, priority=PRIORITY_LOW),
+    ], max_concurrent=1)
+
+    with scheduler.slot(INTERACTIVE):
+        assert 0 < current_deadline.get().remaining() <= 30.0
+    with scheduler.slot(BATCH):
+        assert current_deadline.get() is None
+    assert current_deadline.get() is None
+
+def test_plan_response_lists_degradations(service):
+    """Test that the plan endpoint reports an empty degradation list for a complete plan."""
+    response = client.post("/api/agents/travel-plan", json=PREFERENCES)
+    assert response.status_code == 200
+    assert response.json()["degraded"] == []
@@ -0,0 +1,93 @@
+import sys
+import os
+import pytest
+from types import SimpleNamespace
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.generation import GenerationSettings, settings_for, generation_scope
+from agents.support.model_router import model_router
+from agents.support.resilience import openai_upstream
+from agents.core import specialized_agents
+
+
+class FakeClient:
+    """Stands in for OpenAIWrapper and records the kwargs of each create() call."""
+
+    def __init__(self, content="Here are some recommendations."):
+        self.content = content
+        self.calls = []
+
+    def create(self, **kwargs):
+        self.calls.append(kwargs)
+        message = SimpleNamespace(content=self.content, function_call=None, tool_calls=None)
+        return SimpleNamespace(choices=[SimpleNamespace(message=message, finish_reason="stop")])
+
+    def extract_text_or_completion_object(self, response):
+        return [choice.message.content for choice in response.choices]
+
+
+def test_settings_are_immutable():
+    """Test that overrides produce a new object and leave the original untouched."""
+    base = GenerationSettings(max_tokens=1000, temperature=0.7)
+    shorter = base.with_overrides(max_tokens=500, temperature=None)
+    assert base.max_tokens == 1000
+    assert shorter.max_tokens == 500
+    assert shorter.temperature == 0.7
+    with pytest.raises(Exception):
+        base.max_tokens = 10
+
+def test_generation_scope_overrides_stage_defaults():
+    """Test that a per-call override wins only inside its scope."""
+    assert settings_for("planner").max_tokens == 4000
+    with generation_scope(GenerationSettings(max_tokens=1500)):
+        assert settings_for("planner").max_tokens == 1500
+    assert settings_for("planner").max_tokens == 4000
+
+def test_per_call_settings_do_not_touch_shared_config(monkeypatch):
+    """Test that the planner budget is sent per call without mutating any llm_config."""
+    client = FakeClient()
+    monkeypatch.setattr(specialized_agents, "routed_client", lambda agent, model: client)
+    planner = specialized_agents.AgentFactory.create_trip_planner_agent()
+    food = specialized_agents.AgentFactory.create_food_agent()
+    specialized_agents.register_llm_hooks(planner, "planner")
+    specialized_agents.register_llm_hooks(food, "food")
+    messages = [{"role": "user", "content": "Plan a trip"}]
+
+    specialized_agents.guarded_oai_reply(planner, messages=list(messages), config={"agent_type": "planner"})
+    specialized_agents.guarded_oai_reply(food, messages=list(messages), config={"agent_type": "food"})
+
+    assert client.calls[0]["max_tokens"] == 4000
+    assert client.calls[1]["max_tokens"] == 1200
+    for agent in (planner, food):
+        assert all("max_tokens" not in config for config in agent.llm_config["config_list"])
+
+def test_chat_ends_on_finish_reason_with_stop_sequence(monkeypatch):
+    """Test that a completed answer ends the chat after one call, using a stop sequence instead of stripping."""
+    client = FakeClient(content="## Must-try dishes\n- Pastel de nata")
+    monkeypatch.setattr(specialized_agents, "routed_client", lambda agent, model: client)
+    service = specialized_agents.AgentService()
+
+    response = service.get_agent_response("food", "Food in Lisbon?")
+
+    assert response == "## Must-try dishes\n- Pastel de nata"
+    assert len(client.calls) == 1
+    assert "TASK_COMPLETE" in client.calls[0]["stop"]
+
+def test_open_circuit_routes_to_the_next_model(monkeypatch):
+    """Test that a model whose circuit is open is skipped instead of failing the call."""
+    primary, fallback = model_router.route("planner")[:2]
+    clients = {primary: FakeClient(), fallback: FakeClient()}
+    monkeypatch.setattr(specialized_agents, "routed_client", lambda agent, model: clients[model])
+    planner = specialized_agents.AgentFactory.create_trip_planner_agent()
+    breaker = openai_upstream.breaker_for(primary)
+    for _ in range(breaker.failure_threshold):
+        breaker.record_failure()
+
+    reply = specialized_agents.guarded_oai_reply(planner, messages=[{"role": "user", "content": "Plan a trip"}],
+                                                 config={"agent_type": "planner"})
+
+    assert reply == (True, "Here are some recommendations.")
+    assert (len(clients[primary].calls), len(clients[fallback].calls)) == (0, 1)
+    assert openai_upstream.breaker.state == "closed"
@@ -0,0 +1,92 @@
+import sys
+import os
+import numpy as np
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.geo import GridIndex, balanced_kmeans, default_gazetteer, format_day_groups, group_by_day
+from routers import agents as agents_router
+
+LISBON_ATTRACTIONS = """Top sights: the Belém Tower and Jeronimos Monastery by the river, Sao Jorge Castle above
+Alfama, the Lisbon Cathedral, Praça do Comércio, Bairro Alto at night and the Lisbon Oceanarium."""
+
+LISBON_FOOD = "Try the Pasteis de Belem, Time Out Market and seafood at Cervejaria Ramiro."
+
+
+class GeoAgentService:
+    """Stands in for AgentService and records planner prompts."""
+
+    def __init__(self):
+        self.prompts = []
+
+    def get_agent_response(self, agent_type, query, priority=None, generation=None):
+        if agent_type == "planner":
+            self.prompts.append(query)
+            return "## Day: planned\nMorning walk. " * 10
+        if agent_type == "attractions":
+            return LISBON_ATTRACTIONS
+        if agent_type == "food":
+            return LISBON_FOOD
+        if agent_type == "images":
+            return "https://example.com/lisbon.jpg"
+        return f"{agent_type} output for Lisbon. " * 10
+
+    def get_planner_part(self, query, priority=None, generation=None):
+        return self.get_agent_response("planner", query, priority, generation)
+
+
+def test_gazetteer_matches_names_aliases_and_destination():
+    """Test that places are found by accent-insensitive names and aliases of the right destination."""
+    found = [place.name for place in default_gazetteer.find("Lisbon, Portugal", LISBON_ATTRACTIONS)]
+    assert found[:3] == ["Belém Tower", "Jerónimos Monastery", "São Jorge Castle"]
+    assert "Oceanário de Lisboa" in found
+    assert [place.name for place in default_gazetteer.find("Rome", "The Pantheon")] == ["Pantheon"]
+    assert default_gazetteer.find("Paris", "The Pantheon")[0].lat != default_gazetteer.find("Rome", "Pantheon")[0].lat
+    assert default_gazetteer.find("Atlantis", "Belém Tower") == []
+
+def test_balanced_kmeans_separates_and_balances_groups():
+    """Test that clustering splits distant neighbourhoods and keeps group sizes even."""
+    points = np.array([[0, 0], [0.5, 0], [0, 0.5], [10, 10], [10.5, 10], [10, 10.5]], dtype=float)
+    labels = balanced_kmeans(points, 2)
+    assert len(set(labels[:3])) == 1 and len(set(labels[3:])) == 1
+    assert labels[0] != labels[3]
+
+    crowded = np.array([[0, 0], [0.1, 0], [0.2, 0], [0.3, 0], [5, 5], [5.1, 5]], dtype=float)
+    assert sorted(np.bincount(balanced_kmeans(crowded, 3))) == [2, 2, 2]
+
+def test_grid_index_radius_query_matches_brute_force():
+    """Test that the grid index returns exactly the points within the radius, nearest first."""
+    points = np.random.default_rng(1).uniform(0, 10, size=(200, 2))
+    index = GridIndex(points, cell_km=0.7)
+    centre = np.array([4.0, 6.0])
+    expected = sorted(i for i in range(len(points)) if np.linalg.norm(points[i] - centre) <= 1.5)
+
+    found = index.within(centre, 1.5)
+    assert sorted(i for i, _ in found) == expected
+    assert [distance for _, distance in found] == sorted(distance for _, distance in found)
+
+def test_group_by_day_builds_routes_with_travel_times():
+    """Test that located attractions are split into one route per day with nearby food."""
+    days = group_by_day("Lisbon", 3, LISBON_ATTRACTIONS, LISBON_FOOD)
+    assert [day.day for day in days] == [1, 2, 3]
+    names = [place.name for day in days for place in day.places]
+    assert len(names) == len(set(names)) == 8
+    assert all(len(day.legs) == len(day.places) - 1 for day in days)
+    belem_day = next(day for day in days if any(place.name == "Belém Tower" for place in day.places))
+    assert any(place.name == "Jerónimos Monastery" for place in belem_day.places)
+    assert any(place.name == "Pastéis de Belém" for place, _ in belem_day.restaurants)
+    assert "min" in format_day_groups(days)
+    assert group_by_day("Atlantis", 3, LISBON_ATTRACTIONS) is None
+
+def test_planner_receives_pre_grouped_days(monkeypatch):
+    """Test that day-by-day planning uses the geographic groups instead of an outline call."""
+    service = GeoAgentService()
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    monkeypatch.setattr("agents.core.coordinator.use_map_reduce", lambda trip_length: True)
+
+    agents_router.coordinator.process_request({"destination": "Lisbon", "trip_length": 3, "get_images": True})
+
+    assert len(service.prompts) == 3
+    assert not any("Reply with EXACTLY" in prompt for prompt in service.prompts)
+    assert all("computed from a map" in prompt for prompt in service.prompts)
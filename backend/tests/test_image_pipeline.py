@@ -0,0 +1,77 @@
+import sys
+import os
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.image_pipeline import ImagePipeline, ProbeCache, similarity_key
+
+
+def make_item(url, width=1200, height=800):
+    return {"link": url, "width": width, "height": height}
+
+
+class FakeSearch:
+    """Serves fixed result pages and records the requested start offsets."""
+
+    def __init__(self, pages):
+        self.pages = pages
+        self.starts = []
+
+    def __call__(self, query, num_results=10, start=1):
+        self.starts.append(start)
+        index = (start - 1) // 10
+        return self.pages[index] if index < len(self.pages) else []
+
+
+def make_pipeline(search, dead=(), **kwargs):
+    cache = ProbeCache()
+    pipeline = ImagePipeline(search, cache=cache, **kwargs)
+    # Probe outcomes come from the cache, so no network access is needed
+    for page in search.pages:
+        for item in page:
+            cache.set(item["link"], item["link"] not in dead)
+    return pipeline
+
+
+def test_similarity_key_ignores_size_suffixes():
+    """Test that size variants of one image share a similarity key."""
+    assert similarity_key("https://a.com/img/view-800x600.jpg") == similarity_key("https://a.com/img/view.jpg")
+    assert similarity_key("https://a.com/view_1024x768.png") == similarity_key("https://a.com/view-2.png")
+    assert similarity_key("https://a.com/view.jpg") != similarity_key("https://b.com/view.jpg")
+
+def test_dead_and_duplicate_images_are_dropped():
+    """Test that probing removes dead URLs and duplicates keep only the first variant."""
+    page = [
+        make_item("https://a.com/tower-800x600.jpg"),
+        make_item("https://a.com/tower.jpg"),
+        make_item("https://b.com/dead.jpg"),
+        make_item("https://c.com/bridge.jpg"),
+    ]
+    search = FakeSearch([page])
+    pipeline = make_pipeline(search, dead={"https://b.com/dead.jpg"})
+    assert pipeline.find_images("Paris", count=5) == [
+        "https://a.com/tower-800x600.jpg",
+        "https://c.com/bridge.jpg",
+    ]
+
+def test_images_are_ranked_by_size_and_small_ones_skipped():
+    """Test that larger images come first and undersized ones are filtered out."""
+    page = [
+        make_item("https://a.com/small.jpg", width=200, height=150),
+        make_item("https://a.com/medium.jpg", width=800, height=600),
+        make_item("https://a.com/large.jpg", width=2000, height=1500),
+    ]
+    pipeline = make_pipeline(FakeSearch([page]))
+    assert pipeline.find_images("Rome", count=5) == ["https://a.com/large.jpg", "https://a.com/medium.jpg"]
+
+def test_pages_until_enough_images():
+    """Test that a second page is requested only when the first is not enough."""
+    first = [make_item(f"https://a.com/photo{i}.jpg") for i in range(10)]
+    second = [make_item(f"https://b.com/photo{i}.jpg") for i in range(10)]
+    dead = {item["link"] for item in first[:8]}
+    search = FakeSearch([first, second])
+    pipeline = make_pipeline(search, dead=dead)
+    images = pipeline.find_images("Tokyo", count=5)
+    assert len(images) == 5
+    assert search.starts == [1, 11]
@@ -0,0 +1,289 @@
+import sys
+import os
+import time
+import threading
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.checkpoints import StageCheckpoints, input_hash
+from agents.support.job_queue import JobQueue
+from agents.support.state_store import LocalMapping, SQLiteDatabase
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class FlakyPlannerService:
+    """Stands in for AgentService; the planner fails on its first call."""
+
+    def __init__(self):
+        self.calls = []
+        self.planner_failed = False
+
+    def get_agent_response(self, agent_type, query, priority=None, generation=None):
+        self.calls.append(agent_type)
+        if agent_type == "planner" and not self.planner_failed:
+            self.planner_failed = True
+            raise ConnectionError("planner connection reset")
+        if agent_type == "images":
+            return "https://example.com/rome.jpg"
+        return f"{agent_type} output for Rome. " * 10
+
+
+def make_queue(tmp_path, **kwargs):
+    clock = FakeClock()
+    return JobQueue(SQLiteDatabase(str(tmp_path / "state.db")), clock=clock, **kwargs), clock
+
+
+def test_jobs_are_claimed_in_order(tmp_path):
+    """Test FIFO claiming and that a claimed job is not handed out twice."""
+    queue, clock = make_queue(tmp_path)
+    queue.enqueue("a", {"preferences": {"destination": "Rome"}})
+    clock.now += 1
+    queue.enqueue("b", {"preferences": {"destination": "Oslo"}})
+
+    first = queue.claim("w1")
+    second = queue.claim("w2")
+    assert (first.id, second.id) == ("a", "b")
+    assert first.payload == {"preferences": {"destination": "Rome"}}
+    assert queue.claim("w3") is None
+
+    assert queue.complete(first)
+    assert queue.status("a")["status"] == "done"
+    assert queue.snapshot()["counts"] == {"queued": 0, "running": 1, "done": 1, "failed": 0, "cancelled": 0}
+
+def test_urgent_jobs_are_claimed_first(tmp_path):
+    """Test that lower priorities are claimed first and claims can be limited to some priorities."""
+    queue, clock = make_queue(tmp_path)
+    queue.enqueue("batch", {}, priority=3)
+    clock.now += 1
+    queue.enqueue("interactive", {}, priority=0)
+
+    assert queue.claim("w1", priorities=[3]).id == "batch"
+    assert queue.claim("w1", priorities=[]) is None
+    assert queue.claim("w1").id == "interactive"
+
+def test_expired_lease_is_reclaimed(tmp_path):
+    """Test that a job whose worker died is picked up by another worker."""
+    queue, clock = make_queue(tmp_path, lease_seconds=30)
+    queue.enqueue("a", {})
+    crashed = queue.claim("w1")
+
+    clock.now += 20
+    assert queue.claim("w2") is None
+    clock.now += 20
+    taken_over = queue.claim("w2")
+    assert taken_over.id == "a" and taken_over.attempts == 2
+
+    # The first worker can no longer finish a job it lost
+    assert not queue.complete(crashed)
+    assert not queue.heartbeat(crashed)
+    assert queue.complete(taken_over)
+
+def test_lease_expired_on_last_attempt_fails_the_plan(tmp_path, monkeypatch):
+    """Test that a plan whose worker died on the last attempt ends with an error instead of pending forever."""
+    monkeypatch.setenv("STATE_BACKEND", "memory")
+    from worker import PlanWorker
+    from routers import agents as agents_router
+
+    agents_router.travel_plans["crashed"] = {"id": "crashed", "destination": "Rome", "complete": False, "error": None}
+    queue, clock = make_queue(tmp_path, lease_seconds=30, max_attempts=1)
+    queue.enqueue("crashed", {"preferences": {"destination": "Rome"}})
+    PlanWorker(queue, concurrency=1, worker_id="w1")
+    assert queue.claim("w1").id == "crashed"
+
+    clock.now += 60
+    assert queue.claim("w2") is None
+    assert queue.status("crashed")["status"] == "failed"
+    plan = agents_router.travel_plans["crashed"]
+    assert plan["complete"] is True and plan["error"] == "worker lease expired"
+
+def test_retries_stop_at_max_attempts(tmp_path):
+    """Test delayed retries and that the last failed attempt fails the job."""
+    queue, clock = make_queue(tmp_path, max_attempts=2)
+    queue.enqueue("a", {})
+
+    job = queue.claim("w1")
+    assert queue.retry(job, "rate limit", delay=10)
+    assert queue.claim("w1") is None
+    clock.now += 10
+
+    job = queue.claim("w1")
+    assert not queue.retry(job, "rate limit")
+    assert queue.status("a")["status"] == "failed"
+    assert queue.status("a")["error"] == "rate limit"
+
+def test_released_jobs_keep_their_attempts(tmp_path):
+    """Test that releasing a job on shutdown does not count as an attempt."""
+    queue, _ = make_queue(tmp_path, max_attempts=1)
+    queue.enqueue("a", {})
+    assert queue.release(queue.claim("w1"))
+    job = queue.claim("w2")
+    assert job.attempts == 1
+
+def test_cancelled_jobs_are_not_claimed_or_finished(tmp_path):
+    """Test that cancelled jobs are skipped and their worker can no longer finish them."""
+    queue, _ = make_queue(tmp_path)
+    queue.enqueue("a", {})
+    queue.enqueue("b", {})
+    running = queue.claim("w1")
+
+    assert queue.cancel("a") and queue.cancel("b")
+    assert queue.claim("w2") is None
+    assert queue.cancelled(["a", "b", "missing"]) == {"a", "b"}
+    assert not queue.complete(running)
+    assert not queue.cancel("a")
+    assert queue.snapshot()["counts"]["cancelled"] == 2
+
+def test_worker_stops_cancelled_job(tmp_path, monkeypatch):
+    """Test that the worker notices a job cancelled in the queue and stops it."""
+    monkeypatch.setenv("STATE_BACKEND", "memory")
+    from worker import PlanWorker
+    from agents.support.cancellation import check_cancelled
+    from routers import agents as agents_router
+
+    failed = []
+
+    def generate_plan(plan_id, preferences, source_plan_id=None, resumable=False):
+        queue.cancel(plan_id)
+        for _ in range(500):
+            check_cancelled()
+            time.sleep(0.01)
+
+    monkeypatch.setattr(agents_router, "generate_plan", generate_plan)
+    monkeypatch.setattr(agents_router, "fail_plan", lambda plan_id, error: failed.append((plan_id, error)))
+
+    queue, _ = make_queue(tmp_path)
+    queue.enqueue("a", {"preferences": {"destination": "Rome"}})
+    worker = PlanWorker(queue, concurrency=1, worker_id="w1", cancel_poll=0.05)
+    heartbeat = threading.Thread(target=worker._heartbeat_loop, daemon=True)
+    heartbeat.start()
+    try:
+        worker.run_job(queue.claim("w1"))
+    finally:
+        worker._finished.set()
+
+    assert failed == [("a", agents_router.PLAN_CANCELLED)]
+    assert queue.status("a")["status"] == "cancelled"
+    assert worker.running == {}
+
+def test_worker_runs_and_fails_plans(tmp_path, monkeypatch):
+    """Test that the worker completes jobs and marks plans failed once attempts run out."""
+    monkeypatch.setenv("STATE_BACKEND", "memory")
+    from worker import PlanWorker
+    from routers import agents as agents_router
+
+    generated, failed = [], []
+
+    def generate_plan(plan_id, preferences, source_plan_id=None, resumable=False):
+        if preferences["destination"] == "Atlantis":
+            raise ValueError("no such place")
+        generated.append((plan_id, source_plan_id))
+
+    monkeypatch.setattr(agents_router, "generate_plan", generate_plan)
+    monkeypatch.setattr(agents_router, "fail_plan", lambda plan_id, error: failed.append((plan_id, error)))
+
+    queue, _ = make_queue(tmp_path, max_attempts=1)
+    queue.enqueue("good", {"preferences": {"destination": "Rome"}, "source_plan_id": "old"})
+    queue.enqueue("bad", {"preferences": {"destination": "Atlantis"}, "source_plan_id": None})
+
+    worker = PlanWorker(queue, concurrency=1, worker_id="w1")
+    worker.run_job(queue.claim("w1"))
+    worker.run_job(queue.claim("w1"))
+
+    assert generated == [("good", "old")]
+    assert failed == [("bad", "no such place")]
+    assert queue.status("good")["status"] == "done"
+    assert queue.status("bad")["status"] == "failed"
+    assert worker.running == {}
+
+def test_checkpoints_are_keyed_by_input_hash():
+    """Test that a checkpoint is only resumed for the inputs it was saved with."""
+    checkpoints = StageCheckpoints(LocalMapping())
+    first = input_hash({"preferences": {"destination": "Rome", "trip_length": 3}})
+    assert first == input_hash({"preferences": {"trip_length": 3, "destination": "Rome"}})
+
+    checkpoints.save("job", first, "attractions", "Colosseum")
+    checkpoints.save("job", first, "food", "Carbonara")
+    assert checkpoints.load("job", first) == {"attractions": "Colosseum", "food": "Carbonara"}
+
+    second = input_hash({"preferences": {"destination": "Rome", "trip_length": 5}})
+    assert checkpoints.load("job", second) == {}
+    checkpoints.save("job", second, "attractions", "Pantheon")
+    assert checkpoints.load("job", second) == {"attractions": "Pantheon"}
+
+    checkpoints.clear("job")
+    assert checkpoints.load("job", second) == {}
+
+def test_retried_job_resumes_from_checkpoint(monkeypatch):
+    """Test that a planner failure keeps completed stages and the retry only runs the planner."""
+    from routers import agents as agents_router
+
+    service = FlakyPlannerService()
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    preferences = {"destination": "Rome", "trip_length": 3, "budget": "moderate",
+                   "interests": ["history"], "get_images": True}
+    plan_id = agents_router.start_progressive_plan(preferences)["id"]
+
+    try:
+        agents_router.generate_plan(plan_id, preferences, resumable=True)
+        assert False, "the planner failure should be raised"
+    except ConnectionError:
+        pass
+    assert sorted(service.calls) == ["accommodation", "attractions", "food", "images", "planner", "reviews"]
+
+    service.calls.clear()
+    agents_router.generate_plan(plan_id, preferences, resumable=True)
+    assert service.calls == ["planner"]
+    plan = agents_router.travel_plans[plan_id]
+    assert plan["complete"] and plan["itinerary"].startswith("planner output")
+    assert plan["food"].startswith("food output")
+    assert plan_id not in agents_router.stage_checkpoints.mapping
+
+def test_failed_planner_chat_is_retried_instead_of_stored(monkeypatch):
+    """Test that a planner chat that fails inside AgentService raises for a retry, not an error itinerary."""
+    import autogen
+    from agents.core.specialized_agents import AgentService
+    from routers import agents as agents_router
+
+    service = FlakyPlannerService()
+    agent_service = AgentService()
+
+    def planner_reply(recipient, messages=None, sender=None, config=None):
+        if not service.planner_failed:
+            service.planner_failed = True
+            raise ConnectionError("planner connection reset")
+        return True, "Day 1: The Colosseum and the Forum. " * 10
+
+    agent_service.agents["planner"].register_reply([autogen.Agent, None], planner_reply, position=0)
+    fake_response = service.get_agent_response
+
+    def get_agent_response(agent_type, query, priority=None, generation=None):
+        if agent_type == "planner":
+            service.calls.append(agent_type)
+            return agent_service.get_agent_response(agent_type, query, priority, generation)
+        return fake_response(agent_type, query, priority, generation)
+
+    monkeypatch.setattr(service, "get_agent_response", get_agent_response)
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    preferences = {"destination": "Rome", "trip_length": 3, "budget": "moderate",
+                   "interests": ["history"], "get_images": True}
+    plan_id = agents_router.start_progressive_plan(preferences)["id"]
+
+    try:
+        agents_router.generate_plan(plan_id, preferences, resumable=True)
+        assert False, "the planner failure should be raised"
+    except RuntimeError as e:
+        assert "TripPlannerAgent" in str(e)
+    assert not agents_router.travel_plans[plan_id]["complete"]
+
+    service.calls.clear()
+    agents_router.generate_plan(plan_id, preferences, resumable=True)
+    assert service.calls == ["planner"]
+    assert agents_router.travel_plans[plan_id]["itinerary"].startswith("Day 1: The Colosseum")
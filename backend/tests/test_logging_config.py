@@ -0,0 +1,46 @@
+import sys
+import os
+import io
+import json
+import logging
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.logging_config import (
+    SamplingFilter, configure_logging, parse_module_levels, shutdown_logging
+)
+
+
+def make_record(msg, args=(), level=logging.DEBUG, name="tests"):
+    return logging.LogRecord(name, level, __file__, 1, msg, args, None)
+
+def test_sampling_keeps_one_in_n_per_call_site():
+    """Test that debug records are sampled per message template and INFO always passes."""
+    sampler = SamplingFilter(every=3)
+    kept = [sampler.filter(make_record("Result %d: %s", (i, "x"))) for i in range(9)]
+    assert kept.count(True) == 3
+    assert sampler.filter(make_record("Other site"))
+    assert all(sampler.filter(make_record("Progress %d", (i,), level=logging.INFO)) for i in range(5))
+
+def test_parse_module_levels():
+    """Test that per-module levels are parsed and invalid entries ignored."""
+    levels = parse_module_levels("routers=WARNING, agents.support.resilience=debug,bogus=LOUD,=INFO")
+    assert levels == {"routers": logging.WARNING, "agents.support.resilience": logging.DEBUG}
+
+def test_pipeline_writes_lazily_formatted_json_off_thread():
+    """Test that records pass through the queue and are written as JSON by the listener."""
+    stream = io.StringIO()
+    configure_logging(level="INFO", module_levels={"tests.quiet": logging.ERROR},
+                      log_format="json", sample_every=1, stream=stream)
+    try:
+        logging.getLogger("tests.pipeline").info("Planned %s days", 3, extra={"plan_id": "abc"})
+        logging.getLogger("tests.pipeline").debug("Below the root level")
+        logging.getLogger("tests.quiet").warning("Suppressed by module level")
+    finally:
+        shutdown_logging()
+    lines = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert len(lines) == 1
+    assert lines[0]["message"] == "Planned 3 days"
+    assert lines[0]["plan_id"] == "abc"
+    assert lines[0]["level"] == "INFO"
@@ -0,0 +1,58 @@
+import sys
+import os
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.model_router import ModelRouter, load_router_from_env
+
+
+def make_router(**kwargs):
+    routes = {
+        "food": ["fast-model"],
+        "planner": ["strong-model", "fast-model"],
+    }
+    return ModelRouter(routes, default_route=["fast-model"], **kwargs)
+
+def test_routes_follow_configured_chain():
+    """Test that each agent type gets its configured fallback chain."""
+    router = make_router()
+    assert router.route("food") == ["fast-model"]
+    assert router.route("planner") == ["strong-model", "fast-model"]
+    assert router.route("unknown") == ["fast-model"]
+
+def test_failing_model_is_demoted():
+    """Test that a model with repeated failures moves to the end of the chain."""
+    now = [0.0]
+    router = make_router(failure_threshold=2, demotion_seconds=30.0, clock=lambda: now[0])
+    router.record_failure("strong-model")
+    router.record_failure("strong-model")
+    assert router.route("planner") == ["fast-model", "strong-model"]
+    now[0] = 31.0
+    assert router.route("planner") == ["strong-model", "fast-model"]
+
+def test_slow_model_is_demoted_past_latency_budget():
+    """Test that a model observed over the stage latency budget is tried last."""
+    router = make_router(latency_budgets={"planner": 10.0})
+    for _ in range(5):
+        router.record_success("strong-model", 25.0)
+        router.record_success("fast-model", 4.0)
+    assert router.route("planner") == ["fast-model", "strong-model"]
+
+def test_env_configuration_expands_tiers(monkeypatch):
+    """Test that tiers and per-agent overrides are read from the environment."""
+    monkeypatch.setenv("MODEL_TIER_STRONG", "gpt-4-turbo,gpt-3.5-turbo")
+    monkeypatch.setenv("MODEL_ROUTE_FOOD", "fast,gpt-4-turbo")
+    router = load_router_from_env()
+    assert router.route("planner") == ["gpt-4-turbo", "gpt-3.5-turbo"]
+    assert router.route("food") == ["gpt-3.5-turbo", "gpt-4-turbo"]
+    assert router.route("attractions") == ["gpt-3.5-turbo"]
+
+def test_empty_routes_fall_back_to_the_default_tier(monkeypatch):
+    """Test that an empty route or tier setting does not leave an agent without models."""
+    monkeypatch.setenv("MODEL_ROUTE_FOOD", " , ")
+    monkeypatch.setenv("MODEL_TIER_STRONG", "")
+    router = load_router_from_env()
+    assert router.route("food") == ["gpt-3.5-turbo"]
+    assert router.route("planner") == ["gpt-4-turbo", "gpt-3.5-turbo"]
+    assert ModelRouter({"food": []}, default_route=["fast-model"]).primary("food") == "fast-model"
@@ -0,0 +1,90 @@
+import sys
+import os
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from routers import agents as agents_router
+from routers.http_cache import choose_encoding, is_not_modified
+
+# Create test client
+client = TestClient(app)
+
+PREFERENCES = {"destination": "Kyoto", "trip_length": 4, "budget": "moderate", "interests": ["temples"]}
+
+
+def store_plan():
+    """Store a finished plan with sizeable sections and return its ID."""
+    response = {
+        **PREFERENCES,
+        "itinerary": "Day 1: Fushimi Inari at dawn. " * 200,
+        "attractions": "Kinkaku-ji, Ginkaku-ji, Arashiyama. " * 100,
+        "food": "Nishiki Market, kaiseki, matcha. " * 100,
+        "accommodation": "Ryokan in Gion. " * 100,
+        "insights": "Go early to avoid crowds. " * 50,
+        "images": "https://example.com/kyoto.jpg",
+    }
+    return agents_router.store_travel_plan(response, dict(PREFERENCES))["id"]
+
+
+def test_fields_projection():
+    """Test that ?fields= returns only the requested fields plus the ID."""
+    plan_id = store_plan()
+    response = client.get(f"/api/agents/travel-plan/{plan_id}?fields=destination,images")
+    assert response.status_code == 200
+    assert response.json() == {"id": plan_id, "destination": "Kyoto", "images": "https://example.com/kyoto.jpg"}
+
+    assert client.get(f"/api/agents/travel-plan/{plan_id}?fields=itinerary,bogus").status_code == 400
+
+def test_conditional_get_returns_304():
+    """Test that repeat views with a validator cost no body."""
+    plan_id = store_plan()
+    first = client.get(f"/api/agents/travel-plan/{plan_id}")
+    assert first.status_code == 200
+    assert "immutable" in first.headers["cache-control"]
+
+    by_etag = client.get(f"/api/agents/travel-plan/{plan_id}", headers={"If-None-Match": first.headers["etag"]})
+    assert by_etag.status_code == 304
+    assert by_etag.content == b""
+
+    by_date = client.get(f"/api/agents/travel-plan/{plan_id}", headers={"If-Modified-Since": first.headers["last-modified"]})
+    assert by_date.status_code == 304
+
+    projected = client.get(f"/api/agents/travel-plan/{plan_id}?fields=food", headers={"If-None-Match": first.headers["etag"]})
+    assert projected.status_code == 200
+
+def test_large_plans_are_compressed():
+    """Test that plan bodies are compressed for clients that accept it."""
+    plan_id = store_plan()
+    response = client.get(f"/api/agents/travel-plan/{plan_id}", headers={"Accept-Encoding": "gzip"})
+    assert response.headers["content-encoding"] == "gzip"
+    assert int(response.headers["content-length"]) < len(response.content)
+    assert response.json()["destination"] == "Kyoto"
+
+    identity = client.get(f"/api/agents/travel-plan/{plan_id}", headers={"Accept-Encoding": "identity"})
+    assert "content-encoding" not in identity.headers
+
+def test_header_helpers():
+    """Test Accept-Encoding negotiation and validator precedence."""
+    assert choose_encoding("gzip;q=0, deflate") is None
+    assert choose_encoding("deflate, gzip;q=0.5") == "gzip"
+    assert choose_encoding(None) is None
+    # If-None-Match wins over If-Modified-Since
+    assert not is_not_modified('"other"', "Sun, 01 Jan 2090 00:00:00 GMT", 'W/"abc"', 0.0)
+    assert is_not_modified('W/"abc"', None, 'W/"abc"', 0.0)
+
+def test_stored_plans_are_served_without_revalidation(monkeypatch):
+    """Test that finished plans are served from bytes encoded once at storage time."""
+    plan_id = store_plan()
+    expected = agents_router.encoded_plans[plan_id].body
+
+    def fail(plan):
+        raise AssertionError("plan was validated again on retrieval")
+
+    monkeypatch.setattr(agents_router, "encode_plan", fail)
+    response = client.get(f"/api/agents/travel-plan/{plan_id}", headers={"Accept-Encoding": "identity"})
+    assert response.status_code == 200
+    assert response.content == expected
+    assert client.get(f"/api/agents/travel-plan/{plan_id}?fields=food").json()["food"].startswith("Nishiki")
@@ -0,0 +1,185 @@
+import sys
+import os
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from agents.core.prefetch import Prefetcher, PrefetchCancelled, PrefetchSession
+from agents.support.cancellation import RequestCancelled, current_cancel
+from routers import agents as agents_router
+
+# Create test client
+client = TestClient(app)
+
+PREFERENCES = {
+    "destination": "Lisbon",
+    "trip_length": 3,
+    "budget": "moderate",
+    "interests": ["food"],
+    "get_insights": True,
+    "get_images": True,
+}
+
+
+class RecordingAgentService:
+    """Stands in for AgentService and records which agents were called."""
+
+    def __init__(self):
+        self.calls = []
+
+    def get_agent_response(self, agent_type, query, priority=None, generation=None):
+        self.calls.append(agent_type)
+        if agent_type == "images":
+            return "https://example.com/lisbon.jpg"
+        return f"{agent_type} output for Lisbon. " * 10
+
+
+def test_submitted_plan_adopts_prefetched_stages(monkeypatch):
+    """Test that a plan submitted with a prefetch session token runs each destination stage once."""
+    service = RecordingAgentService()
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+
+    started = client.post("/api/agents/prefetch",
+                          json={"session_token": "questionnaire-1", "destination": "Lisbon", "get_images": True})
+    assert started.status_code == 202
+    assert started.json()["destination"] == "Lisbon"
+
+    # Submitted right away, so sections still running are waited for rather than run again
+    created = client.post("/api/agents/travel-plan", json={**PREFERENCES, "session_token": "questionnaire-1"})
+    assert created.status_code == 200
+    assert sorted(service.calls) == ["accommodation", "attractions", "food", "images", "planner", "reviews"]
+    assert "attractions output for Lisbon" in created.json()["attractions"]
+    assert agents_router.prefetcher.status("questionnaire-1") is None
+
+def test_cancel_unknown_prefetch_session():
+    """Test that cancelling a session that does not exist returns 404."""
+    assert client.delete("/api/agents/prefetch/unknown-session").status_code == 404
+
+def test_destination_change_cancels_pending_stages():
+    """Test that restarting a session for another destination cancels its stages that have not run."""
+    release = threading.Event()
+    running = threading.Event()
+    calls = []
+
+    def run_stage(stage, preferences, priority=None, client=None):
+        calls.append((stage, preferences["destination"]))
+        running.set()
+        release.wait(5)
+        return f"{stage} for {preferences['destination']}", True
+
+    prefetcher = Prefetcher(run_stage, workers=2)
+    prefetcher.start("token", "Lisbon")
+    lisbon = prefetcher._sessions["token"]
+    assert running.wait(5)
+    prefetcher.start("token", "Lisbon")
+    prefetcher.start("token", "Porto")
+    release.set()
+
+    sections = prefetcher.adopt("token", "Porto", False)
+    assert sections["attractions"].result(5) == "attractions for Porto"
+    assert "images" not in sections
+    with pytest.raises(PrefetchCancelled):
+        lisbon.sections["attractions"].result(5)
+
+    # The replaced Lisbon session stopped after the stage that was already running
+    assert [stage for stage, destination in calls if destination == "Lisbon"] == ["attractions"]
+    assert prefetcher.snapshot()["cancelled"] == 1
+
+def test_adopting_another_destination_cancels_the_session():
+    """Test that submitting a different destination cancels the prefetch and adopts nothing."""
+    release = threading.Event()
+    prefetcher = Prefetcher(lambda stage, preferences, priority=None, client=None: (release.wait(5), True), workers=1)
+    prefetcher.start("token", "Lisbon")
+    session = prefetcher._sessions["token"]
+
+    assert prefetcher.adopt("token", "Porto", True) == {}
+    release.set()
+    with pytest.raises(PrefetchCancelled):
+        session.sections["food"].result(5)
+
+def test_cancel_racing_a_finishing_stage_resolves_each_section_once():
+    """Test that cancelling while stages finish never resolves a section twice."""
+    for _ in range(50):
+        session = PrefetchSession("Lisbon", True, lambda: 0.0)
+        barrier = threading.Barrier(2)
+
+        def finish():
+            barrier.wait()
+            for field in session.sections:
+                session.resolve(field, f"{field} for Lisbon")
+
+        thread = threading.Thread(target=finish)
+        thread.start()
+        barrier.wait()
+        session.cancel()
+        thread.join(5)
+        assert all(future.done() for future in session.sections.values())
+
+    assert session.resolve("food", "late") is False
+
+def test_failed_prefetched_stage_is_run_again_by_the_plan(monkeypatch):
+    """Test that a prefetched stage whose agent call failed is not adopted as a section."""
+    class FailingOnceAgentService(RecordingAgentService):
+        def get_agent_response(self, agent_type, query, priority=None, generation=None):
+            if agent_type == "food" and "food" not in self.calls:
+                self.calls.append(agent_type)
+                raise ConnectionError("food agent unavailable")
+            return super().get_agent_response(agent_type, query, priority, generation)
+
+    service = FailingOnceAgentService()
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    client.post("/api/agents/prefetch", json={"session_token": "questionnaire-2", "destination": "Lisbon"})
+
+    created = client.post("/api/agents/travel-plan", json={**PREFERENCES, "session_token": "questionnaire-2"})
+    assert created.status_code == 200
+    assert service.calls.count("food") == 2
+    assert created.json()["food"].startswith("food output for Lisbon")
+
+def test_destination_change_stops_the_running_stage():
+    """Test that cancelling a session stops the stage it is running, not only the ones after it."""
+    running = threading.Event()
+    stopped = []
+
+    def run_stage(stage, preferences, priority=None, client=None):
+        running.set()
+        try:
+            current_cancel.get().sleep(5)
+        except RequestCancelled:
+            stopped.append(stage)
+            raise
+        return f"{stage} for {preferences['destination']}", True
+
+    prefetcher = Prefetcher(run_stage, workers=1)
+    prefetcher.start("token", "Lisbon")
+    lisbon = prefetcher._sessions["token"]
+    assert running.wait(5)
+    prefetcher.cancel("token")
+
+    with pytest.raises(PrefetchCancelled):
+        lisbon.sections["attractions"].result(5)
+    prefetcher._executor.shutdown(wait=True)
+    assert stopped == ["attractions"]
+
+def test_prefetch_is_scheduled_as_the_requesting_clients_work(monkeypatch):
+    """Test that prefetched stages share background capacity per client, not as one "prefetch" flow."""
+    service = RecordingAgentService()
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    scheduled = agents_router.scheduled
+    clients = []
+
+    def recording_scheduled(work_class, client_name, fn, *args, **kwargs):
+        clients.append((work_class, client_name))
+        return scheduled(work_class, client_name, fn, *args, **kwargs)
+
+    monkeypatch.setattr(agents_router, "scheduled", recording_scheduled)
+    headers = {"X-API-Key": "partner-key"}
+    client.post("/api/agents/prefetch", headers=headers,
+                json={"session_token": "questionnaire-3", "destination": "Lisbon"})
+    client.post("/api/agents/travel-plan", headers=headers, json={**PREFERENCES, "session_token": "questionnaire-3"})
+
+    background = {client_name for work_class, client_name in clients if work_class == agents_router.BACKGROUND}
+    assert len(background) == 1 and background.pop().startswith("key:")
@@ -0,0 +1,99 @@
+import sys
+import os
+import time
+import pstats
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.profiling import ProfileCapture, ProfileMiddleware, StackSampler, current_capture, profiled
+
+
+def busy_planner_stage(seconds):
+    end = time.monotonic() + seconds
+    while time.monotonic() < end:
+        sum(range(1000))
+
+
+def test_sampler_writes_folded_stacks():
+    """Test that sampled stacks name the busy function in flamegraph folded format."""
+    sampler = StackSampler(interval=0.001)
+    sampler.start()
+    busy_planner_stage(0.2)
+    sampler.stop()
+    lines = sampler.folded().splitlines()
+    assert sampler.samples > 0
+    assert any("busy_planner_stage (test_profiling.py:" in line for line in lines)
+    stack, count = lines[0].rsplit(" ", 1)
+    assert int(count) >= 1 and ";" in stack
+
+def test_profile_header_captures_one_request(tmp_path):
+    """Test that only requests with X-Profile are profiled and the output path is returned."""
+    app = FastAPI()
+
+    @app.post("/api/agents/travel-plan")
+    async def create_travel_plan():
+        busy_planner_stage(0.05)
+        return {"ok": True}
+
+    app.add_middleware(ProfileMiddleware, directory=str(tmp_path))
+    client = TestClient(app)
+
+    plain = client.post("/api/agents/travel-plan")
+    assert "x-profile-output" not in plain.headers
+    assert os.listdir(tmp_path) == []
+
+    profiled = client.post("/api/agents/travel-plan", headers={"X-Profile": "cprofile"})
+    output = profiled.headers["x-profile-output"]
+    assert output.endswith(".prof") and os.path.exists(output)
+    functions = {name for _, _, name in pstats.Stats(output).stats}
+    assert "busy_planner_stage" in functions
+
+def test_only_one_capture_at_a_time(tmp_path):
+    """Test that overlapping captures are refused instead of corrupting each other."""
+    first = ProfileCapture("sample", str(tmp_path))
+    second = ProfileCapture("cprofile", str(tmp_path))
+    assert first.start()
+    assert not second.start()
+    assert second.stop() is None
+    assert first.stop().endswith(".folded")
+    assert second.start()
+    second.stop()
+
+def test_cprofile_covers_plans_generated_in_the_threadpool(tmp_path, monkeypatch):
+    """Test that a plan generated off the event loop shows up in the request's cprofile dump."""
+    from routers import agents as agents_router
+
+    class BusyPlannerService:
+        def get_agent_response(self, agent_type, query, priority=None, generation=None):
+            if agent_type == "planner":
+                busy_planner_stage(0.05)
+            if agent_type == "images":
+                return "https://example.com/oslo.jpg"
+            return f"{agent_type} output for Oslo. " * 10
+
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", BusyPlannerService())
+    app = FastAPI()
+    app.include_router(agents_router.router, prefix="/api/agents")
+    app.add_middleware(ProfileMiddleware, directory=str(tmp_path))
+    client = TestClient(app)
+
+    profiled_response = client.post("/api/agents/travel-plan", headers={"X-Profile": "cprofile"},
+                                    json={"destination": "Oslo", "trip_length": 2, "budget": "budget"})
+    assert profiled_response.status_code == 200
+    functions = {name for _, _, name in pstats.Stats(profiled_response.headers["x-profile-output"]).stats}
+    assert {"busy_planner_stage", "process_request"} <= functions
+    assert current_capture.get() is None
+
+def test_profiled_is_a_no_op_without_a_capture():
+    """Test that work outside a profiled request runs unchanged."""
+    with profiled():
+        assert sum(range(10)) == 45
+
+    capture = ProfileCapture("sample", "unused")
+    with capture.profile_thread():
+        pass
+    assert capture._thread_profilers == []
+
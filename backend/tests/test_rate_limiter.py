@@ -0,0 +1,58 @@
+import sys
+import os
+import pytest
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.rate_limiter import TokenBucket, UpstreamLimiter, RateLimitExceeded
+
+
+class FakeClock:
+    """Manually advanced clock so bucket refills are deterministic."""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_over_time():
+    """Test that a drained bucket refills at capacity/period."""
+    clock = FakeClock()
+    bucket = TokenBucket(60, 60.0, clock=clock)
+    bucket.consume(60)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now = 30.0
+    assert bucket.wait_time(30) == 0.0
+
+def test_limiter_admits_within_budget():
+    """Test that calls are admitted immediately while every bucket has capacity."""
+    clock = FakeClock()
+    limiter = UpstreamLimiter("test", {
+        "requests": TokenBucket(2, 60.0, clock=clock),
+        "tokens": TokenBucket(1000, 60.0, clock=clock),
+    }, clock=clock)
+    assert limiter.acquire({"requests": 1, "tokens": 400}) == 0.0
+    assert limiter.acquire({"requests": 1, "tokens": 400}) == 0.0
+    assert limiter.stats["admitted"] == 2
+
+def test_limiter_rejects_when_wait_exceeds_budget():
+    """Test that a call which cannot be admitted in time raises with a retry hint."""
+    clock = FakeClock()
+    limiter = UpstreamLimiter("test", {"queries": TokenBucket(1, 86400.0, clock=clock)}, max_wait=5.0, clock=clock)
+    limiter.acquire({"queries": 1})
+    with pytest.raises(RateLimitExceeded) as exc_info:
+        limiter.acquire({"queries": 1})
+    assert exc_info.value.retry_after > 5.0
+    assert limiter.stats["rejected"] == 1
+    assert limiter.queue_depth == 0
+
+def test_limiter_sheds_load_when_queue_full():
+    """Test that a saturated queue rejects new callers without waiting."""
+    clock = FakeClock()
+    limiter = UpstreamLimiter("test", {"requests": TokenBucket(1, 60.0, clock=clock)}, max_queue=0, clock=clock)
+    assert limiter.is_saturated()
+    with pytest.raises(RateLimitExceeded):
+        limiter.acquire({"requests": 1})
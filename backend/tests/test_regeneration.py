@@ -0,0 +1,152 @@
+import sys
+import os
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from agents.core.coordinator import invalidated_stages
+from agents.core.specialized_agents import DEFAULT_INSIGHTS_MARKER, FALLBACK_IMAGE_URLS
+from routers import agents as agents_router
+
+# Create test client
+client = TestClient(app)
+
+PREFERENCES = {
+    "destination": "Lisbon",
+    "trip_length": 3,
+    "budget": "moderate",
+    "interests": ["food"],
+    "get_insights": True,
+    "get_images": True,
+}
+
+
+class RecordingAgentService:
+    """Stands in for AgentService and records which agents were called."""
+
+    def __init__(self):
+        self.calls = []
+        self.fail = set()
+
+    def get_agent_response(self, agent_type, query, priority=None, generation=None):
+        self.calls.append(agent_type)
+        if agent_type in self.fail:
+            raise ConnectionError(f"{agent_type} unavailable")
+        if agent_type == "images":
+            return "https://example.com/lisbon.jpg"
+        return f"{agent_type} output for Lisbon. " * 10
+
+
+def test_only_planner_is_invalidated_by_trip_tweaks():
+    """Test that changing trip length, budget or interests only invalidates the planner."""
+    changed = {**PREFERENCES, "trip_length": 5, "budget": "luxury", "interests": ["art"]}
+    assert invalidated_stages(PREFERENCES, changed) == {"planner"}
+    assert invalidated_stages(PREFERENCES, dict(PREFERENCES)) == set()
+    assert invalidated_stages(PREFERENCES, {**PREFERENCES, "get_images": False}) == {"images", "planner"}
+    assert len(invalidated_stages(PREFERENCES, {**PREFERENCES, "destination": "Porto"})) == 6
+
+def test_regenerate_reuses_stored_stage_outputs(monkeypatch):
+    """Test that regenerating with a new trip length runs only the planner."""
+    service = RecordingAgentService()
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    # Keep the 5-day regeneration on the single planner call
+    monkeypatch.setattr("agents.core.coordinator.use_map_reduce", lambda trip_length: False)
+
+    created = client.post("/api/agents/travel-plan", json=PREFERENCES)
+    assert created.status_code == 200
+    assert sorted(service.calls) == ["accommodation", "attractions", "food", "images", "planner", "reviews"]
+
+    service.calls.clear()
+    regenerated = client.post(f"/api/agents/travel-plan/{created.json()['id']}/regenerate", json={"trip_length": 5})
+    assert regenerated.status_code == 200
+    body = regenerated.json()
+    assert service.calls == ["planner"]
+    assert body["trip_length"] == 5
+    assert body["rerun_stages"] == ["planner"]
+    assert body["attractions"] == created.json()["attractions"]
+    assert body["id"] != created.json()["id"]
+
+def test_regenerate_reruns_stages_that_fell_back(monkeypatch):
+    """Test that fallback text stored with a plan is not reused when it is regenerated."""
+    service = RecordingAgentService()
+    service.fail = {"attractions"}
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    monkeypatch.setattr("agents.core.coordinator.use_map_reduce", lambda trip_length: False)
+
+    created = client.post("/api/agents/travel-plan", json={**PREFERENCES, "destination": "Faro"})
+    assert created.json()["attractions"] == "No attractions information available for Faro."
+
+    service.fail = set()
+    service.calls.clear()
+    regenerated = client.post(f"/api/agents/travel-plan/{created.json()['id']}/regenerate", json={"budget": "luxury"})
+    body = regenerated.json()
+    assert sorted(service.calls) == ["attractions", "planner"]
+    assert body["rerun_stages"] == ["attractions", "planner"]
+    assert body["attractions"] == "attractions output for Lisbon. " * 10
+
+def test_regenerate_repairs_sections_that_errored(monkeypatch):
+    """Test that canned insights, padded images and a failed planner are re-run, not reused."""
+    class DegradedAgentService(RecordingAgentService):
+        def get_agent_response(self, agent_type, query, priority=None, generation=None):
+            if agent_type in self.fail and agent_type == "reviews":
+                self.calls.append(agent_type)
+                return f"# TRAVELER INSIGHTS AND REVIEWS\n\n## ERROR - {DEFAULT_INSIGHTS_MARKER}\n" + "Tip. " * 20
+            if agent_type in self.fail and agent_type == "images":
+                self.calls.append(agent_type)
+                return "\n".join(["https://example.com/braga.jpg", *FALLBACK_IMAGE_URLS[:4]])
+            return super().get_agent_response(agent_type, query, priority, generation)
+
+    service = DegradedAgentService()
+    service.fail = {"reviews", "images", "planner"}
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    monkeypatch.setattr("agents.core.coordinator.use_map_reduce", lambda trip_length: False)
+
+    created = client.post("/api/agents/travel-plan", json={**PREFERENCES, "destination": "Braga"})
+    assert created.json()["itinerary"].startswith("Error creating itinerary")
+    assert "https://example.com/braga.jpg" in created.json()["images"]
+
+    service.fail = set()
+    service.calls.clear()
+    regenerated = client.post(f"/api/agents/travel-plan/{created.json()['id']}/regenerate", json={"budget": "luxury"})
+    assert regenerated.status_code == 200
+    assert sorted(service.calls) == ["images", "planner", "reviews"]
+    assert regenerated.json()["insights"].startswith("reviews output")
+    assert regenerated.json()["itinerary"].startswith("planner output")
+
+def test_regenerate_unknown_plan_returns_404():
+    """Test that regenerating a missing plan is rejected."""
+    response = client.post("/api/agents/travel-plan/missing/regenerate", json={"budget": "luxury"})
+    assert response.status_code == 404
+
+def test_progressive_plan_publishes_sections_before_itinerary(monkeypatch):
+    """Test that specialist sections are readable while the planner is still running."""
+    service = RecordingAgentService()
+    snapshots = []
+    original = service.get_agent_response
+
+    def get_agent_response(agent_type, query, priority=None, generation=None):
+        if agent_type == "planner":
+            plan_id = next(iter(reversed(agents_router.travel_plans)))
+            snapshots.append(client.get(f"/api/agents/travel-plan/{plan_id}").json())
+        return original(agent_type, query, priority, generation)
+
+    service.get_agent_response = get_agent_response
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+
+    created = client.post("/api/agents/travel-plan?progressive=true", json=PREFERENCES)
+    assert created.status_code == 202
+    assert created.json()["complete"] is False
+    assert not any(created.json()["sections_ready"].values())
+
+    partial = snapshots[0]
+    assert partial["sections_ready"]["attractions"] and partial["sections_ready"]["food"]
+    assert not partial["sections_ready"]["itinerary"]
+    assert partial["attractions"].startswith("attractions output")
+    assert partial["itinerary"] == ""
+
+    finished = client.get(f"/api/agents/travel-plan/{created.json()['id']}").json()
+    assert finished["complete"] is True
+    assert all(finished["sections_ready"].values())
+    assert finished["itinerary"].startswith("planner output")
@@ -0,0 +1,91 @@
+import sys
+import os
+import time
+import pytest
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.resilience import ResilientUpstream, CircuitBreaker, CircuitOpenError, is_transient
+
+
+class FlakyCall:
+    """Callable that fails a fixed number of times before succeeding."""
+
+    def __init__(self, failures, error=ConnectionError("connection reset")):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        self.status_code = status_code
+
+
+def test_transient_error_classification():
+    """Test that network errors and 429/5xx are retried but client errors are not."""
+    assert is_transient(ConnectionError())
+    assert is_transient(StatusError(429))
+    assert is_transient(StatusError(503))
+    assert not is_transient(StatusError(400))
+    assert not is_transient(ValueError("bad input"))
+
+def test_retries_transient_errors():
+    """Test that transient failures are retried with backoff until success."""
+    upstream = ResilientUpstream("test", max_retries=2, sleep=lambda _: None)
+    call = FlakyCall(failures=2)
+    assert upstream.call(call) == "ok"
+    assert call.calls == 3
+    assert upstream.stats["retries"] == 2
+
+def test_does_not_retry_permanent_errors():
+    """Test that non-transient errors are raised immediately."""
+    upstream = ResilientUpstream("test", max_retries=2, sleep=lambda _: None)
+    call = FlakyCall(failures=1, error=StatusError(400))
+    with pytest.raises(StatusError):
+        upstream.call(call)
+    assert call.calls == 1
+
+    # Nor do they count toward opening the circuit
+    for _ in range(10):
+        with pytest.raises(StatusError):
+            upstream.call(FlakyCall(failures=1, error=StatusError(400)))
+    assert upstream.breaker.state == CircuitBreaker.CLOSED
+
+def test_circuit_opens_and_recovers():
+    """Test that repeated failures open the circuit and a half-open trial closes it."""
+    now = [0.0]
+    breaker = CircuitBreaker("test", failure_threshold=2, reset_timeout=10.0, clock=lambda: now[0])
+    upstream = ResilientUpstream("test", max_retries=0, breaker=breaker, sleep=lambda _: None)
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            upstream.call(FlakyCall(failures=1))
+    with pytest.raises(CircuitOpenError):
+        upstream.call(FlakyCall(failures=0))
+    now[0] = 11.0
+    assert upstream.call(FlakyCall(failures=0)) == "ok"
+    assert breaker.state == CircuitBreaker.CLOSED
+
+def test_hedged_request_beats_slow_outlier():
+    """Test that a backup request is sent once the primary exceeds the latency percentile."""
+    upstream = ResilientUpstream("test", hedge_percentile=50, hedge_min_samples=1)
+    upstream.latency.record(0.01)
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) == 1:
+            time.sleep(0.5)
+            return "slow"
+        return "fast"
+
+    assert upstream.call(call) == "fast"
+    assert upstream.stats["hedges"] == 1
+    assert upstream.stats["hedge_wins"] == 1
@@ -0,0 +1,175 @@
+import sys
+import os
+import time
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from agents.support.rate_limiter import PRIORITY_HIGH, PRIORITY_LOW, RateLimitExceeded, priority_cap
+from agents.support.scheduler import BATCH, INTERACTIVE, FairScheduler, WorkClass, lend_slot, parse_weights
+
+client = TestClient(app)
+
+
+def make_scheduler(max_concurrent=1, batch_concurrency=1, **kwargs):
+    return FairScheduler([
+        WorkClass(INTERACTIVE, 0, concurrency=max_concurrent, max_queue=10, max_wait=5.0, priority=PRIORITY_HIGH),
+        WorkClass(BATCH, 3, concurrency=batch_concurrency, max_queue=10, max_wait=5.0, priority=PRIORITY_LOW),
+    ], max_concurrent, **kwargs)
+
+
+def wait_until(condition):
+    deadline = time.monotonic() + 5
+    while not condition():
+        assert time.monotonic() < deadline, "timed out"
+        time.sleep(0.005)
+
+
+def queue_in_background(scheduler, work_class, client_name, admitted):
+    """Start a thread that waits for a slot, records its admission and releases the slot."""
+    def run():
+        with scheduler.slot(work_class, client_name):
+            admitted.append(client_name)
+
+    depth = scheduler.snapshot()["classes"][work_class]["queue_depth"]
+    thread = threading.Thread(target=run)
+    thread.start()
+    wait_until(lambda: scheduler.snapshot()["classes"][work_class]["queue_depth"] == depth + 1)
+    return thread
+
+
+def test_interactive_work_goes_first_and_batch_is_capped():
+    """Test that a freed slot goes to interactive work, and batch never takes more than its share."""
+    scheduler = make_scheduler(max_concurrent=2, batch_concurrency=1)
+    admitted = []
+    release = threading.Event()
+
+    def hold():
+        with scheduler.slot(BATCH, "bulk"):
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    wait_until(lambda: scheduler.running == 1)
+
+    # The second slot is free, but batch already uses its one slot
+    waiting_batch = queue_in_background(scheduler, BATCH, "bulk", admitted)
+    with scheduler.slot(INTERACTIVE, "user"):
+        admitted.append("user")
+    assert admitted == ["user"]
+
+    release.set()
+    for thread in (holder, waiting_batch):
+        thread.join(5)
+    assert admitted == ["user", "bulk"]
+    assert scheduler.snapshot()["classes"][BATCH]["admitted"] == 2
+
+def test_clients_share_a_class_fairly():
+    """Test that a client with many queued items does not delay another client's items behind all of them."""
+    scheduler = make_scheduler(client_weights={"heavy": 1.0, "light": 1.0})
+    admitted = []
+    release = threading.Event()
+
+    def hold():
+        with scheduler.slot(INTERACTIVE, "holder"):
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    wait_until(lambda: scheduler.running == 1)
+    threads = [queue_in_background(scheduler, INTERACTIVE, "heavy", admitted) for _ in range(4)]
+    threads += [queue_in_background(scheduler, INTERACTIVE, "light", admitted) for _ in range(2)]
+
+    release.set()
+    for thread in [holder, *threads]:
+        thread.join(5)
+    assert admitted == ["heavy", "light", "heavy", "light", "heavy", "heavy"]
+
+def test_full_class_queue_and_wait_budget_are_rejected():
+    """Test that work is rejected once its class queue is full or its wait budget runs out."""
+    scheduler = FairScheduler([
+        WorkClass(BATCH, 3, concurrency=1, max_queue=0, max_wait=0.05, priority=PRIORITY_LOW),
+        WorkClass(INTERACTIVE, 0, concurrency=1, max_queue=5, max_wait=0.05, priority=PRIORITY_HIGH),
+    ], max_concurrent=1)
+
+    with pytest.raises(RateLimitExceeded):
+        with scheduler.slot(BATCH):
+            pass
+    with scheduler.slot(INTERACTIVE, "a"):
+        with pytest.raises(RateLimitExceeded):
+            with scheduler.slot(INTERACTIVE, "b"):
+                pass
+    snapshot = scheduler.snapshot()
+    assert snapshot["classes"][BATCH]["rejected"] == 1
+    assert snapshot["classes"][INTERACTIVE]["rejected"] == 1
+    assert snapshot["classes"][INTERACTIVE]["queue_depth"] == 0
+    assert snapshot["running"] == 0
+
+def test_batch_work_cannot_use_high_upstream_priority():
+    """Test that upstream calls made by batch work are capped at low admission priority."""
+    scheduler = make_scheduler()
+    with scheduler.slot(BATCH):
+        assert priority_cap.get() == PRIORITY_LOW
+    assert priority_cap.get() == PRIORITY_HIGH
+    assert parse_weights("partner=4, free=0.5,broken") == {"partner": 4.0, "free": 0.5}
+
+def test_reserved_slots_are_kept_for_interactive_work():
+    """Test that batch work queues once only the reserved slots are left, and interactive work still starts."""
+    scheduler = make_scheduler(max_concurrent=2, batch_concurrency=2, reserved=1)
+    admitted = []
+    release = threading.Event()
+
+    def hold():
+        with scheduler.slot(BATCH, "bulk"):
+            release.wait(5)
+
+    holder = threading.Thread(target=hold)
+    holder.start()
+    wait_until(lambda: scheduler.running == 1)
+
+    # Batch is under its own limit, but the last free slot is reserved
+    waiting_batch = queue_in_background(scheduler, BATCH, "bulk", admitted)
+    assert scheduler.open_classes() == [INTERACTIVE]
+    with scheduler.slot(INTERACTIVE, "user"):
+        admitted.append("user")
+    assert admitted == ["user"]
+
+    release.set()
+    for thread in (holder, waiting_batch):
+        thread.join(5)
+    assert admitted == ["user", "bulk"]
+
+def test_lent_work_stops_waiting_for_a_slot():
+    """Test that queued work inside lend_slot runs without a slot once a slot holder waits for it."""
+    scheduler = make_scheduler(max_concurrent=1)
+    lent = threading.Event()
+    ran = []
+
+    def prefetch():
+        with lend_slot(lent), scheduler.slot(BATCH, "prefetch"):
+            ran.append(scheduler.running)
+
+    with scheduler.slot(INTERACTIVE, "user"):
+        thread = threading.Thread(target=prefetch)
+        thread.start()
+        wait_until(lambda: scheduler.snapshot()["classes"][BATCH]["queue_depth"] == 1)
+        lent.set()
+        thread.join(5)
+        # It ran alongside the slot holder instead of waiting for it to finish
+        assert ran == [1]
+    snapshot = scheduler.snapshot()["classes"][BATCH]
+    assert (snapshot["lent"], snapshot["admitted"], snapshot["queue_depth"]) == (1, 0, 0)
+
+def test_work_class_header_and_metrics_endpoint():
+    """Test that unknown work classes are refused and scheduler metrics are reported."""
+    response = client.post("/api/agents/travel-plan", json={"destination": "Oslo", "trip_length": 2},
+                           headers={"X-Work-Class": "urgent"})
+    assert response.status_code == 400
+
+    metrics = client.get("/api/agents/scheduler").json()
+    assert set(metrics["classes"]) == {"interactive", "query", "background", "batch"}
+    assert "wait_p95_seconds" in metrics["classes"]["interactive"]
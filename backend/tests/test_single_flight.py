@@ -0,0 +1,130 @@
+import sys
+import os
+import time
+import threading
+import pytest
+from concurrent.futures import ThreadPoolExecutor
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from main import app
+from agents.support.single_flight import SingleFlight, preferences_key
+from routers import agents as agents_router
+
+# Create test client
+client = TestClient(app)
+
+PREFERENCES = {
+    "destination": "Lisbon",
+    "trip_length": 3,
+    "budget": "moderate",
+    "interests": ["food", "art"],
+    "get_insights": True,
+    "get_images": True,
+}
+
+
+class BlockingAgentService:
+    """Stands in for AgentService; calls block until released."""
+
+    def __init__(self):
+        self.calls = []
+        self.started = threading.Event()
+        self.release = threading.Event()
+
+    def get_agent_response(self, agent_type, query, priority=None, generation=None):
+        self.calls.append(agent_type)
+        self.started.set()
+        self.release.wait(5)
+        if agent_type == "images":
+            return "https://example.com/lisbon.jpg"
+        return f"{agent_type} output for Lisbon. " * 10
+
+
+def test_preferences_key_is_canonical():
+    """Test that payloads producing the same plan hash the same."""
+    shuffled = {**PREFERENCES, "destination": "  lisbon ", "interests": ["art", "food", "Food"]}
+    assert preferences_key(shuffled) == preferences_key(PREFERENCES)
+    assert preferences_key({**PREFERENCES, "trip_length": 4}) != preferences_key(PREFERENCES)
+
+def test_concurrent_callers_share_one_execution():
+    """Test that callers arriving while a call runs get its result without running it again."""
+    flights = SingleFlight()
+    release = threading.Event()
+    runs = []
+
+    def work():
+        runs.append(1)
+        release.wait(5)
+        return "plan-1"
+
+    with ThreadPoolExecutor(max_workers=3) as executor:
+        results = [executor.submit(flights.run, "key", work) for _ in range(3)]
+        while flights.snapshot()["joined"] < 2:
+            time.sleep(0.01)
+        release.set()
+        outcomes = [result.result(5) for result in results]
+
+    assert runs == [1]
+    assert sorted(outcomes) == [("plan-1", False), ("plan-1", True), ("plan-1", True)]
+
+def test_errors_reach_joiners_and_are_not_reused():
+    """Test that a failed call fails everyone who joined it and the next call runs again."""
+    flights = SingleFlight(reuse_seconds=60)
+    future, leader = flights.begin("key")
+    joined, joined_leader = flights.begin("key")
+    assert leader and not joined_leader
+
+    flights.finish("key", future, error=RuntimeError("upstream down"))
+    with pytest.raises(RuntimeError):
+        joined.result()
+    assert flights.begin("key")[1] is True
+
+def test_recent_results_are_reused_within_the_window():
+    """Test that a finished result is reused until the reuse window has passed."""
+    now = [0.0]
+    flights = SingleFlight(reuse_seconds=10, clock=lambda: now[0])
+    future, _ = flights.begin("key")
+    flights.finish("key", future, "plan-1")
+
+    now[0] = 5.0
+    reused, leader = flights.begin("key")
+    assert not leader and reused.result() == "plan-1"
+
+    now[0] = 20.0
+    assert flights.begin("key")[1] is True
+    assert flights.snapshot()["reused"] == 1
+
+def test_leave_counts_remaining_callers():
+    """Test that the work is only abandoned once every caller has left."""
+    flights = SingleFlight()
+    future, _ = flights.begin("key")
+    joined, _ = flights.begin("key")
+    assert joined is future
+    assert flights.leave("key", future) == 1
+    assert flights.leave("key", future) == 0
+
+    flights.finish("key", future, "plan-1")
+    assert flights.leave("key", future) == 0
+
+def test_identical_plan_requests_are_coalesced(monkeypatch):
+    """Test that an identical request made during generation receives the same plan."""
+    service = BlockingAgentService()
+    monkeypatch.setattr(agents_router.coordinator, "agent_service", service)
+    monkeypatch.setattr(agents_router, "plan_flights", SingleFlight())
+
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        first = executor.submit(client.post, "/api/agents/travel-plan", json=PREFERENCES)
+        assert service.started.wait(5)
+        second = executor.submit(client.post, "/api/agents/travel-plan",
+                                 json={**PREFERENCES, "interests": ["art", "food"]})
+        while agents_router.plan_flights.snapshot()["joined"] < 1:
+            time.sleep(0.01)
+        service.release.set()
+        responses = [first.result(10), second.result(10)]
+
+    assert [response.status_code for response in responses] == [200, 200]
+    assert responses[0].json()["id"] == responses[1].json()["id"]
+    assert sorted(service.calls) == ["accommodation", "attractions", "food", "images", "planner", "reviews"]
@@ -0,0 +1,70 @@
+import sys
+import os
+import multiprocessing
+
+# Add the parent directory to the path so we can import the agents package
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from agents.support.state_store import LocalMapping, SQLiteDatabase, SharedMapping
+
+
+def store_plan(path, plan_id):
+    SharedMapping(SQLiteDatabase(path), "travel_plans")[plan_id] = {"id": plan_id, "destination": "Oslo"}
+
+def increment(path, times):
+    counters = SharedMapping(SQLiteDatabase(path), "counters")
+    for _ in range(times):
+        counters.modify("hits", lambda value: value + 1)
+
+
+def test_shared_mapping_behaves_like_a_dict(tmp_path):
+    """Test dict operations, insertion order and copy semantics."""
+    plans = SharedMapping(SQLiteDatabase(str(tmp_path / "state.db")), "travel_plans")
+    plans["a"] = {"sections": {"food": False}}
+    plans["b"] = {"sections": {}}
+    plans["a"] = {"sections": {"food": True}}
+    assert "a" in plans and "missing" not in plans
+    assert list(plans) == ["a", "b"]
+    assert next(reversed(plans)) == "b"
+    assert plans.get("missing") is None
+    assert len(plans) == 2
+
+    value = plans["a"]
+    value["sections"]["food"] = False
+    assert plans["a"]["sections"]["food"] is True
+
+    del plans["b"]
+    assert list(plans) == ["a"]
+
+def test_namespaces_are_isolated(tmp_path):
+    """Test that namespaces in one database do not see each other's keys."""
+    database = SQLiteDatabase(str(tmp_path / "state.db"))
+    SharedMapping(database, "travel_plans")["x"] = 1
+    assert "x" not in SharedMapping(database, "itinerary_status")
+
+def test_state_is_visible_across_processes(tmp_path):
+    """Test that a plan written by one worker process can be read by another."""
+    path = str(tmp_path / "state.db")
+    worker = multiprocessing.get_context("spawn").Process(target=store_plan, args=(path, "plan-1"))
+    worker.start()
+    worker.join(30)
+    assert SharedMapping(SQLiteDatabase(path), "travel_plans")["plan-1"]["destination"] == "Oslo"
+
+def test_modify_is_atomic_across_processes(tmp_path):
+    """Test that concurrent read-modify-write from several processes loses no updates."""
+    path = str(tmp_path / "state.db")
+    SharedMapping(SQLiteDatabase(path), "counters")["hits"] = 0
+    context = multiprocessing.get_context("spawn")
+    workers = [context.Process(target=increment, args=(path, 25)) for _ in range(3)]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(60)
+    assert SharedMapping(SQLiteDatabase(path), "counters")["hits"] == 75
+
+def test_local_mapping_modify():
+    """Test the in-process backend's modify helper."""
+    local = LocalMapping()
+    local["n"] = 1
+    assert local.modify("n", lambda value: value + 1) == 2
+    assert local["n"] == 2
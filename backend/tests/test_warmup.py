@@ -0,0 +1,57 @@
+import sys
+import os
+from fastapi.testclient import TestClient
+
+# Add the parent directory to the path so we can import the main module
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import main
+from agents.support.warmup import Readiness
+from routers import agents as agents_router
+
+PREFERENCES = {"destination": "Vienna", "trip_length": 2, "budget": "moderate", "interests": ["music"]}
+
+
+def test_failed_steps_are_reported_but_do_not_block_readiness():
+    """Test that every step runs and a failing one is recorded."""
+    readiness = Readiness()
+    assert not readiness.ready
+
+    def unreachable():
+        raise RuntimeError("connection refused")
+
+    readiness.run([("clients", lambda: "built"), ("openai", unreachable), ("cache", lambda: 3)])
+    snapshot = readiness.snapshot()
+    assert readiness.ready and snapshot["status"] == "ready"
+    assert snapshot["steps"]["clients"]["detail"] == "built"
+    assert snapshot["steps"]["openai"] == {"ok": False, "error": "connection refused",
+                                           "seconds": snapshot["steps"]["openai"]["seconds"]}
+    assert snapshot["steps"]["cache"]["ok"]
+
+def test_ready_endpoint_is_separate_from_health(monkeypatch):
+    """Test that /api/ready returns 503 until warm-up finishes while /api/health stays 200."""
+    readiness = Readiness()
+    monkeypatch.setattr(main, "readiness", readiness)
+    client = TestClient(main.app)
+
+    assert client.get("/api/health").status_code == 200
+    response = client.get("/api/ready")
+    assert response.status_code == 503
+    assert response.json()["status"] == "starting"
+
+    readiness.run([("noop", lambda: None)])
+    assert client.get("/api/ready").status_code == 200
+
+def test_recent_plans_are_compressed_ahead_of_time(monkeypatch):
+    """Test that warming the plan cache means the first view is served from the cache."""
+    response = {**PREFERENCES, "itinerary": "Day 1: Musikverein. " * 100, "attractions": "Schönbrunn. " * 50}
+    plan_id = agents_router.store_travel_plan(response, dict(PREFERENCES))["id"]
+    assert agents_router.warm_plan_cache(5) >= 1
+
+    def fail(body, encoding):
+        raise AssertionError("plan was compressed again")
+
+    monkeypatch.setattr("routers.http_cache.compress", fail)
+    served = TestClient(main.app).get(f"/api/agents/travel-plan/{plan_id}", headers={"Accept-Encoding": "gzip"})
+    assert served.status_code == 200
+    assert served.headers["content-encoding"] == "gzip"
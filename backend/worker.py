@@ -0,0 +1,228 @@
+import os
+import signal
+import socket
+import logging
+import threading
+import time
+import uuid
+from contextlib import ExitStack
+from typing import Dict, Optional
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# The worker shares its queue and plans with the API through the SQLite state backend
+os.environ.setdefault("STATE_BACKEND", "sqlite")
+
+from agents.support.logging_config import configure_logging
+configure_logging()
+
+from agents.support.job_queue import Job, JobQueue, build_plan_queue
+from agents.support.cancellation import CancelRegistry, RequestCancelled, cancel_scope
+from agents.support.scheduler import INTERACTIVE, build_scheduler
+from agents.support.warmup import readiness
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+
+class PlanWorker:
+    """
+    Claims plan generation jobs from the queue and runs them.
+
+    Each of `concurrency` threads runs one job at a time; a separate thread renews
+    the leases of running jobs. Every completed stage is checkpointed, so a retried
+    job only runs the remaining stages. Errors that carry a `retry_after` hint (rate
+    limits, open circuits) are retried after that delay, others with exponential
+    backoff, until the queue's attempt limit marks the plan as failed. Jobs cancelled
+    in the queue (`DELETE /travel-plan/{plan_id}`) are stopped within `cancel_poll`
+    seconds, dropping their remaining stages and upstream calls.
+
+    Threads only claim jobs of work classes that are under their concurrency
+    limit, most urgent class first, so batch jobs never hold every thread while
+    interactive plans wait in the queue.
+
+    Args:
+        queue: The job queue to claim from
+        concurrency: Jobs run at the same time
+        poll_interval: Seconds to wait when the queue is empty
+        drain_seconds: How long `run` waits for running jobs after `stop`; jobs still
+                       running then are released and resume from their checkpoints
+        worker_id: Identifies this worker's leases (defaults to host, PID and a random suffix)
+        cancel_poll: Seconds between checks for cancelled jobs
+    """
+
+    def __init__(self, queue: JobQueue, concurrency: int = 2, poll_interval: float = 1.0,
+                 drain_seconds: float = 60.0, worker_id: str = None, cancel_poll: float = 2.0):
+        self.queue = queue
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.drain_seconds = drain_seconds
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+        self.cancel_poll = cancel_poll
+        self.running: Dict[str, Job] = {}
+        self.cancels = CancelRegistry()
+        self.scheduler = build_scheduler(max_concurrent=self.concurrency)
+        # Plans of jobs whose worker died on the last attempt are failed by whoever notices
+        self.queue.on_expired = self._lease_expired
+        self._running_lock = threading.Lock()
+        self._claim_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._finished = threading.Event()
+
+    @property
+    def stopping(self) -> bool:
+        return self._stop.is_set()
+
+    def stop(self):
+        """Stop claiming new jobs; running jobs are allowed to finish."""
+        self._stop.set()
+
+    def run(self):
+        """
+        Run until `stop` is called, then drain.
+
+        Running jobs get `drain_seconds` to finish. Jobs still running after that
+        are released back to the queue without counting the attempt; their
+        completed stages are already checkpointed, so another worker picks them
+        up where they stopped.
+        """
+        logger.info("Plan worker %s started with %d threads", self.worker_id, self.concurrency)
+        # Daemon threads, so a job that outlives the drain does not keep the process alive
+        threads = [
+            threading.Thread(target=self._claim_loop, name=f"plan-worker-{i}", daemon=True)
+            for i in range(self.concurrency)
+        ]
+        heartbeat = threading.Thread(target=self._heartbeat_loop, name="plan-worker-heartbeat", daemon=True)
+        heartbeat.start()
+        for thread in threads:
+            thread.start()
+        self._stop.wait()
+
+        # Re-read drain_seconds while waiting, so a second signal can cut the drain short
+        started = time.monotonic()
+        for thread in threads:
+            while thread.is_alive() and time.monotonic() - started < self.drain_seconds:
+                thread.join(0.5)
+        with self._running_lock:
+            unfinished = list(self.running.values())
+        for job in unfinished:
+            if self.queue.release(job):
+                logger.warning("Released plan job %s; it resumes from its checkpoint", job.id)
+        self._finished.set()
+        logger.info("Plan worker %s stopped", self.worker_id)
+
+    def _claim(self, slot: ExitStack) -> Optional[Job]:
+        """Claim a job of a class with a free slot and take that slot in `slot`."""
+        # One claim at a time, so two threads cannot both take a class's last slot
+        with self._claim_lock:
+            ranks = [self.scheduler.classes[name].rank for name in self.scheduler.open_classes()]
+            job = self.queue.claim(self.worker_id, priorities=ranks)
+            if job is not None:
+                try:
+                    slot.enter_context(self.scheduler.slot(job.payload.get("work_class", INTERACTIVE),
+                                                           job.payload.get("client", "anonymous")))
+                except Exception:
+                    self.queue.release(job)
+                    raise
+            return job
+
+    def _claim_loop(self):
+        while not self._stop.is_set():
+            with ExitStack() as slot:
+                try:
+                    job = self._claim(slot)
+                except Exception as e:
+                    logger.error("Could not claim a job: %s", e)
+                    job = None
+                if job is None:
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self.run_job(job)
+
+    def run_job(self, job: Job):
+        """Run one claimed job and record its outcome in the queue."""
+        from routers.agents import generate_plan, fail_plan, PLAN_CANCELLED
+
+        cancel = self.cancels.register(job.id)
+        with self._running_lock:
+            self.running[job.id] = job
+        try:
+            logger.info("Running plan job %s (attempt %d)", job.id, job.attempts)
+            with cancel_scope(cancel):
+                generate_plan(job.id, job.payload["preferences"], job.payload.get("source_plan_id"), resumable=True)
+            self.queue.complete(job)
+        except RequestCancelled:
+            logger.info("Plan job %s was cancelled", job.id)
+            # Drops the checkpoint; the API already marked the plan as cancelled
+            fail_plan(job.id, PLAN_CANCELLED)
+        except Exception as e:
+            delay = getattr(e, "retry_after", None) or min(60.0, 2.0 ** job.attempts)
+            if job.attempts >= self.queue.max_attempts:
+                if self.queue.fail(job, str(e)):
+                    logger.error("Plan job %s failed after %d attempts: %s", job.id, job.attempts, e)
+                    fail_plan(job.id, str(e))
+            elif self.queue.retry(job, str(e), delay=delay):
+                logger.warning("Plan job %s failed, retrying in %.0fs: %s", job.id, delay, e)
+        finally:
+            self.cancels.unregister(job.id)
+            with self._running_lock:
+                self.running.pop(job.id, None)
+
+    def _lease_expired(self, job_id: str, error: str):
+        from routers.agents import fail_plan
+        fail_plan(job_id, error)
+
+    def _heartbeat_loop(self):
+        interval = max(1.0, self.queue.lease_seconds / 3)
+        next_heartbeat = time.monotonic() + interval
+        while not self._finished.wait(min(interval, self.cancel_poll)):
+            with self._running_lock:
+                jobs = list(self.running.values())
+            try:
+                for job_id in self.queue.cancelled(job.id for job in jobs):
+                    self.cancels.cancel(job_id, "cancelled in the queue")
+            except Exception as e:
+                logger.error("Could not check for cancelled plan jobs: %s", e)
+            if time.monotonic() < next_heartbeat:
+                continue
+            next_heartbeat = time.monotonic() + interval
+            for job in jobs:
+                try:
+                    if not self.queue.heartbeat(job):
+                        logger.warning("Lost the lease on plan job %s", job.id)
+                except Exception as e:
+                    logger.error("Could not renew the lease on plan job %s: %s", job.id, e)
+
+
+def main():
+    if os.getenv("WARMUP_ENABLED", "true").lower() in ("true", "1", "t"):
+        # Connect before claiming, so the first job does not pay for cold clients
+        from routers.agents import warmup_steps
+        readiness.run([(name, step) for name, step in warmup_steps() if name != "plan_cache"])
+
+    worker = PlanWorker(
+        build_plan_queue(),
+        concurrency=int(os.getenv("WORKER_CONCURRENCY", 2)),
+        poll_interval=float(os.getenv("JOB_POLL_SECONDS", 1.0)),
+        drain_seconds=float(os.getenv("WORKER_DRAIN_SECONDS", 60)),
+        cancel_poll=float(os.getenv("JOB_CANCEL_POLL_SECONDS", 2)),
+    )
+
+    def handle_signal(signum, frame):
+        if worker.stopping:
+            # A second signal skips the drain; running jobs resume from their checkpoints
+            logger.info("Received signal %d again, releasing running jobs", signum)
+            worker.drain_seconds = 0.0
+            return
+        logger.info("Received signal %d, finishing running jobs", signum)
+        worker.stop()
+
+    signal.signal(signal.SIGTERM, handle_signal)
+    signal.signal(signal.SIGINT, handle_signal)
+    worker.run()
+
+
+if __name__ == "__main__":
+    main()
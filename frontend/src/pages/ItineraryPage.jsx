@@ -479,12 +479,19 @@ function ItineraryPage() {
   const [loading, setLoading] = useState(true);
   const [error, setError] = useState(null);
   const [itinerary, setItinerary] = useState(null);
+  // Incremented to re-fetch a progressive plan until it is complete
+  const [refreshCount, setRefreshCount] = useState(0);
   
   // Fetch itinerary data when component mounts
   useEffect(() => {
+    let pollTimer = null;
+    
     const fetchItinerary = async () => {
       try {
-        setLoading(true);
+        // Only show the full-page spinner on the first load, not while polling
+        if (refreshCount === 0) {
+          setLoading(true);
+        }
         setError(null);
         
         // Check if ID starts with "temp-" - this would be a temporary itinerary
@@ -626,6 +633,9 @@ function ItineraryPage() {
             rawImageResults: imageResults || '',
             // Add insights from reviews agent
             insights: apiData.reviews || '',
+            // Progressive plans fill in section by section; the itinerary comes last
+            sectionsReady: apiData.sections_ready || {},
+            complete: apiData.complete !== false,
             // Store the entire API response for debugging
             rawApiResponse: JSON.stringify(apiData, null, 2)
           };
@@ -635,6 +645,11 @@ function ItineraryPage() {
           console.log('Parsed images array:', formattedItinerary.images);
           
           setItinerary(formattedItinerary);
+          
+          // Keep polling until the remaining sections are ready
+          if (!formattedItinerary.complete) {
+            pollTimer = setTimeout(() => setRefreshCount(count => count + 1), 2000);
+          }
         }
       } catch (err) {
         console.error('Error fetching itinerary:', err);
@@ -647,7 +662,13 @@ function ItineraryPage() {
     };
     
     fetchItinerary();
-  }, [id]);
+    
+    return () => {
+      if (pollTimer) {
+        clearTimeout(pollTimer);
+      }
+    };
+  }, [id, refreshCount]);
   
   // Add this after the other useMemo hooks
   const cityImages = useMemo(() => getCityImages(itinerary?.destination), [itinerary?.destination]);
@@ -1383,6 +1404,18 @@ function ItineraryPage() {
   
   return (
     <Container maxW="container.xl" py={8}>
+      {/* Progressive plan still generating */}
+      {!itinerary.complete && (
+        <Alert status="info" borderRadius="md" mb={6}>
+          <Spinner size="sm" color="brand.800" mr={3} />
+          <AlertDescription>
+            {itinerary.sectionsReady.itinerary
+              ? 'Finishing up your travel plan...'
+              : 'Recommendations are ready below. Your day-by-day itinerary is still being generated...'}
+          </AlertDescription>
+        </Alert>
+      )}
+      
       {/* Hero header */}
       <MotionBox
         initial={{ opacity: 0, y: 20 }}
@@ -135,7 +135,7 @@ function LoadingPageRealTime() {
       setStatusMessage(`Starting agents for your ${formData.destination} trip...`);
       
       // Submit preferences to the backend
-      const response = await travelApi.submitPreferences(formData);
+      const response = await travelApi.submitPreferencesProgressive(formData);
       console.log('API Response:', response);
       
       if (response.data && response.data.id) {
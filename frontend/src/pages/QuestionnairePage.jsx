@@ -152,6 +152,8 @@ function QuestionnairePage() {
   const navigate = useNavigate();
   const [currentStep, setCurrentStep] = useState(0);
   const [isSubmitting, setIsSubmitting] = useState(false);
+  // Identifies this questionnaire to the backend, so prefetched results can be adopted on submit
+  const [sessionToken] = useState(() => crypto.randomUUID());
   const [formData, setFormData] = useState({
     destination: '',
     trip_length: '',
@@ -286,6 +288,11 @@ function QuestionnairePage() {
   // Go to next step or submit form
   const handleNext = async () => {
     if (currentStep < steps.length - 1) {
+      if (steps[currentStep].field === 'destination') {
+        // Start the destination-only agents while the remaining questions are answered
+        travelApi.prefetchDestination(sessionToken, formData.destination.trim(), true)
+          .catch(error => console.warn('Prefetch failed:', error));
+      }
       setCurrentStep(currentStep + 1);
     } else {
       try {
@@ -301,7 +308,8 @@ function QuestionnairePage() {
           get_insights: formData.additionalInfo.includes('festivals') || 
                          formData.additionalInfo.includes('customs') || 
                          formData.additionalInfo.includes('covid'),
-          get_images: true
+          get_images: true,
+          session_token: sessionToken
         };
         
         console.log('Submitting to backend:', backendData);
@@ -27,9 +27,20 @@ export const travelApi = {
   // Submit travel preferences to create a plan
   submitPreferences: (preferences) => api.post('/agents/travel-plan', preferences),
   
+  // Submit preferences and get the plan ID immediately; sections fill in as agents finish
+  submitPreferencesProgressive: (preferences) =>
+    api.post('/agents/travel-plan', preferences, { params: { progressive: true } }),
+  
+  // Start the destination-only agents before the questionnaire is submitted
+  prefetchDestination: (sessionToken, destination, getImages) =>
+    api.post('/agents/prefetch', { session_token: sessionToken, destination, get_images: getImages }),
+  
   // Get a travel plan by ID
   getTravelPlan: (id) => api.get(`/agents/travel-plan/${id}`),
-  
+
+  // Stop generating a plan that is still filling in
+  cancelTravelPlan: (id) => api.delete(`/agents/travel-plan/${id}`),
+
   // Query a specific agent
   queryAgent: (agentType, query) => api.post('/agents/query', { agent_type: agentType, query }),
   